@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['jute_test.py'],
-    pathex=[],
+    pathex=['backend'],
     binaries=[],
     datas=[],
     hiddenimports=[],
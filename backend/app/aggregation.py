@@ -0,0 +1,95 @@
+"""Vectorized grade aggregation and stock-days computation.
+
+Per-image detection counts are held in a NumPy structured array tagged with
+an audit index, so one pass computes totals, grade distribution, overall
+grade, confidence and compliance for a single audit or for thousands of
+historical audits at once. Both the AI analysis and the manual-entry paths
+use this module.
+"""
+import numpy as np
+
+from app.detectors import GRADE_KEYS
+
+COUNT_FIELDS = ("total",) + GRADE_KEYS
+REQUIRED_STOCK_DAYS = 30
+# Overall grade rule: first grade whose share of the total exceeds its threshold
+GRADE_THRESHOLDS = (("A", "grade_a", 0.35), ("B", "grade_b", 0.30), ("C", "grade_c", 0.25))
+FALLBACK_GRADE = "D"
+
+COUNTS_DTYPE = np.dtype(
+    [("audit", np.int64)] + [(f, np.int64) for f in COUNT_FIELDS] + [("confidence", np.float64)]
+)
+SUMMARY_DTYPE = np.dtype(
+    [(f, np.int64) for f in COUNT_FIELDS]
+    + [("confidence", np.float64), ("stock_days", np.float64), ("grade", "U1"), ("compliant", np.bool_)]
+)
+
+# Summary field -> audit_data key
+AUDIT_FIELDS = {
+    "total": "total_count",
+    "grade_a": "premium_count",
+    "grade_b": "export_count",
+    "grade_c": "local_count",
+    "grade_d": "reject_count",
+    "confidence": "confidence",
+    "stock_days": "stock_days",
+    "grade": "grade",
+}
+
+
+def counts_array(detections: list[dict], audit: int = 0) -> np.ndarray:
+    """Pack per-image detection dicts into a COUNTS_DTYPE array."""
+    counts = np.zeros(len(detections), dtype=COUNTS_DTYPE)
+    counts["audit"] = audit
+    for field in COUNT_FIELDS + ("confidence",):
+        counts[field] = [d.get(field, 0) for d in detections]
+    return counts
+
+
+def overall_grades(total, grade_a, grade_b, grade_c) -> np.ndarray:
+    """Vectorized overall grade ('A'..'D') from grade counts."""
+    total = np.asarray(total)
+    counts = {"grade_a": grade_a, "grade_b": grade_b, "grade_c": grade_c}
+    conditions = [np.asarray(counts[key]) > total * share for _, key, share in GRADE_THRESHOLDS]
+    return np.select(conditions, [g for g, _, _ in GRADE_THRESHOLDS], FALLBACK_GRADE)
+
+
+def stock_days(total, daily_consumption) -> np.ndarray:
+    """Days of stock on hand, 0 where daily consumption is not positive."""
+    total = np.asarray(total, dtype=np.float64)
+    daily = np.broadcast_to(np.asarray(daily_consumption, dtype=np.float64), total.shape)
+    days = np.divide(total, daily, out=np.zeros_like(total), where=daily > 0)
+    return np.round(days, 1)
+
+
+def aggregate(counts: np.ndarray, daily_consumption, n_audits: int | None = None) -> np.ndarray:
+    """Summarize per-image counts into one SUMMARY_DTYPE row per audit.
+
+    ``counts["audit"]`` indexes the audit each image belongs to;
+    ``daily_consumption`` is a scalar or one value per audit.
+    """
+    audit = counts["audit"]
+    if n_audits is None:
+        n_audits = int(audit.max()) + 1 if len(audit) else 0
+    out = np.zeros(n_audits, dtype=SUMMARY_DTYPE)
+    for field in COUNT_FIELDS:
+        out[field] = np.bincount(audit, weights=counts[field], minlength=n_audits)
+    images = np.bincount(audit, minlength=n_audits)
+    conf_sum = np.bincount(audit, weights=counts["confidence"], minlength=n_audits)
+    out["confidence"] = np.divide(conf_sum, images, out=np.zeros(n_audits), where=images > 0)
+    out["stock_days"] = stock_days(out["total"], daily_consumption)
+    out["grade"] = overall_grades(out["total"], out["grade_a"], out["grade_b"], out["grade_c"])
+    out["compliant"] = out["stock_days"] >= REQUIRED_STOCK_DAYS
+    return out
+
+
+def audit_fields(row) -> dict:
+    """Convert one summary row to the audit_data fields it updates."""
+    fields = {key: row[field].item() for field, key in AUDIT_FIELDS.items()}
+    fields["compliance_status"] = "PASS" if row["compliant"] else "FAIL"
+    return fields
+
+
+def summarize_detections(detections: list[dict], daily_consumption) -> dict:
+    """Aggregate one audit's per-image detections into audit_data fields."""
+    return audit_fields(aggregate(counts_array(detections), daily_consumption, n_audits=1)[0])
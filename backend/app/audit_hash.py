@@ -0,0 +1,194 @@
+"""Incremental Merkle hashing of audit records.
+
+Each top-level field of an audit becomes a leaf digest; image lists become one
+leaf built from per-image digests, so evidence photos are covered without
+re-reading their bytes on every call. Leaves are combined pairwise into a
+Merkle root which is memoized until the audit changes.
+"""
+import hashlib
+import json
+import weakref
+
+from app.telemetry import cache_counters
+
+IMAGE_FIELDS = ("original_images", "processed_images", "watermarked_images")
+# Fields derived from the hash itself must never feed back into it
+EXCLUDED_FIELDS = ("hash",)
+
+# Per-image digests, keyed by the buffer object and checked against its current value
+_image_digests: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_DIGEST_HIT, _DIGEST_MISS = cache_counters("image_digest")
+_ROOT_HIT, _ROOT_MISS = cache_counters("audit_root")
+
+
+def _sha256(*parts: bytes) -> bytes:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p)
+    return h.digest()
+
+
+def image_view(img) -> memoryview | None:
+    """Zero-copy view of an image buffer (BytesIO, UploadedFile, bytes)."""
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        return memoryview(img)
+    if hasattr(img, "getbuffer"):
+        return img.getbuffer()
+    if hasattr(img, "getvalue"):
+        return memoryview(img.getvalue())
+    return None
+
+
+def image_digest(img) -> bytes:
+    """SHA-256 of one image buffer.
+
+    File-like buffers are cached against the bytes object ``getvalue()``
+    returned. ``BytesIO`` hands out its internal buffer and swaps in a copy on
+    the next write, so any in-place rewrite (even one keeping the size) yields
+    a new object and is re-hashed; the same object is immutable and still
+    holds the hashed bytes. Raw bytes-like values are hashed every time.
+    """
+    getvalue = getattr(img, "getvalue", None)
+    if getvalue is None or isinstance(img, (bytes, bytearray, memoryview)):
+        view = image_view(img)
+        if view is None:
+            # Placeholders such as burst markers hash by their repr
+            return _sha256(b"ref:", repr(img).encode())
+        _DIGEST_MISS.inc()
+        digest = _sha256(view)
+        view.release()
+        return digest
+    value = getvalue()
+    try:
+        cached = _image_digests.get(img)
+    except TypeError:  # not weakly referenceable
+        cached = None
+    if cached is not None and cached[0] is value:
+        _DIGEST_HIT.inc()
+        return cached[1]
+    _DIGEST_MISS.inc()
+    digest = _sha256(value)
+    try:
+        _image_digests[img] = (value, digest)
+    except TypeError:
+        pass
+    return digest
+
+
+def field_digest(key: str, value) -> bytes:
+    """Leaf digest for one top-level audit field."""
+    if key in IMAGE_FIELDS:
+        images = value or []
+        return _sha256(b"img:", key.encode(), b"\0", *(image_digest(i) for i in images if i))
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    return _sha256(b"fld:", key.encode(), b"\0", encoded)
+
+
+def merkle_root(leaves: list[bytes]) -> bytes:
+    """Combine leaf digests pairwise; an odd node is promoted unchanged."""
+    if not leaves:
+        return _sha256(b"")
+    level = list(leaves)
+    while len(level) > 1:
+        nxt = [_sha256(b"\1", level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+def _hashed_keys(audit_data: dict) -> list[str]:
+    """Fields that feed the root. Every image field has a leaf, empty when absent,
+    so a record stored without its image keys hashes like one with empty lists."""
+    return sorted((set(audit_data) | set(IMAGE_FIELDS)) - set(EXCLUDED_FIELDS))
+
+
+def _is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class AuditDict(dict):
+    """Audit record that keeps per-field digests up to date as it is mutated.
+
+    Scalar fields are re-digested only when assigned. Container fields
+    (flags, gps, image lists) can be mutated in place, so their leaves are
+    recomputed on each call; this is cheap because image digests are cached.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._leaves: dict[str, bytes] = {}
+        self._root: tuple | None = None
+
+    def _touch(self, key) -> None:
+        self._leaves.pop(key, None)
+        self._root = None
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self._touch(key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._touch(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._leaves.clear()
+        self._root = None
+
+    def copy(self) -> "AuditDict":
+        return AuditDict(self)
+
+    def __reduce__(self):
+        return (AuditDict, (dict(self),))
+
+    def root_hash(self) -> str:
+        """Hex Merkle root over all fields and images, memoized."""
+        leaves = []
+        volatile = []
+        for key in _hashed_keys(self):
+            value = dict.get(self, key)
+            if _is_scalar(value):
+                leaf = self._leaves.get(key)
+                if leaf is None:
+                    leaf = self._leaves[key] = field_digest(key, value)
+            else:
+                leaf = field_digest(key, value)
+                volatile.append(leaf)
+            leaves.append(leaf)
+        marker = tuple(volatile)
+        if self._root is not None and self._root[0] == marker:
+            _ROOT_HIT.inc()
+            return self._root[1]
+        _ROOT_MISS.inc()
+        root = merkle_root(leaves).hex()
+        self._root = (marker, root)
+        return root
+
+
+def audit_merkle_root(audit_data: dict) -> str:
+    """Hex Merkle root for any audit mapping (memoized for AuditDict)."""
+    if isinstance(audit_data, AuditDict):
+        return audit_data.root_hash()
+    leaves = [field_digest(k, audit_data.get(k)) for k in _hashed_keys(audit_data)]
+    return merkle_root(leaves).hex()
@@ -0,0 +1,244 @@
+"""Persistent audit history (SQLite) with indexed lookups and monthly rollups.
+
+Completed audits are stored once per audit_id, indexed by mill license,
+inspector, material and time. A rollup table keeps per mill/material/month
+sums up to date on every write, so "last audit for this mill" is a single
+index seek and multi-month trends read a handful of rollup rows instead of
+scanning audits. Each audit's verification hash (app.audit_hash, computed
+with its images) is stored alongside, since the stored payload has no
+images and would hash differently.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.aggregation import AUDIT_FIELDS, COUNT_FIELDS, COUNTS_DTYPE, aggregate
+from app.audit_hash import IMAGE_FIELDS, audit_merkle_root
+from app.settings import AUDIT_DB_PATH
+
+COUNT_COLUMNS = ("total_count", "premium_count", "export_count", "local_count", "reject_count")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audits (
+    audit_id TEXT PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    month TEXT NOT NULL,
+    inspector TEXT NOT NULL DEFAULT '',
+    mill_name TEXT NOT NULL DEFAULT '',
+    mill_license TEXT NOT NULL DEFAULT '',
+    material_type TEXT NOT NULL DEFAULT '',
+    total_count INTEGER NOT NULL DEFAULT 0,
+    premium_count INTEGER NOT NULL DEFAULT 0,
+    export_count INTEGER NOT NULL DEFAULT 0,
+    local_count INTEGER NOT NULL DEFAULT 0,
+    reject_count INTEGER NOT NULL DEFAULT 0,
+    confidence REAL NOT NULL DEFAULT 0,
+    stock_days REAL NOT NULL DEFAULT 0,
+    grade TEXT,
+    compliance_status TEXT,
+    hash TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audits_mill_time ON audits (mill_license, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audits_inspector_time ON audits (inspector, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audits_material_time ON audits (material_type, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audits_time ON audits (recorded_at DESC);
+
+CREATE TABLE IF NOT EXISTS audit_rollups (
+    mill_license TEXT NOT NULL,
+    material_type TEXT NOT NULL,
+    month TEXT NOT NULL,
+    audits INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    premium_count INTEGER NOT NULL,
+    export_count INTEGER NOT NULL,
+    local_count INTEGER NOT NULL,
+    reject_count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    stock_days_sum REAL NOT NULL,
+    pass_count INTEGER NOT NULL,
+    PRIMARY KEY (mill_license, material_type, month)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollups_month ON audit_rollups (month);
+"""
+
+_ROLLUP_UPSERT = f"""
+INSERT INTO audit_rollups (mill_license, material_type, month, audits, {", ".join(COUNT_COLUMNS)},
+                           confidence_sum, stock_days_sum, pass_count)
+VALUES (?, ?, ?, ?, {", ".join("?" for _ in COUNT_COLUMNS)}, ?, ?, ?)
+ON CONFLICT (mill_license, material_type, month) DO UPDATE SET
+    audits = audits + excluded.audits,
+    {", ".join(f"{c} = {c} + excluded.{c}" for c in COUNT_COLUMNS)},
+    confidence_sum = confidence_sum + excluded.confidence_sum,
+    stock_days_sum = stock_days_sum + excluded.stock_days_sum,
+    pass_count = pass_count + excluded.pass_count
+"""
+
+
+def _recorded_at(audit_data: dict) -> float:
+    ts = audit_data.get("timestamp")
+    if ts:
+        try:
+            return datetime.strptime(ts, TIMESTAMP_FORMAT).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time.time()
+
+
+def _month_start(months_back: int) -> str:
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class AuditStore:
+    """SQLite audit history; one connection per thread, WAL journaling."""
+
+    def __init__(self, path=AUDIT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _apply_rollup(conn: sqlite3.Connection, row, sign: int) -> None:
+        conn.execute(_ROLLUP_UPSERT, (
+            row["mill_license"], row["material_type"], row["month"], sign,
+            *(sign * row[c] for c in COUNT_COLUMNS),
+            sign * row["confidence"], sign * row["stock_days"],
+            sign * int(row["compliance_status"] == "PASS"),
+        ))
+
+    def save_audit(self, audit_data: dict) -> None:
+        """Insert or replace an audit and keep the monthly rollups consistent."""
+        recorded_at = _recorded_at(audit_data)
+        payload = {k: v for k, v in audit_data.items() if k not in IMAGE_FIELDS}
+        row = {
+            "audit_id": audit_data["audit_id"],
+            "recorded_at": recorded_at,
+            "month": datetime.fromtimestamp(recorded_at).strftime("%Y-%m"),
+            "inspector": audit_data.get("inspector") or "",
+            "mill_name": audit_data.get("mill_name") or "",
+            "mill_license": audit_data.get("mill_license") or "",
+            "material_type": audit_data.get("material_type") or "",
+            **{c: int(audit_data.get(c) or 0) for c in COUNT_COLUMNS},
+            "confidence": float(audit_data.get("confidence") or 0),
+            "stock_days": float(audit_data.get("stock_days") or 0),
+            "grade": audit_data.get("grade"),
+            "compliance_status": audit_data.get("compliance_status"),
+            "hash": audit_merkle_root(audit_data),
+            "payload": json.dumps(payload, default=str),
+        }
+        conn = self._conn()
+        with conn:
+            old = conn.execute("SELECT * FROM audits WHERE audit_id = ?", (row["audit_id"],)).fetchone()
+            if old is not None:
+                self._apply_rollup(conn, old, -1)
+            conn.execute(
+                f"INSERT OR REPLACE INTO audits ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                tuple(row.values()),
+            )
+            self._apply_rollup(conn, row, 1)
+
+    def get_audit(self, audit_id: str) -> dict | None:
+        """Full stored audit record (without images, with its verification ``hash``)."""
+        r = self._conn().execute("SELECT hash, payload FROM audits WHERE audit_id = ?", (audit_id,)).fetchone()
+        return {**json.loads(r["payload"]), "hash": r["hash"]} if r else None
+
+    def audits(self, month: str | None = None, mill_license: str | None = None) -> list[dict]:
+        """Stored audit records (without images, with ``hash``) in time order, optionally for one month or mill."""
+        where, args = [], []
+        if month is not None:
+            where.append("month = ?")
+            args.append(month)
+        if mill_license is not None:
+            where.append("mill_license = ?")
+            args.append(mill_license)
+        rows = self._conn().execute(
+            f"SELECT hash, payload FROM audits {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY recorded_at",
+            args,
+        ).fetchall()
+        return [{**json.loads(r["payload"]), "hash": r["hash"]} for r in rows]
+
+    def last_audit(self, mill_license: str, exclude_audit_id: str | None = None) -> dict | None:
+        """Most recent audit for a mill, optionally skipping the current one."""
+        r = self._conn().execute(
+            "SELECT * FROM audits WHERE mill_license = ? AND audit_id != ? "
+            "ORDER BY recorded_at DESC LIMIT 1",
+            (mill_license, exclude_audit_id or ""),
+        ).fetchone()
+        if r is None:
+            return None
+        out = dict(r)
+        out.pop("payload")
+        return out
+
+    def trend(self, mill_license: str | None = None, months: int = 6,
+              material_type: str | None = None) -> list[dict]:
+        """Per-month totals, grade distribution and compliance from the rollups."""
+        where, args = ["month >= ?"], [_month_start(months - 1)]
+        if mill_license is not None:
+            where.append("mill_license = ?")
+            args.append(mill_license)
+        if material_type is not None:
+            where.append("material_type = ?")
+            args.append(material_type)
+        rows = self._conn().execute(
+            f"SELECT month, SUM(audits) AS audits, {', '.join(f'SUM({c}) AS {c}' for c in COUNT_COLUMNS)}, "
+            "SUM(confidence_sum) AS confidence_sum, SUM(stock_days_sum) AS stock_days_sum, "
+            "SUM(pass_count) AS pass_count "
+            f"FROM audit_rollups WHERE {' AND '.join(where)} GROUP BY month HAVING SUM(audits) > 0 ORDER BY month",
+            args,
+        ).fetchall()
+        if not rows:
+            return []
+        # One "audit" per month in the shared aggregation, so trend grades and
+        # confidences follow the same rules as a single audit's summary
+        counts = np.zeros(len(rows), dtype=COUNTS_DTYPE)
+        counts["audit"] = np.arange(len(rows))
+        for field in COUNT_FIELDS:
+            counts[field] = [r[AUDIT_FIELDS[field]] for r in rows]
+        counts["confidence"] = [r["confidence_sum"] / r["audits"] for r in rows]
+        summary = aggregate(counts, 0, n_audits=len(rows))
+        return [
+            {
+                "month": r["month"],
+                "audits": r["audits"],
+                **{AUDIT_FIELDS[f]: summary[i][f].item() for f in COUNT_FIELDS},
+                "grade": str(summary[i]["grade"]),
+                "avg_confidence": round(summary[i]["confidence"].item(), 4),
+                "avg_stock_days": round(r["stock_days_sum"] / r["audits"], 1),
+                "pass_rate": round(r["pass_count"] / r["audits"], 3),
+            }
+            for i, r in enumerate(rows)
+        ]
+
+
+_store: AuditStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_audit_store() -> AuditStore:
+    """Shared audit store for this process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AuditStore()
+    return _store
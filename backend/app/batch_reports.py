@@ -0,0 +1,159 @@
+"""Batch report generation: per-audit PDFs in a process pool, plus a consolidated PDF.
+
+Month-end reporting renders hundreds of stored audits. ``render_batch``
+spreads them over worker processes (ReportLab is pure Python, so threads
+would serialize on the GIL); each worker reuses the styles app.reports
+builds once per process and writes its PDFs straight to the output
+directory, so no report bytes travel back to the parent.
+``write_consolidated_pdf`` renders one document with a summary table and a
+section per audit, written directly to a file rather than built up in a
+BytesIO. Reports print the verification hash stored with each audit, since
+stored audits have no images and would hash differently. From the command
+line (in backend/):
+
+    python -m app.batch_reports --month 2026-09 --out ../reports --consolidated
+"""
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable
+
+from reportlab.lib import colors
+from reportlab.platypus import PageBreak, Paragraph, Spacer, Table, TableStyle
+
+from app.reports import STYLES, TITLE_STYLE, audit_elements, generate_government_pdf, generate_gfr_format, report_doc
+from app.settings import get_settings
+
+# Submitted but unfinished audits per worker; bounds memory for long batches
+IN_FLIGHT_PER_WORKER = 4
+
+SUMMARY_HEADER = ["Audit ID", "Date", "Mill", "Material", "Total", "A", "B", "C", "D", "Grade", "Status"]
+SUMMARY_COL_WIDTHS = [95, 62, 70, 42, 30, 22, 22, 22, 22, 28, 36]
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 7),
+    ('ALIGN', (4, 0), (-1, -1), 'CENTER'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8fafc')]),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dbeafe')),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#1e40af')),
+])
+COUNT_KEYS = ("total_count", "premium_count", "export_count", "local_count", "reject_count")
+
+
+def _file_stem(audit_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", audit_id)
+
+
+def render_audit(audit_data: dict, out_dir: str) -> list[str]:
+    """Write an audit's government report and GFR 19-A form into ``out_dir``; returns the file names."""
+    stem = _file_stem(audit_data["audit_id"])
+    names = [f"{stem}_GOVT_REPORT.pdf", f"{stem}_GFR19A.pdf"]
+    generate_government_pdf(audit_data, os.path.join(out_dir, names[0]), hash_value=audit_data.get("hash"))
+    generate_gfr_format(audit_data, os.path.join(out_dir, names[1]))
+    return names
+
+
+def render_batch(audits: list[dict], out_dir: Path, workers: int = 0,
+                 progress: Callable[[float], None] | None = None) -> list[str]:
+    """Render per-audit PDFs for ``audits`` into ``out_dir`` using ``workers`` processes (0 = one per CPU)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(audits))
+    names: list[str] = []
+    if workers <= 1:
+        for i, audit_data in enumerate(audits):
+            names += render_audit(audit_data, str(out_dir))
+            if progress:
+                progress((i + 1) / len(audits))
+        return names
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        pending, done_count = set(), 0
+        for audit_data in audits:
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    names += future.result()
+                done_count += len(done)
+                if progress:
+                    progress(done_count / len(audits))
+            pending.add(pool.submit(render_audit, audit_data, str(out_dir)))
+        for future in pending:
+            names += future.result()
+    if progress:
+        progress(1.0)
+    return names
+
+
+def _summary_table(audits: list[dict]) -> Table:
+    rows = [SUMMARY_HEADER]
+    totals = [0] * len(COUNT_KEYS)
+    for a in audits:
+        counts = [int(a.get(k) or 0) for k in COUNT_KEYS]
+        totals = [t + c for t, c in zip(totals, counts)]
+        rows.append([
+            a["audit_id"], str(a.get("timestamp") or "")[:10], (a.get("mill_name") or "")[:18],
+            (a.get("material_type") or "").upper(), *map(str, counts),
+            a.get("grade") or "", a.get("compliance_status") or "",
+        ])
+    rows.append([f"{len(audits)} audits", "", "", "", *map(str, totals), "", ""])
+    table = Table(rows, colWidths=SUMMARY_COL_WIDTHS, repeatRows=1)
+    table.setStyle(SUMMARY_TABLE_STYLE)
+    return table
+
+
+def write_consolidated_pdf(audits: list[dict], path: Path, title: str = "Consolidated Audit Report") -> Path:
+    """One PDF with a summary table of ``audits`` followed by each audit's report on its own page."""
+    passed = sum(a.get("compliance_status") == "PASS" for a in audits)
+    elements = [
+        Paragraph("JuteVision Auditor", TITLE_STYLE),
+        Paragraph("Ministry of Textiles, Government of India", STYLES['Heading2']),
+        Paragraph(title, STYLES['Heading3']),
+        Paragraph(f"{len(audits)} audits, {passed} compliant", STYLES['Normal']),
+        Spacer(1, 12),
+        _summary_table(audits),
+    ]
+    for audit_data in audits:
+        elements.append(PageBreak())
+        elements += audit_elements(audit_data, audit_data.get("hash"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report_doc(str(path), title=title).build(elements)
+    return path
+
+
+def report_workers() -> int:
+    return int(get_settings().get("report_workers") or 0)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.audit_store import get_audit_store
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--month", help="only audits recorded in this month (YYYY-MM)")
+    parser.add_argument("--mill", help="only audits of this mill license")
+    parser.add_argument("--out", type=Path, required=True, help="output directory")
+    parser.add_argument("--workers", type=int, default=report_workers(), help="worker processes (0 = one per CPU)")
+    parser.add_argument("--consolidated", action="store_true", help="also write one consolidated PDF")
+    parser.add_argument("--consolidated-only", action="store_true", help="write only the consolidated PDF")
+    args = parser.parse_args(argv)
+
+    audits = get_audit_store().audits(month=args.month, mill_license=args.mill)
+    if not audits:
+        print("No matching audits", file=sys.stderr)
+        return 1
+    if not args.consolidated_only:
+        names = render_batch(audits, args.out, args.workers)
+        print(f"Wrote {len(names)} PDFs for {len(audits)} audits to {args.out}", file=sys.stderr)
+    if args.consolidated or args.consolidated_only:
+        path = write_consolidated_pdf(audits, args.out / f"CONSOLIDATED_{args.month or 'ALL'}.pdf")
+        print(f"Wrote {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
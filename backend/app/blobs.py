@@ -0,0 +1,65 @@
+"""Content-addressed blob storage (image bytes keyed by their SHA-256).
+
+A blob is written once under ``<root>/<first two hex chars>/<rest>`` and
+never modified, so identical images are stored once however many records
+reference them, and "do you have X" is a file-existence check.
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Iterator
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+def blob_digest(data: bytes | memoryview) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Immutable blobs on disk, addressed by hex SHA-256."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        if not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Not a SHA-256 digest: {digest!r}")
+        return self.root / digest[:2] / digest[2:]
+
+    def has(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def put(self, data: bytes | memoryview, digest: str | None = None) -> str:
+        """Store bytes (no-op if already present); returns the digest.
+
+        A given ``digest`` is verified; ValueError if the bytes don't match.
+        """
+        actual = blob_digest(data)
+        if digest is not None and digest != actual:
+            raise ValueError(f"Blob content does not match digest {digest}")
+        path = self.path(actual)
+        if not path.is_file():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        return actual
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def delete(self, digest: str) -> None:
+        self.path(digest).unlink(missing_ok=True)
+
+    def digests(self) -> Iterator[str]:
+        for shard in self.root.iterdir():
+            if shard.is_dir() and len(shard.name) == 2:
+                for blob in shard.iterdir():
+                    if not blob.name.endswith(".tmp"):
+                        yield shard.name + blob.name
@@ -1,75 +1,49 @@
-"""Camera + YOLO inference engine for JuteVision."""
+"""Camera + YOLO inference engine for JuteVision.
+
+One capture thread per configured camera decodes into a preallocated frame
+ring (see app.frames); a single detection loop shares the inference engine
+across all cameras with round-robin batching, so when inference saturates
+every camera's inference rate drops evenly instead of frames queueing up.
+Stages pass leased ring slots rather than copies of frames.
+"""
+import logging
+import threading
+import time
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
-from typing import Generator
-from pathlib import Path
-
-# Find model: backend/app/ -> JuteVision root
-_model_path = Path(__file__).resolve().parent.parent.parent / "yolo11n.pt"
-if not _model_path.exists():
-    _model_path = "yolo11n.pt"  # fallback (downloads if needed)
-else:
-    _model_path = str(_model_path)
-
-# Initialize once at module load
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = YOLO(_model_path)
-
-# Global camera instance (single capture)
-cap: cv2.VideoCapture | None = None
-
-
-def get_camera():
-    """Get or create camera capture."""
-    global cap
-    if cap is None:
-        cap = cv2.VideoCapture(0)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-    return cap
+from collections import deque
+from typing import Callable, Generator, Iterator
 
+from app.detectors import get_detector
+from app.frames import FrameLease, FrameRing
+from app.imaging import decode_capped
+from app.settings import get_settings
+from app.telemetry import STAGES
 
-def release_camera():
-    """Release camera resources."""
-    global cap
-    if cap is not None:
-        cap.release()
-        cap = None
+log = logging.getLogger("jutevision.camera")
 
+# Initialize once at module load; shared registry with the Streamlit app
+detector = get_detector(fallback="ultralytics")
 
-def generate_frames() -> Generator[bytes, None, None]:
-    """Generate MJPEG frames for streaming."""
-    camera = get_camera()
-    while True:
-        ret, frame = camera.read()
-        if not ret:
-            break
-        results = model(frame, device=device, conf=0.5, verbose=False)
-        annotated = results[0].plot()
-        _, buffer = cv2.imencode(".jpg", annotated)
-        frame_bytes = buffer.tobytes()
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-        )
-
-
-def get_detection_metrics() -> dict:
+NO_METRICS = {"weight_kg": 0, "detection_count": 0, "confidence": 0}
+# With nobody watching, frames are still grabbed (so the device buffer never
+# goes stale) but only decoded this often
+IDLE_DECODE_INTERVAL_S = 0.5
+# /api/capture returns the last streamed frame if it is at most this old
+SHOWN_FRAME_MAX_AGE_S = 1.0
+# Uploads are decoded, annotated and encoded at most this large (longest side)
+UPLOAD_MAX_SIDE = int(get_settings().get("upload_max_side") or 0)
+# Larger images are refused from their header, before a pixel buffer is allocated
+UPLOAD_MAX_PIXELS = int(get_settings().get("upload_max_pixels") or 0)
+
+_DECODE, _INFERENCE, _ANNOTATE, _ENCODE = (STAGES[s] for s in ("decode", "inference", "annotate", "encode"))
+
+
+def _weight_metrics(n: int) -> dict:
     """
-    Process one frame and return metrics for weight estimation.
     Weight heuristic: base + (detection density * factor).
     Real implementation would use jute-specific model.
     """
-    camera = get_camera()
-    ret, frame = camera.read()
-    if not ret:
-        return {"weight_kg": 0, "detection_count": 0, "confidence": 0}
-
-    results = model(frame, device=device, conf=0.5, verbose=False)[0]
-    boxes = results.boxes
-    n = len(boxes) if boxes is not None else 0
-
     # Heuristic: COCO detects objects; jute bales/bags correlate with object density
     # Placeholder formula - replace with real jute weight model
     base_kg = 12.5
@@ -86,35 +60,380 @@ def get_detection_metrics() -> dict:
     }
 
 
-def process_uploaded_image(image_bytes: bytes) -> tuple[bytes, dict]:
-    """Run YOLO on uploaded image, return annotated JPEG bytes + metrics."""
-    arr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+def _open_source(source):
+    """Open a device index, RTSP/HTTP URL or video file."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class CameraWorker:
+    """
+    Grab thread for one source, publishing into a FrameRing.
+    The device is only ever touched by this thread: it grab()s continuously so
+    the driver buffer never holds old frames, and decodes (retrieve()) every
+    frame while someone needs them, otherwise a couple of times per second.
+    Frames are decoded in place into a free ring slot.
+    """
+
+    def __init__(self, camera_id: str, source, on_frame: Callable[[], None] | None = None,
+                 wanted: Callable[[], bool] | None = None):
+        self.camera_id = camera_id
+        self.source = source
+        self.ring = FrameRing()
+        self.on_frame = on_frame
+        self.wanted = wanted or (lambda: True)
+        self.frames_grabbed = 0
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_streamed = 0
+        self.active_streams = 0
+        self.connected = False
+        # (monotonic time, encoded JPEG, metrics) of the last frame sent to a viewer
+        self.last_shown: tuple[float, np.ndarray, dict] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # Video files are replayed in real time (and looped) so they behave like cameras
+        self._is_file = isinstance(source, str) and not source.isdigit() and "://" not in source
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"camera-{self.camera_id}", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.ring.close()
+
+    def _decode(self, cap, ts: float) -> bool:
+        """Retrieve the grabbed frame into a free ring slot and publish it."""
+        ring = self.ring
+        claimed = ring.claim(ring.shape) if ring.shape is not None else None
+        if claimed is None and ring.shape is not None:
+            # Every slot is leased by a reader; skip this frame
+            self.frames_dropped += 1
+            return False
+        started = time.perf_counter()
+        ret, frame = cap.retrieve(image=claimed[1]) if claimed else cap.retrieve()
+        _DECODE.since(started)
+        if not ret:
+            if claimed:
+                ring.abort(claimed[0])
+            return False
+        if claimed is None or frame is not claimed[1]:
+            # First frame or resolution change: size the ring, copy this one in
+            if claimed:
+                ring.abort(claimed[0])
+            claimed = ring.claim(frame.shape)
+            np.copyto(claimed[1], frame)
+        ring.commit(claimed[0], ts)
+        return True
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while not self._stop.is_set():
+            cap = _open_source(self.source)
+            if not cap.isOpened():
+                cap.release()
+                self.connected = False
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 10.0)
+                continue
+            backoff = 0.5
+            self.connected = True
+            period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25.0) if self._is_file else 0.0
+            last_decode = 0.0
+            try:
+                while not self._stop.is_set():
+                    started = time.monotonic()
+                    if not cap.grab():
+                        if self._is_file and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                            continue
+                        break
+                    ts = time.monotonic()
+                    self.frames_grabbed += 1
+                    if self.active_streams or self.wanted() or ts - last_decode >= IDLE_DECODE_INTERVAL_S:
+                        if self._decode(cap, ts):
+                            last_decode = ts
+                            self.frames_captured += 1
+                            if self.on_frame is not None:
+                                self.on_frame()
+                    if period:
+                        self._stop.wait(max(0.0, period - (time.monotonic() - started)))
+            finally:
+                cap.release()
+                self.connected = False
+
+
+class CameraManager:
+    """All configured cameras, from the ``cameras`` setting (id -> source)."""
+
+    def __init__(self):
+        self.workers: dict[str, CameraWorker] = {}
+        self.frame_ready = threading.Event()
+        # Whether live consumers need every frame decoded (set by the app)
+        self.wanted: Callable[[], bool] = lambda: False
+
+    def configure(self, cameras: dict | None = None) -> None:
+        cameras = cameras or get_settings().get("cameras") or {"0": 0}
+        for camera_id, source in cameras.items():
+            if str(camera_id) not in self.workers:
+                self.workers[str(camera_id)] = CameraWorker(
+                    str(camera_id), source, on_frame=self.frame_ready.set, wanted=lambda: self.wanted()
+                )
+
+    @property
+    def default_id(self) -> str:
+        if not self.workers:
+            self.configure()
+        return next(iter(self.workers))
+
+    def get(self, camera_id: str | None = None) -> CameraWorker:
+        if not self.workers:
+            self.configure()
+        worker = self.workers.get(camera_id or self.default_id)
+        if worker is None:
+            raise KeyError(camera_id)
+        worker.start()
+        return worker
+
+    def start(self) -> None:
+        if not self.workers:
+            self.configure()
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop(self) -> None:
+        for worker in self.workers.values():
+            worker.stop()
+
+    @property
+    def active_streams(self) -> int:
+        return sum(w.active_streams for w in self.workers.values())
+
+
+cameras = CameraManager()
+
+
+def release_camera():
+    """Release camera resources."""
+    cameras.stop()
+
+
+class DetectionLoop:
+    """
+    Shared inference engine for all cameras.
+    Each pass takes the newest unprocessed frame from up to ``max_batch``
+    cameras in round-robin order and runs them as one batch, so cameras are
+    served fairly and a saturated engine lowers every camera's inference rate
+    rather than falling behind. Results carry the camera id, frame sequence
+    number and capture timestamp, and are handed to listeners.
+    """
+
+    def __init__(self, manager: CameraManager, max_fps_per_camera: float = 10.0, max_batch: int = 8):
+        self.manager = manager
+        self.min_period = 1.0 / max_fps_per_camera
+        self.max_batch = max_batch
+        self.latest: dict[str, dict] = {}
+        self.inferred: dict[str, int] = {}
+        self.wanted: Callable[[], bool] = lambda: True
+        self._listeners: list[Callable[[dict], None]] = []
+        self._last_run: dict[str, float] = {}
+        self._order: deque[str] = deque()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_listener(self, fn: Callable[[dict], None]) -> None:
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[dict], None]) -> None:
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="detection-loop", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.manager.frame_ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _next_batch(self) -> list[tuple[str, FrameLease]]:
+        if len(self._order) != len(self.manager.workers):
+            self._order = deque(self.manager.workers)
+        now = time.monotonic()
+        batch = []
+        for _ in range(len(self._order)):
+            camera_id = self._order[0]
+            self._order.rotate(-1)
+            if now - self._last_run.get(camera_id, 0.0) < self.min_period:
+                continue
+            lease = self.manager.workers[camera_id].ring.acquire(self.inferred.get(camera_id, 0))
+            if lease is None:
+                continue
+            batch.append((camera_id, lease))
+            if len(batch) >= self.max_batch:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.wanted():
+                self._stop.wait(0.1)
+                continue
+            self.manager.frame_ready.clear()
+            batch = self._next_batch()
+            if not batch:
+                self.manager.frame_ready.wait(self.min_period / 2)
+                continue
+            started = time.perf_counter()
+            try:
+                detections = detector.detect([lease.frame for _, lease in batch])
+                _INFERENCE.since(started)
+            except Exception:
+                # A bad frame or runtime error must not end the loop: skip these
+                # frames and carry on with the next ones
+                log.exception("Detection failed for cameras %s", ", ".join(c for c, _ in batch))
+                detections = None
+            finally:
+                for _, lease in batch:
+                    lease.release()
+            now = time.monotonic()
+            if detections is None:
+                for camera_id, lease in batch:
+                    self.inferred[camera_id] = lease.seq
+                    self._last_run[camera_id] = now
+                continue
+            for (camera_id, lease), detection in zip(batch, detections):
+                self.inferred[camera_id] = lease.seq
+                self._last_run[camera_id] = now
+                result = {
+                    "camera_id": camera_id,
+                    "seq": lease.seq,
+                    "ts": lease.ts,
+                    "metrics": _weight_metrics(detection["total"]),
+                    "detection": detection,
+                }
+                self.latest[camera_id] = result
+                for fn in list(self._listeners):
+                    try:
+                        fn(result)
+                    except Exception:
+                        log.exception("Detection listener failed")
+
+
+detection_loop = DetectionLoop(cameras, max_fps_per_camera=get_settings().get("max_inference_fps_per_camera", 10))
+
+
+_PART_END = b"\r\n"
+
+
+def _mjpeg_part(jpeg: np.ndarray) -> Iterator[bytes | memoryview]:
+    """One multipart/x-mixed-replace part; the JPEG buffer is sent as-is, never concatenated."""
+    yield b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % jpeg.nbytes
+    yield memoryview(jpeg)
+    yield _PART_END
+
+
+def generate_frames(camera_id: str | None = None) -> Generator[bytes | memoryview, None, None]:
+    """Generate MJPEG frames for streaming (overlay from the camera's latest detection)."""
+    worker = cameras.get(camera_id)
+    worker.active_streams += 1
+    canvas: np.ndarray | None = None
+    last = 0
+    try:
+        while True:
+            with worker.ring.read(last, timeout=5.0) as lease:
+                if lease is None:
+                    if not worker.connected:
+                        break
+                    continue
+                last = lease.seq
+                latest = detection_loop.latest.get(worker.camera_id)
+                started = time.perf_counter()
+                if latest:
+                    # Draw into this stream's own reusable canvas, never into the shared slot
+                    if canvas is None or canvas.shape != lease.frame.shape:
+                        canvas = np.empty_like(lease.frame)
+                    image = detector.annotate(lease.frame, latest["detection"], out=canvas)
+                    _ANNOTATE.since(started)
+                    started = time.perf_counter()
+                else:
+                    image = lease.frame
+                _, jpeg = cv2.imencode(".jpg", image)
+                _ENCODE.since(started)
+            worker.last_shown = (time.monotonic(), jpeg, latest["metrics"] if latest else NO_METRICS)
+            worker.frames_streamed += 1
+            yield from _mjpeg_part(jpeg)
+    finally:
+        worker.active_streams -= 1
+
+
+def get_detection_metrics(camera_id: str | None = None) -> dict:
+    """Process the camera's latest frame and return metrics for weight estimation."""
+    with cameras.get(camera_id).ring.read(timeout=2.0) as lease:
+        if lease is None:
+            return dict(NO_METRICS)
+        started = time.perf_counter()
+        detection = detector.detect([lease.frame])[0]
+        _INFERENCE.since(started)
+    return _weight_metrics(detection["total"])
+
+
+def process_uploaded_image(image_bytes: bytes, timings: dict | None = None) -> tuple[bytes, dict]:
+    """
+    Run YOLO on uploaded image, return annotated JPEG bytes + metrics.
+    The image is decoded at most UPLOAD_MAX_SIDE pixels on its longest side;
+    ValueError for unsupported, oversized or corrupt images.
+    Stage durations (seconds) are recorded, and copied into ``timings`` if given.
+    """
+    t0 = time.perf_counter()
+    frame = decode_capped(image_bytes, UPLOAD_MAX_SIDE, UPLOAD_MAX_PIXELS)
     if frame is None:
         raise ValueError("Invalid image")
-    results = model(frame, device=device, conf=0.5, verbose=False)[0]
-    annotated = results.plot()
+    t1 = time.perf_counter()
+    detection = detector.detect([frame])[0]
+    t2 = time.perf_counter()
+    annotated = detector.annotate(frame, detection)
+    t3 = time.perf_counter()
     _, buffer = cv2.imencode(".jpg", annotated)
-    boxes = results.boxes
-    n = len(boxes) if boxes is not None else 0
-    weight_kg = round(12.5 + (n * 3.2), 1)
-    conf = min(0.95, 0.4 + (n * 0.1)) if n > 0 else 0.35
-    metrics = {"weight_kg": weight_kg, "detection_count": n, "confidence": round(conf, 2)}
-    return buffer.tobytes(), metrics
-
-
-def capture_frame() -> tuple[bytes | None, dict]:
-    """Capture one frame, run YOLO, return annotated bytes + metrics."""
-    camera = get_camera()
-    ret, frame = camera.read()
-    if not ret:
-        return None, {"weight_kg": 0, "detection_count": 0, "confidence": 0}
-    results = model(frame, device=device, conf=0.5, verbose=False)[0]
-    annotated = results.plot()
+    t4 = time.perf_counter()
+    _DECODE.observe(t1 - t0)
+    _INFERENCE.observe(t2 - t1)
+    _ANNOTATE.observe(t3 - t2)
+    _ENCODE.observe(t4 - t3)
+    if timings is not None:
+        timings.update(decode=t1 - t0, inference=t2 - t1, annotate=t3 - t2, encode=t4 - t3)
+    return buffer.tobytes(), _weight_metrics(detection["total"])
+
+
+def capture_frame(camera_id: str | None = None) -> tuple[bytes | None, dict]:
+    """
+    Return annotated JPEG bytes + metrics of the frame the operator is seeing.
+    While the camera is being streamed this is the last frame sent to a viewer
+    (no decode or inference); otherwise the newest grabbed frame is analysed.
+    """
+    worker = cameras.get(camera_id)
+    shown = worker.last_shown
+    if shown is not None and time.monotonic() - shown[0] <= SHOWN_FRAME_MAX_AGE_S:
+        return shown[1].tobytes(), dict(shown[2])
+    with worker.ring.read(timeout=2.0) as lease:
+        if lease is None:
+            return None, dict(NO_METRICS)
+        started = time.perf_counter()
+        detection = detector.detect([lease.frame])[0]
+        _INFERENCE.since(started)
+        annotated = detector.annotate(lease.frame, detection)
     _, buffer = cv2.imencode(".jpg", annotated)
-    boxes = results.boxes
-    n = len(boxes) if boxes is not None else 0
-    weight_kg = round(12.5 + (n * 3.2), 1)
-    conf = min(0.95, 0.4 + (n * 0.1)) if n > 0 else 0.35
-    metrics = {"weight_kg": weight_kg, "detection_count": n, "confidence": round(conf, 2)}
-    return buffer.tobytes(), metrics
+    return buffer.tobytes(), _weight_metrics(detection["total"])
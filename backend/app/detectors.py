@@ -0,0 +1,383 @@
+"""Jute detectors: a common batched interface, backends and a per-process registry.
+
+Both front ends (the FastAPI backend and the Streamlit app) obtain their
+detector through ``get_detector()`` so a model is loaded once per process and
+inference work benefits both.
+"""
+import abc
+import ast
+import hashlib
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.settings import get_settings
+from app.telemetry import MODEL_LOAD_SECONDS
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+JUTE_MODEL_PATH = ROOT_DIR / "models" / "jute_vision_yolov11.pt"
+JUTE_ONNX_PATH = ROOT_DIR / "models" / "jute_vision_yolov11.onnx"
+GENERIC_MODEL_PATH = ROOT_DIR / "yolo11n.pt"
+
+GRADE_KEYS = ("grade_a", "grade_b", "grade_c", "grade_d")
+# Model class names that map onto audit grades; other classes only add to total
+CLASS_GRADES = {
+    "grade_a": "grade_a", "premium": "grade_a",
+    "grade_b": "grade_b", "export": "grade_b",
+    "grade_c": "grade_c", "local": "grade_c",
+    "grade_d": "grade_d", "reject": "grade_d",
+}
+
+
+def class_grade(class_name: str) -> str | None:
+    """Audit grade for a model class name; "Grade A", "grade-a" and "grade_a" are the same class."""
+    return CLASS_GRADES.get(class_name.strip().lower().replace(" ", "_").replace("-", "_"))
+
+# material -> ((low, high) count range, (A, B, C) fractions); D takes the rest
+MATERIAL_PROFILES = {
+    "sacks": ((25, 75), (0.30, 0.40, 0.20)),
+    "fiber": ((60, 180), (0.25, 0.35, 0.25)),
+    "sliver": ((80, 200), (0.20, 0.40, 0.30)),
+    "yarns": ((100, 300), (0.25, 0.35, 0.30)),
+    "bales": ((40, 120), (0.15, 0.35, 0.35)),
+    "rolls": ((120, 350), (0.20, 0.30, 0.35)),
+}
+DEFAULT_MATERIAL = "rolls"
+
+# Sample stride for digests of decoded images (every Nth row/column)
+_DIGEST_STRIDE = 16
+
+
+def content_seed(image) -> int:
+    """Cheap 64-bit content digest of an image, used to seed per-image RNGs.
+
+    Encoded bytes (bytes, BytesIO, UploadedFile) are hashed in full through a
+    zero-copy view. Decoded images (NumPy arrays, PIL images) are hashed from a
+    strided sample plus their shape, never from a full-size copy.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        h.update(image)
+    elif hasattr(image, "getbuffer"):
+        view = image.getbuffer()
+        h.update(view)
+        view.release()
+    elif isinstance(image, np.ndarray):
+        h.update(repr(image.shape).encode())
+        h.update(np.ascontiguousarray(image[::_DIGEST_STRIDE, ::_DIGEST_STRIDE]).data)
+    elif hasattr(image, "reduce") and hasattr(image, "size"):  # PIL.Image
+        h.update(f"{image.mode}{image.size}".encode())
+        h.update(image.reduce(_DIGEST_STRIDE).tobytes())
+    else:
+        raise TypeError(f"Unsupported image type: {type(image).__name__}")
+    return int.from_bytes(h.digest(), "little")
+
+
+def file_version(path: Path) -> str:
+    """Short content hash identifying a weights file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def to_bgr(image) -> np.ndarray:
+    """Decode/convert one input (encoded bytes, file buffer, PIL, ndarray) to BGR."""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)) or hasattr(image, "getbuffer"):
+        view = image.getbuffer() if hasattr(image, "getbuffer") else image
+        frame = cv2.imdecode(np.frombuffer(view, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Invalid image")
+        return frame
+    if hasattr(image, "convert"):  # PIL.Image
+        return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    raise TypeError(f"Unsupported image type: {type(image).__name__}")
+
+
+def _empty_boxes() -> dict:
+    return {
+        "boxes": np.zeros((0, 4), dtype=np.float32),
+        "scores": np.zeros(0, dtype=np.float32),
+        "class_ids": np.zeros(0, dtype=np.int64),
+    }
+
+
+class Detector(abc.ABC):
+    """Common detector interface.
+
+    ``detect(images, material_type)`` takes a batch of images and returns one
+    detection dict per image with ``total``, ``grade_a``..``grade_d``,
+    ``confidence`` and the raw ``boxes``/``scores``/``class_ids`` arrays.
+    Implementations keep no per-call global state so a single instance can be
+    shared across threads.
+    """
+
+    name = "base"
+    classes: list[str] = []
+    input_size = 640
+    version = ""
+
+    @property
+    def info(self) -> dict:
+        """Model metadata: backend name, class names, input size, version hash."""
+        return {
+            "name": self.name,
+            "classes": list(self.classes),
+            "input_size": self.input_size,
+            "version": self.version,
+        }
+
+    @abc.abstractmethod
+    def detect(self, images: list, material_type: str | None = None) -> list[dict]:
+        """Run the model on a batch of images; one detection dict per image."""
+
+    def annotate(self, frame: np.ndarray, detection: dict, out: np.ndarray | None = None) -> np.ndarray:
+        """Draw a detection's boxes onto a copy of ``frame`` (into ``out`` if given, to avoid allocating)."""
+        if out is None:
+            out = frame.copy()
+        elif out is not frame:
+            np.copyto(out, frame)
+        for (x1, y1, x2, y2), score, cls in zip(detection["boxes"], detection["scores"], detection["class_ids"]):
+            label = self.classes[cls] if 0 <= cls < len(self.classes) else str(cls)
+            cv2.rectangle(out, (int(x1), int(y1)), (int(x2), int(y2)), (120, 200, 80), 2)
+            cv2.putText(out, f"{label} {score:.2f}", (int(x1), max(int(y1) - 5, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (120, 200, 80), 1)
+        return out
+
+    def _summarize(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray) -> dict:
+        """Build the common detection dict from raw model outputs."""
+        det = {"total": int(len(boxes))}
+        det.update({k: 0 for k in GRADE_KEYS})
+        if len(class_ids):
+            counts = np.bincount(class_ids, minlength=len(self.classes))
+            for cls, count in enumerate(counts):
+                grade = class_grade(self.classes[cls]) if cls < len(self.classes) else None
+                if grade:
+                    det[grade] += int(count)
+        det["confidence"] = float(scores.mean()) if len(scores) else 0.0
+        det.update({"boxes": boxes, "scores": scores, "class_ids": class_ids})
+        return det
+
+
+class SimulatedDetector(Detector):
+    """Deterministic stand-in for a jute model, used for demos and load tests.
+
+    Results depend only on image content and material type: each image gets
+    its own ``np.random.Generator`` seeded from ``content_seed``, and grade
+    splits are computed for the whole batch in one vectorized step.
+    """
+
+    name = "simulator"
+    classes = list(GRADE_KEYS)
+    version = hashlib.sha256(repr(sorted(MATERIAL_PROFILES.items())).encode()).hexdigest()[:12]
+
+    def detect(self, images: list, material_type: str | None = None) -> list[dict]:
+        if not images:
+            return []
+        (low, high), fractions = MATERIAL_PROFILES.get(material_type, MATERIAL_PROFILES[DEFAULT_MATERIAL])
+        n = len(images)
+        totals = np.empty(n, dtype=np.int64)
+        confidences = np.empty(n, dtype=np.float64)
+        for i, image in enumerate(images):
+            rng = np.random.default_rng(content_seed(image))
+            totals[i] = rng.integers(low, high)
+            confidences[i] = rng.uniform(0.87, 0.97)
+
+        grades = np.empty((n, 4), dtype=np.int64)
+        grades[:, :3] = np.floor(totals[:, None] * np.asarray(fractions)).astype(np.int64)
+        grades[:, 3] = totals - grades[:, :3].sum(axis=1)
+
+        return [
+            {
+                "total": int(totals[i]),
+                **{k: int(grades[i, j]) for j, k in enumerate(GRADE_KEYS)},
+                "confidence": float(confidences[i]),
+                **_empty_boxes(),
+            }
+            for i in range(n)
+        ]
+
+
+class UltralyticsDetector(Detector):
+    """YOLO weights (.pt or any format Ultralytics can load) via Ultralytics."""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path: Path | str, conf: float = 0.5):
+        import torch
+        from ultralytics import YOLO
+
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.conf = conf
+        self.model = YOLO(str(model_path))
+        self.classes = [self.model.names[i] for i in sorted(self.model.names)]
+        self.input_size = int(self.model.overrides.get("imgsz") or 640)
+        self.version = file_version(Path(model_path)) if Path(model_path).exists() else str(model_path)
+
+    def detect(self, images: list, material_type: str | None = None) -> list[dict]:
+        if not images:
+            return []
+        frames = [to_bgr(img) for img in images]
+        results = self.model(frames, device=self.device, conf=self.conf, verbose=False)
+        detections = []
+        for r in results:
+            boxes = r.boxes
+            if boxes is None or len(boxes) == 0:
+                det = self._summarize(**_empty_boxes())
+            else:
+                det = self._summarize(
+                    boxes.xyxy.cpu().numpy(),
+                    boxes.conf.cpu().numpy(),
+                    boxes.cls.cpu().numpy().astype(np.int64),
+                )
+            det["result"] = r
+            detections.append(det)
+        return detections
+
+    def annotate(self, frame: np.ndarray, detection: dict, out: np.ndarray | None = None) -> np.ndarray:
+        result = detection.get("result")
+        if result is not None:
+            # Overlay onto the given frame, which may be newer than the inferred one
+            plotted = result.plot(img=frame)
+            if out is None:
+                return plotted
+            np.copyto(out, plotted)
+            return out
+        return super().annotate(frame, detection, out=out)
+
+
+class OnnxDetector(Detector):
+    """Exported YOLO model (``yolo export format=onnx``) run with ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: Path | str, conf: float = 0.5, iou: float = 0.45):
+        import onnxruntime as ort
+
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(str(model_path), providers=providers)
+        self.conf = conf
+        self.iou = iou
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_size = int(inp.shape[-1]) if isinstance(inp.shape[-1], int) else 640
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        names = ast.literal_eval(names) if names else {}
+        self.classes = [names[i] for i in sorted(names)]
+        self.version = file_version(Path(model_path))
+
+    def _letterbox(self, frame: np.ndarray) -> tuple[np.ndarray, float, tuple[int, int]]:
+        h, w = frame.shape[:2]
+        scale = self.input_size / max(h, w)
+        nh, nw = round(h * scale), round(w * scale)
+        top, left = (self.input_size - nh) // 2, (self.input_size - nw) // 2
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        blob = cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True)
+        return blob, scale, (left, top)
+
+    def detect(self, images: list, material_type: str | None = None) -> list[dict]:
+        detections = []
+        for img in images:
+            frame = to_bgr(img)
+            blob, scale, (dx, dy) = self._letterbox(frame)
+            # YOLOv8/11 head: (1, 4 + num_classes, anchors) -> (anchors, 4 + num_classes)
+            out = self.session.run(None, {self.input_name: blob})[0][0].T
+            cls_scores = out[:, 4:]
+            class_ids = cls_scores.argmax(axis=1)
+            scores = cls_scores[np.arange(len(out)), class_ids]
+            keep = scores >= self.conf
+            out, scores, class_ids = out[keep], scores[keep], class_ids[keep]
+            cx, cy, bw, bh = out[:, 0], out[:, 1], out[:, 2], out[:, 3]
+            boxes = np.stack([cx - bw / 2 - dx, cy - bh / 2 - dy, cx + bw / 2 - dx, cy + bh / 2 - dy], axis=1) / scale
+            idx = cv2.dnn.NMSBoxes(
+                np.column_stack([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]]).tolist(),
+                scores.tolist(), self.conf, self.iou,
+            )
+            idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+            detections.append(self._summarize(
+                boxes[idx].astype(np.float32), scores[idx].astype(np.float32), class_ids[idx].astype(np.int64)
+            ))
+        return detections
+
+
+# --- Registry ---
+
+_instances: dict[str, Detector] = {}
+# (requested name, fallback) -> backend name, resolved once per process
+_resolved: dict[tuple[str | None, str], str] = {}
+_lock = threading.Lock()
+
+
+def _load_ultralytics() -> Detector:
+    path = JUTE_MODEL_PATH if JUTE_MODEL_PATH.exists() else GENERIC_MODEL_PATH
+    # Fallback name lets Ultralytics download the generic weights if needed
+    return UltralyticsDetector(path if path.exists() else "yolo11n.pt")
+
+
+def _load_onnx() -> Detector:
+    return OnnxDetector(JUTE_ONNX_PATH)
+
+
+BACKENDS = {
+    "ultralytics": _load_ultralytics,
+    "onnx": _load_onnx,
+    "simulator": SimulatedDetector,
+}
+
+
+def _module_available(name: str) -> bool:
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+def resolve_detector_name(name: str | None = None, fallback: str = "simulator") -> str:
+    """Pick a backend: explicit name, then the ``detector`` setting, then auto.
+
+    Auto prefers the jute-specific model (exported ONNX, then .pt) and
+    otherwise uses ``fallback``. The result is cached for the process (it
+    reads the settings file and probes the disk), so a changed setting takes
+    effect on restart, like the loaded model itself.
+    """
+    key = (name, fallback)
+    resolved = _resolved.get(key)
+    if resolved is None:
+        resolved = _resolved[key] = _resolve(name, fallback)
+    return resolved
+
+
+def _resolve(name: str | None, fallback: str) -> str:
+    name = name or get_settings().get("detector", "auto")
+    if name != "auto":
+        return name
+    if JUTE_ONNX_PATH.exists() and _module_available("onnxruntime"):
+        return "onnx"
+    if JUTE_MODEL_PATH.exists() and _module_available("ultralytics"):
+        return "ultralytics"
+    return fallback
+
+
+def get_detector(name: str | None = None, fallback: str = "simulator") -> Detector:
+    """Return the shared detector for this process, loading it on first use."""
+    name = resolve_detector_name(name, fallback)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {name}")
+    det = _instances.get(name)
+    if det is None:
+        with _lock:
+            det = _instances.get(name)
+            if det is None:
+                started = time.perf_counter()
+                det = _instances[name] = BACKENDS[name]()
+                MODEL_LOAD_SECONDS.labels(name, multiprocessing.current_process().name).set(
+                    round(time.perf_counter() - started, 3)
+                )
+    return det
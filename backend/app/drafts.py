@@ -0,0 +1,168 @@
+"""Durable audit drafts: per-field metadata in SQLite, images as blobs.
+
+A draft is stored one row per top-level field, each with the field's leaf
+digest from app.audit_hash. Saving compares digests and writes only the
+fields that changed, so re-saving a large audit after editing the mill name
+is one small row update; image lists are stored as blob digests (app.blobs),
+so image bytes are written once however often the draft is saved; a save
+that replaces or drops an image list collects the blobs no draft references
+any more. A
+separate summary table (inspector, mill, timestamps) makes listing drafts a
+single indexed query that never loads fields or images.
+"""
+import io
+import json
+import sqlite3
+import threading
+import time
+
+from app.audit_hash import IMAGE_FIELDS, AuditDict, field_digest, image_view
+from app.blobs import BlobStore
+from app.settings import DRAFTS_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    audit_id TEXT PRIMARY KEY,
+    inspector TEXT NOT NULL DEFAULT '',
+    mill_name TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drafts_updated ON drafts (updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS draft_fields (
+    audit_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (audit_id, field)
+) WITHOUT ROWID;
+"""
+
+
+class DraftStore:
+    """Drafts keyed by audit_id; one connection per thread, WAL journaling."""
+
+    def __init__(self, root=DRAFTS_DIR):
+        self.root = root
+        self.blobs = BlobStore(root / "blobs")
+        self._local = threading.local()
+        # Held while blobs are added or collected, so GC never removes a blob
+        # whose draft row is still being written
+        self._blob_lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "drafts.db", timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _encode(self, field: str, value) -> str:
+        if field not in IMAGE_FIELDS:
+            return json.dumps(value, default=str)
+        items = []
+        for img in value or []:
+            view = image_view(img)
+            if view is None:
+                items.append({"ref": img})  # placeholder such as a burst marker
+                continue
+            try:
+                items.append(self.blobs.put(view))
+            finally:
+                view.release()
+        return json.dumps(items, default=str)
+
+    def _decode(self, field: str, value: str):
+        data = json.loads(value)
+        if field not in IMAGE_FIELDS:
+            return data
+        return [item["ref"] if isinstance(item, dict) else io.BytesIO(self.blobs.get(item)) for item in data]
+
+    def save(self, audit_data: dict) -> int:
+        """Save a draft, writing only fields whose content changed; returns the number written."""
+        audit_id = audit_data["audit_id"]
+        digests = {k: field_digest(k, v).hex() for k, v in audit_data.items()}
+        conn = self._conn()
+        stored = dict(conn.execute(
+            "SELECT field, digest FROM draft_fields WHERE audit_id = ?", (audit_id,)
+        ).fetchall())
+        changed = [k for k, d in digests.items() if stored.get(k) != d]
+        removed = [k for k in stored if k not in digests]
+        now = time.time()
+        with self._blob_lock:
+            rows = [(audit_id, k, digests[k], self._encode(k, audit_data[k])) for k in changed]
+            with conn:
+                conn.execute(
+                    "INSERT INTO drafts (audit_id, inspector, mill_name, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (audit_id) DO UPDATE SET inspector = excluded.inspector, "
+                    "mill_name = excluded.mill_name, updated_at = excluded.updated_at",
+                    (audit_id, str(audit_data.get("inspector") or ""), str(audit_data.get("mill_name") or ""),
+                     now, now),
+                )
+                conn.executemany("INSERT OR REPLACE INTO draft_fields VALUES (?, ?, ?, ?)", rows)
+                conn.executemany("DELETE FROM draft_fields WHERE audit_id = ? AND field = ?",
+                                 [(audit_id, k) for k in removed])
+        # Replaced or dropped image lists may leave blobs nothing references
+        if any(k in IMAGE_FIELDS and k in stored for k in changed + removed):
+            self.collect_garbage()
+        return len(rows) + len(removed)
+
+    def list(self, limit: int = 100) -> list[dict]:
+        """Draft summaries (audit_id, inspector, mill_name, timestamps), most recently saved first."""
+        rows = self._conn().execute(
+            "SELECT * FROM drafts ORDER BY updated_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM drafts").fetchone()[0]
+
+    def load(self, audit_id: str) -> AuditDict | None:
+        """The saved audit, images as fresh BytesIO buffers; None if there is no such draft."""
+        rows = self._conn().execute(
+            "SELECT field, value FROM draft_fields WHERE audit_id = ?", (audit_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        return AuditDict({r["field"]: self._decode(r["field"], r["value"]) for r in rows})
+
+    def delete(self, audit_id: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM draft_fields WHERE audit_id = ?", (audit_id,))
+            conn.execute("DELETE FROM drafts WHERE audit_id = ?", (audit_id,))
+        self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """Delete image blobs no draft references any more."""
+        with self._blob_lock:
+            keep = set()
+            rows = self._conn().execute(
+                f"SELECT value FROM draft_fields WHERE field IN ({', '.join('?' * len(IMAGE_FIELDS))})", IMAGE_FIELDS
+            )
+            for r in rows:
+                keep.update(item for item in json.loads(r["value"]) if isinstance(item, str))
+            removed = 0
+            for digest in list(self.blobs.digests()):
+                if digest not in keep:
+                    self.blobs.delete(digest)
+                    removed += 1
+        return removed
+
+
+_store: DraftStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_draft_store() -> DraftStore:
+    """Shared draft store for this process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DraftStore()
+    return _store
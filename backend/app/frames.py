@@ -0,0 +1,118 @@
+"""Preallocated frame ring for one camera.
+
+The capture thread decodes straight into a free slot (``VideoCapture.retrieve``
+with an output array), then publishes the slot index. Inference and MJPEG
+encoding lease the newest slot instead of receiving a copy; a leased slot is
+never overwritten, and the writer skips it until it is released. Capture,
+detection and streaming are threads of one process, so the slots are one
+ordinary NumPy block allocated per resolution.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+
+RING_SLOTS = 8
+
+
+class FrameLease:
+    """A pinned view of one published frame; call ``release()`` when done."""
+
+    __slots__ = ("seq", "ts", "frame", "_ring", "_pins", "_index")
+
+    def __init__(self, ring: "FrameRing", pins: list[int], index: int, seq: int, ts: float, frame: np.ndarray):
+        self._ring = ring
+        self._pins = pins
+        self._index = index
+        self.seq = seq
+        self.ts = ts
+        self.frame = frame
+
+    def release(self) -> None:
+        if self._index >= 0:
+            self._ring._unpin(self._pins, self._index)
+            self._index = -1
+
+
+class FrameRing:
+    """Ring of frame slots with latest-frame semantics for readers."""
+
+    def __init__(self, slots: int = RING_SLOTS):
+        self.slots = slots
+        self.shape: tuple | None = None
+        self.seq = 0
+        self.ts = 0.0
+        self._cond = threading.Condition()
+        self._frames: list[np.ndarray] = []
+        # Replaced (not reset) on reallocation, so stale leases unpin the old list
+        self._pins: list[int] = [0] * slots
+        self._latest = -1
+        self._next = 0
+
+    def _allocate(self, shape: tuple) -> None:
+        # Leases of the old block keep their views alive until released
+        self._frames = list(np.empty((self.slots, *shape), dtype=np.uint8))
+        self._pins = [0] * self.slots
+        self._latest = -1
+        self.shape = shape
+
+    # --- Writer (capture thread) ---
+
+    def claim(self, shape: tuple) -> tuple[int, np.ndarray] | None:
+        """Reserve a free slot for a frame of ``shape``; None if every slot is leased."""
+        with self._cond:
+            if shape != self.shape:
+                self._allocate(shape)
+            for i in range(self.slots):
+                index = (self._next + i) % self.slots
+                if self._pins[index] == 0 and index != self._latest:
+                    self._pins[index] = 1
+                    self._next = index + 1
+                    return index, self._frames[index]
+            return None
+
+    def commit(self, index: int, ts: float) -> None:
+        """Publish a claimed slot as the newest frame."""
+        with self._cond:
+            self._pins[index] -= 1
+            self._latest = index
+            self.seq += 1
+            self.ts = ts
+            self._cond.notify_all()
+
+    def abort(self, index: int) -> None:
+        with self._cond:
+            self._pins[index] -= 1
+
+    # --- Readers ---
+
+    def acquire(self, newer_than: int = 0, timeout: float = 0.0) -> FrameLease | None:
+        """Lease the newest frame if its seq is above ``newer_than`` (waiting up to ``timeout``)."""
+        with self._cond:
+            if timeout > 0:
+                self._cond.wait_for(lambda: self.seq > newer_than, timeout)
+            if self.seq <= newer_than or self._latest < 0:
+                return None
+            index = self._latest
+            self._pins[index] += 1
+            return FrameLease(self, self._pins, index, self.seq, self.ts, self._frames[index])
+
+    @contextmanager
+    def read(self, newer_than: int = 0, timeout: float = 0.0) -> Iterator[FrameLease | None]:
+        lease = self.acquire(newer_than, timeout)
+        try:
+            yield lease
+        finally:
+            if lease is not None:
+                lease.release()
+
+    def _unpin(self, pins: list[int], index: int) -> None:
+        with self._cond:
+            pins[index] -= 1
+
+    def close(self) -> None:
+        with self._cond:
+            self._frames = []
+            self._latest = -1
+            self.shape = None
@@ -0,0 +1,142 @@
+"""Image header inspection and size-capped decoding for uploads.
+
+``inspect_image`` reads the format and dimensions from the first bytes of a
+file without decoding it, so oversized images and decompression bombs (a
+small PNG that inflates to gigabytes) are refused before any pixel buffer is
+allocated.
+
+Phone photos are 12-48 MP while the detector works at 640 px, so uploads
+are decoded straight to a capped working resolution. For JPEG the
+dimensions are read from the header first and libjpeg's DCT scaling
+(``IMREAD_REDUCED_COLOR_2/4/8``) decodes at 1/2, 1/4 or 1/8 size, which
+skips most of the decode work; anything still above the cap is resized down.
+"""
+import cv2
+import numpy as np
+
+# (factor, flag), largest reduction first
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) are not SOFs
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_dimensions(data: bytes) -> tuple[int, int] | None:
+    """(width, height) from a JPEG's frame header, or None if it is not a readable JPEG."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers
+            i += 2
+            continue
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        if marker == 0xDA:  # start of scan without a frame header
+            return None
+        i += 2 + length
+    return None
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def _png_dimensions(data: bytes) -> tuple[int, int] | None:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+
+
+def _webp_dimensions(data: bytes) -> tuple[int, int] | None:
+    chunk = data[12:16]
+    if chunk == b"VP8X" and len(data) >= 30:
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8 " and len(data) >= 30:
+        return int.from_bytes(data[26:28], "little") & 0x3FFF, int.from_bytes(data[28:30], "little") & 0x3FFF
+    return None
+
+
+def _bmp_dimensions(data: bytes) -> tuple[int, int] | None:
+    if len(data) < 26:
+        return None
+    width = int.from_bytes(data[18:22], "little", signed=True)
+    height = int.from_bytes(data[22:26], "little", signed=True)
+    return abs(width), abs(height)  # negative height = top-down rows
+
+
+# Formats accepted for upload: magic check, header parser
+_FORMATS = (
+    ("jpeg", lambda d: d[:3] == b"\xff\xd8\xff", jpeg_dimensions),
+    ("png", lambda d: d[:8] == b"\x89PNG\r\n\x1a\n", _png_dimensions),
+    ("webp", lambda d: d[:4] == b"RIFF" and d[8:12] == b"WEBP", _webp_dimensions),
+    ("bmp", lambda d: d[:2] == b"BM", _bmp_dimensions),
+)
+# Enough of the file for any of the headers above (JPEG EXIF/ICC segments
+# can push the frame header well past the first few KB)
+HEADER_BYTES = 256 * 1024
+
+
+def inspect_image(head: bytes) -> tuple[str, int, int]:
+    """(format, width, height) from the start of an image file, without decoding it.
+
+    Raises ValueError for unsupported formats or unreadable headers.
+    """
+    for name, matches, dimensions in _FORMATS:
+        if matches(head):
+            size = dimensions(head)
+            if not size or not all(size):
+                raise ValueError(f"Unreadable {name.upper()} header")
+            return name, *size
+    raise ValueError("Unsupported image format (expected JPEG, PNG, WebP or BMP)")
+
+
+def check_image(head: bytes, max_pixels: int = 0) -> tuple[str, int, int]:
+    """``inspect_image`` plus a pixel-count limit (0 = none); ImageTooLarge when over it."""
+    name, width, height = inspect_image(head)
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height}, over the {max_pixels / 1e6:g} MP limit")
+    return name, width, height
+
+
+def reduced_flag(width: int, height: int, max_side: int) -> int:
+    """Largest JPEG decode reduction that keeps the longest side at or above ``max_side``."""
+    longest = max(width, height)
+    for factor, flag in _REDUCED:
+        if longest // factor >= max_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_capped(data: bytes, max_side: int = 0, max_pixels: int = 0) -> np.ndarray | None:
+    """Decode to BGR with the longest side at most ``max_side`` (0 = full size); None if undecodable.
+
+    The header is checked first; ValueError for unsupported formats or images
+    over ``max_pixels``.
+    """
+    name, width, height = check_image(data[:HEADER_BYTES], max_pixels)
+    flag = cv2.IMREAD_COLOR
+    if max_side > 0 and name == "jpeg":
+        flag = reduced_flag(width, height, max_side)
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if frame is None:
+        return None
+    height, width = frame.shape[:2]
+    if max_side > 0 and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
@@ -0,0 +1,316 @@
+"""Process pool for upload inference (one model per worker process).
+
+The API process only moves bytes: an uploaded image is copied into a
+preallocated shared-memory slot, a worker process decodes it, runs the
+detector, annotates and re-encodes, and writes the JPEG back into the same
+slot. Only slot indices, sizes and metrics cross the process boundary, so
+images are never pickled. Two shared arrays record, per slot, the request
+queued in it and the pid of the worker that claimed it; a worker claims a
+slot under their lock before touching it and skips requests cancelled in
+the meantime, so the pool always knows whether a slot may still be written. Each worker can be pinned to its own set of cores
+with bounded intra-op threads, which lets N workers scale with the machine
+instead of contending for one GIL and one model.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+from app.settings import get_settings
+from app.telemetry import MODEL_LOAD_SECONDS, STAGES
+
+SLOT_BYTES = 16 * 1024 * 1024
+SLOTS_PER_WORKER = 2
+READY_TIMEOUT_S = 120.0
+RESULT_TIMEOUT_S = 300.0
+# Longest a request waits for a free slot before the pool reports itself busy
+SLOT_TIMEOUT_S = 30.0
+
+
+class PoolBusy(RuntimeError):
+    """No inference slot became free in time."""
+
+
+def _worker_main(index: int, cpus: list[int] | None, threads: int, slot_names: list[str],
+                 slot_req, slot_pid, requests, results) -> None:
+    # Bound every threading runtime before the libraries are imported
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    started = time.perf_counter()
+    from app.camera import detector, process_uploaded_image
+
+    slots = [SharedMemory(name=name) for name in slot_names]
+    results.put(("ready", index, detector.name, time.perf_counter() - started, None))
+    pid = os.getpid()
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        req_id, slot, size, payload = item
+        with slot_req.get_lock():
+            # Cancelled, re-queued after a crash and already claimed, or reused
+            if slot_req[slot] != req_id or slot_pid[slot] != 0:
+                continue
+            slot_pid[slot] = pid
+        timings = {}
+        try:
+            buf = slots[slot].buf
+            annotated, metrics = process_uploaded_image(buf[:size] if payload is None else payload, timings)
+            # Stage timings ride along with the metrics; the API process records them
+            metrics["_timings"] = timings
+            if len(annotated) <= len(buf):
+                buf[:len(annotated)] = annotated
+                results.put((req_id, len(annotated), None, metrics, None))
+            else:
+                results.put((req_id, -1, annotated, metrics, None))
+        except Exception as e:
+            results.put((req_id, 0, None, None, (type(e).__name__, str(e))))
+    for shm in slots:
+        shm.close()
+
+
+class InferencePool:
+    """N detector processes fed through shared-memory slots."""
+
+    def __init__(self, workers: int, threads_per_worker: int = 1, pin_cores: bool = False,
+                 slot_bytes: int = SLOT_BYTES):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.pin_cores = pin_cores
+        self.slot_bytes = slot_bytes
+        self._ctx = get_context("spawn")
+        self._slots: list[SharedMemory] = []
+        self._free: queue.Queue[int] = queue.Queue()
+        self._pending: dict[int, Future] = {}
+        # Slot of every request until its slot is released; a timed-out request
+        # claimed by a worker stays here (retired) until that worker answers or dies
+        self._req_slots: dict[int, int] = {}
+        # Queue item of every unanswered request, to re-queue it if a worker
+        # died after dequeuing it but before claiming its slot
+        self._items: dict[int, tuple] = {}
+        # Per slot: queued request id (-1 = none) and claiming worker pid (0 = none)
+        self._slot_req = None
+        self._slot_pid = None
+        self._workers_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._procs: list = []
+        self._requests = None
+        self._results = None
+        self._collector: threading.Thread | None = None
+        self._stopping = False
+
+    def _cpus(self, index: int) -> list[int] | None:
+        if not self.pin_cores or not hasattr(os, "sched_getaffinity"):
+            return None
+        cores = sorted(os.sched_getaffinity(0))
+        per = max(1, len(cores) // self.workers)
+        return cores[index * per:(index + 1) * per] or None
+
+    def _spawn(self, index: int):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self._cpus(index), self.threads_per_worker, [shm.name for shm in self._slots],
+                  self._slot_req, self._slot_pid, self._requests, self._results),
+            name=f"inference-{index}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def start(self) -> None:
+        """Allocate the slots, spawn the workers and wait until every model is loaded."""
+        if self._procs:
+            return
+        self._stopping = False
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        n_slots = self.workers * SLOTS_PER_WORKER
+        lock = self._ctx.RLock()
+        self._slot_req = self._ctx.Array("q", [-1] * n_slots, lock=lock)
+        self._slot_pid = self._ctx.Array("q", n_slots, lock=lock)
+        for i in range(n_slots):
+            self._slots.append(SharedMemory(create=True, size=self.slot_bytes))
+            self._free.put(i)
+        self._procs = [self._spawn(i) for i in range(self.workers)]
+        for _ in range(self.workers):
+            self._ready(self._results.get(timeout=READY_TIMEOUT_S))
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        for _ in self._procs:
+            self._requests.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+            self._collector = None
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+        self._free = queue.Queue()
+        self._req_slots.clear()
+        self._items.clear()
+
+    def _release(self, req_id: int) -> None:
+        """Return a request's slot to the free list (once; later calls are no-ops)."""
+        self._items.pop(req_id, None)
+        slot = self._req_slots.pop(req_id, None)
+        if slot is None:
+            return
+        with self._slot_req.get_lock():
+            self._slot_req[slot] = -1
+            self._slot_pid[slot] = 0
+        self._free.put(slot)
+
+    def _check_workers(self) -> None:
+        """Replace crashed workers, fail the requests they claimed and re-queue any they lost."""
+        with self._workers_lock:
+            dead = set()
+            for i, proc in enumerate(self._procs):
+                if proc.is_alive() or self._stopping:
+                    continue
+                dead.add(proc.pid)
+                self._procs[i] = self._spawn(i)
+            if not dead:
+                return
+            with self._slot_req.get_lock():
+                claims = {req_id: (slot, self._slot_pid[slot]) for req_id, slot in list(self._req_slots.items())}
+            for req_id, (slot, pid) in claims.items():
+                if pid in dead:
+                    self._abandon(req_id)
+                elif pid == 0 and req_id in self._items:
+                    # Possibly dequeued by the dead worker before it claimed the
+                    # slot; a copy still in the queue is skipped once claimed
+                    self._requests.put(self._items[req_id])
+
+    def _abandon(self, req_id: int) -> None:
+        """A request whose worker died: fail it and free its slot (nothing writes to it now)."""
+        fut = self._pending.pop(req_id, None)
+        if fut is None and req_id not in self._items:
+            return  # answered; the caller still reads the slot and releases it
+        if fut is not None:
+            fut.set_exception(RuntimeError("Inference worker crashed"))
+        self._release(req_id)
+
+    def _collect(self) -> None:
+        while not self._stopping:
+            try:
+                req_id, size, data, metrics, error = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if req_id == "ready":
+                self._ready((req_id, size, data, metrics, error))
+                continue
+            self._items.pop(req_id, None)
+            fut = self._pending.pop(req_id, None)
+            if fut is not None:
+                fut.set_result((size, data, metrics, error))
+            else:
+                # Late answer to a timed-out request: its slot is safe to reuse now
+                self._release(req_id)
+
+    @staticmethod
+    def _ready(message: tuple) -> None:
+        _, index, backend, load_seconds, _ = message
+        MODEL_LOAD_SECONDS.labels(backend, f"inference-{index}").set(round(load_seconds, 3))
+
+    @property
+    def pending(self) -> int:
+        """Requests submitted and not yet answered."""
+        return len(self._pending)
+
+    def process(self, image_bytes: bytes, timings: dict | None = None) -> tuple[bytes, dict]:
+        """Same contract as camera.process_uploaded_image, run in a worker process.
+
+        Raises PoolBusy if no slot frees up within SLOT_TIMEOUT_S.
+        """
+        self._check_workers()
+        try:
+            slot = self._free.get(timeout=SLOT_TIMEOUT_S)
+        except queue.Empty:
+            raise PoolBusy(f"All {len(self._slots)} inference slots are busy") from None
+        req_id = next(self._ids)
+        fut = Future()
+        buf = self._slots[slot].buf
+        if len(image_bytes) <= len(buf):
+            buf[:len(image_bytes)] = image_bytes
+            item = (req_id, slot, len(image_bytes), None)
+        else:
+            item = (req_id, slot, 0, image_bytes)
+        with self._slot_req.get_lock():
+            self._slot_req[slot] = req_id
+            self._slot_pid[slot] = 0
+        self._req_slots[req_id] = slot
+        self._items[req_id] = item
+        self._pending[req_id] = fut
+        self._requests.put(item)
+        try:
+            size, data, metrics, error = fut.result(timeout=RESULT_TIMEOUT_S)
+        except TimeoutError:
+            with self._slot_req.get_lock():
+                claimed = self._slot_pid[slot] != 0
+                if not claimed:
+                    # Never claimed: cancel it, so a worker that dequeues it later skips it
+                    self._slot_req[slot] = -1
+            answered = self._pending.pop(req_id, None) is None
+            # A claimed slot may still be written: it stays retired until the
+            # answer arrives or the worker dies. If the answer won the race,
+            # the worker is done with the slot already.
+            if answered or not claimed:
+                self._release(req_id)
+            raise
+        except RuntimeError:
+            raise  # worker crashed; _abandon already freed the slot
+        try:
+            if error is not None:
+                raise (ValueError if error[0] == "ValueError" else RuntimeError)(error[1])
+            stage_timings = metrics.pop("_timings")
+            for stage, seconds in stage_timings.items():
+                STAGES[stage].observe(seconds)
+            if timings is not None:
+                timings.update(stage_timings)
+            return (bytes(buf[:size]) if data is None else data), metrics
+        finally:
+            self._release(req_id)
+
+
+_pool: InferencePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> InferencePool | None:
+    """Shared pool from the ``inference_workers`` setting; None (in-process inference) when 0."""
+    global _pool
+    if _pool is None:
+        settings = get_settings()
+        workers = int(settings.get("inference_workers") or 0)
+        if workers <= 0:
+            return None
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool(
+                    workers,
+                    threads_per_worker=int(settings.get("inference_threads_per_worker") or 1),
+                    pin_cores=bool(settings.get("inference_pin_cores")),
+                )
+    return _pool
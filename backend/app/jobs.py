@@ -0,0 +1,274 @@
+"""Local background job queue (SQLite-backed, thread worker pool, no broker).
+
+Heavy analysis and export work is submitted as a job: ``submit()`` returns a
+job id immediately, workers report progress while running, and results are
+persisted in the database plus a per-job directory for output files.
+Several processes can share one database; each claims only the job kinds it
+has handlers for. A running job carries its queue's owner id and a heartbeat
+the queue refreshes every few seconds; a job whose heartbeat is older than
+``LEASE_S`` (its process stopped or died) is re-queued by any queue that
+handles its kind, so work survives restarts without a live job running twice.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Callable
+
+from app.settings import JOBS_DIR
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# Finished jobs (and their files) are kept this long; pruned hourly by idle workers
+MAX_AGE_S = 7 * 86400
+PRUNE_INTERVAL_S = 3600
+# A running job whose owner has not refreshed its heartbeat for LEASE_S is reclaimed
+HEARTBEAT_S = 10
+LEASE_S = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {"owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+              "heartbeat_at": "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL"}
+
+# handler(payload, job_dir, progress) -> JSON-serializable result
+JobHandler = Callable[[dict, Path, Callable[[float], None]], dict]
+
+
+class JobQueue:
+    """Persistent job queue with a pool of worker threads."""
+
+    def __init__(self, root: Path = JOBS_DIR, workers: int = 2, max_attempts: int = 3, max_age_s: float = MAX_AGE_S):
+        self.root = root
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.max_age_s = max_age_s
+        # Identifies this queue's claims; unique per instance, so a re-created
+        # queue in the same process never mistakes older claims for its own
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._next_prune = 0.0
+        self._next_reclaim = 0.0
+        self._prune_lock = threading.Lock()
+        self._handlers: dict[str, JobHandler] = {}
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Condition()
+        self._local = threading.local()
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "jobs.db", timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    # --- Client side ---
+
+    def submit(self, kind: str, payload: dict | None = None, files: dict[str, bytes | Path] | None = None) -> str:
+        """Persist a job (and its input files) and wake a worker; returns the job id.
+
+        File values are bytes to write, or paths of spooled files to move into
+        the job directory (same filesystem, so no copy).
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        for name, data in (files or {}).items():
+            if isinstance(data, Path):
+                os.replace(data, job_dir / name)
+            else:
+                (job_dir / name).write_bytes(data)
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(payload or {}), now, now),
+        )
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Job status: id, kind, status, progress, result, error, timestamps."""
+        r = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if r is None:
+            return None
+        job = dict(r)
+        job.pop("payload")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    # --- Worker side ---
+
+    def start(self) -> None:
+        """Re-queue abandoned jobs, then start the worker pool and its heartbeat."""
+        if self._threads:
+            return
+        self.reclaim()
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(HEARTBEAT_S):
+            try:
+                self._conn().execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?", (time.time(), self.owner, RUNNING)
+                )
+            except sqlite3.Error:
+                pass  # busy database: the next beat is well within the lease
+
+    def reclaim(self) -> int:
+        """Re-queue running jobs of our kinds whose owner stopped heartbeating; returns the count.
+
+        A job that was already claimed ``max_attempts`` times (e.g. one that
+        keeps crashing its process) is marked failed instead.
+        """
+        kinds = list(self._handlers)
+        if not kinds:
+            return 0
+        now = time.time()
+        return self._conn().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = CASE WHEN attempts >= ? THEN 'Interrupted on every attempt' ELSE error END, "
+            "owner = NULL, updated_at = ? "
+            f"WHERE status = ? AND kind IN ({', '.join('?' * len(kinds))}) "
+            "AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (self.max_attempts, FAILED, QUEUED, self.max_attempts, now, RUNNING, *kinds, now - LEASE_S),
+        ).rowcount
+
+    def _claim(self) -> sqlite3.Row | None:
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            r = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND kind IN ({', '.join('?' * len(kinds))}) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, *kinds),
+            ).fetchone()
+            if r is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, heartbeat_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (RUNNING, self.owner, now, now, r["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return r
+
+    def _update(self, job_id: str, **fields) -> None:
+        """Update a job this queue is running (a no-op once it was reclaimed elsewhere)."""
+        fields["updated_at"] = fields["heartbeat_at"] = time.time()
+        self._conn().execute(
+            f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ? AND owner = ? AND status = ?",
+            (*fields.values(), job_id, self.owner, RUNNING),
+        )
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._maybe_reclaim()
+                self._maybe_prune()
+                with self._wake:
+                    self._wake.wait(timeout=1.0)
+                continue
+            job_id = job["id"]
+
+            def progress(fraction: float, job_id=job_id) -> None:
+                self._update(job_id, progress=round(min(max(fraction, 0.0), 1.0), 3))
+
+            try:
+                result = self._handlers[job["kind"]](json.loads(job["payload"]), self.job_dir(job_id), progress)
+                self._update(job_id, status=DONE, progress=1.0, result=json.dumps(result, default=str))
+            except Exception:
+                status = QUEUED if job["attempts"] + 1 < self.max_attempts else FAILED
+                self._update(job_id, status=status, error=traceback.format_exc(limit=5))
+
+    def _maybe_reclaim(self) -> None:
+        # Picks up jobs of another process that died while this one keeps running
+        if time.time() < self._next_reclaim:
+            return
+        self._next_reclaim = time.time() + LEASE_S / 2
+        try:
+            self.reclaim()
+        except sqlite3.Error:
+            pass
+
+    def _maybe_prune(self) -> None:
+        if time.time() < self._next_prune or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_prune = time.time() + PRUNE_INTERVAL_S
+            self.prune()
+        finally:
+            self._prune_lock.release()
+
+    def prune(self, max_age_s: float | None = None) -> int:
+        """Delete finished jobs (and their files) older than ``max_age_s`` (default: the queue's)."""
+        cutoff = time.time() - (self.max_age_s if max_age_s is None else max_age_s)
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+        ).fetchall()
+        for r in rows:
+            shutil.rmtree(self.job_dir(r["id"]), ignore_errors=True)
+            conn.execute("DELETE FROM jobs WHERE id = ?", (r["id"],))
+        return len(rows)
@@ -1,15 +1,26 @@
 """JuteVision FastAPI Backend - Production-ready business app."""
+import asyncio
 import base64
+import queue
+import re
 from contextlib import asynccontextmanager
-from datetime import datetime
 from pathlib import Path
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
-from app.camera import generate_frames, get_detection_metrics, release_camera, process_uploaded_image, capture_frame
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from app.audit_store import get_audit_store
+from app.batch_reports import render_batch, report_workers, write_consolidated_pdf
+from app.camera import UPLOAD_MAX_PIXELS, cameras, detection_loop, detector, generate_frames, get_detection_metrics, release_camera, process_uploaded_image, capture_frame
+from app.imaging import HEADER_BYTES, ImageTooLarge, check_image
+from app.inference import PoolBusy, get_inference_pool
+from app.jobs import JobQueue
+from app.pubsub import Hub
+from app.saved import SavedImageStore
+from app.session import DEFAULT_SESSION, AuditSession, SessionRegistry
+from app.uploads import BodyLimitMiddleware, ChecksumMismatch, OffsetMismatch, UploadNotFound, UploadStore
+from app import profiling, static, telemetry
 from app.settings import (
-    ensure_saves_dir,
     get_settings,
     set_app_pin,
     set_app_pin_enabled,
@@ -19,14 +30,133 @@ from app.settings import (
     verify_file_pin,
 )
 
-# Audit state (shared)
-audit_status = "idle"
-total_jute_scanned_kg = 0.0
+# Audit sessions; scanned totals are accumulated by the detection loop, per frame
+sessions = SessionRegistry()
+
+
+# Upload inference in worker processes when "inference_workers" > 0
+inference_pool = get_inference_pool()
+
+
+def _analyze_image(data: bytes) -> tuple[bytes, dict]:
+    # Stage timings go to the request's profiling record, if it is being traced
+    timings = profiling.current_timings()
+    if inference_pool is not None:
+        return inference_pool.process(data, timings)
+    return process_uploaded_image(data, timings)
+
+
+# Opt-in profiling and per-request timing logs (settings are read once, here)
+profiler = profiling.Profiler.from_settings(get_settings())
+
+
+# Background analysis jobs (persisted under jobs/, survive restarts);
+# enough job threads to keep every inference worker busy
+job_queue = JobQueue(workers=max(2, inference_pool.workers if inference_pool else 0))
+
+
+# Saved captures/uploads: date-sharded files, indexed, with background retention
+saved_images = SavedImageStore()
+
+
+async def _save_image(data: bytes, kind: str) -> str:
+    """Queue an image for the write-behind writer; returns its final name without waiting for the disk."""
+    try:
+        return saved_images.save_later(data, kind)
+    except queue.Full:
+        # Writer is far behind: write this one ourselves rather than grow memory
+        return await run_in_threadpool(saved_images.save, data, kind)
+
+
+# Resumable chunked uploads, spooled under uploads/ until finalized into a job
+upload_store = UploadStore()
+# Largest accepted upload; request bodies are cut off past it (plus multipart framing)
+UPLOAD_MAX_BYTES = int(get_settings().get("upload_max_bytes") or 0)
+
+
+def _check_image_head(head: bytes) -> None:
+    """Refuse unsupported formats (415) and oversized images (413) from their header alone."""
+    try:
+        check_image(head, UPLOAD_MAX_PIXELS)
+    except ImageTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(415, str(e))
+
+
+def _read_head(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(HEADER_BYTES)
+
+
+async def _read_image_upload(file: UploadFile) -> bytes:
+    """Read a multipart image upload, checking its header before reading the rest."""
+    head = await file.read(HEADER_BYTES)
+    _check_image_head(head)
+    rest = await file.read(UPLOAD_MAX_BYTES + 1 - len(head) if UPLOAD_MAX_BYTES else -1)
+    if UPLOAD_MAX_BYTES and len(head) + len(rest) > UPLOAD_MAX_BYTES:
+        raise HTTPException(413, f"Image over {UPLOAD_MAX_BYTES} bytes")
+    return head + rest
+
+
+# Live metrics pushed to /ws/metrics subscribers, one hub per camera
+metrics_hubs: dict[str, Hub] = {}
+_NO_METRICS = {"weight_kg": 0, "detection_count": 0, "confidence": 0}
+
+
+def _hub(camera_id: str) -> Hub:
+    return metrics_hubs.setdefault(camera_id, Hub(min_interval=0.2))
+
+
+def _camera(camera_id: str | None) -> str:
+    """Resolve a camera id (None = default camera); 404 for unknown cameras."""
+    try:
+        return cameras.get(camera_id).camera_id
+    except KeyError:
+        raise HTTPException(404, f"Unknown camera: {camera_id}")
+
+
+def _live_wanted() -> bool:
+    """Someone is scanning, watching or subscribed: decode and infer every frame."""
+    return (
+        sessions.any_active()
+        or cameras.active_streams > 0
+        or any(h.subscriber_count for h in list(metrics_hubs.values()))
+    )
+
+
+detection_loop.wanted = cameras.wanted = _live_wanted
+detection_loop.add_listener(lambda r: sessions.observe(
+    r["camera_id"], r["seq"], r["ts"], r["metrics"]["weight_kg"], cameras.default_id
+))
 
 
 @asynccontextmanager
 async def _lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+
+    def push(result: dict) -> None:
+        loop.call_soon_threadsafe(_hub(result["camera_id"]).publish, result)
+
+    if inference_pool is not None:
+        await run_in_threadpool(inference_pool.start)
+    await run_in_threadpool(upload_store.prune)
+    profiler.start()
+    saved_images.start()
+    job_queue.start()
+    cameras.start()
+    detection_loop.add_listener(push)
+    detection_loop.start()
     yield
+    detection_loop.stop()
+    detection_loop.remove_listener(push)
+    job_queue.stop()
+    # Write out queued saves before exiting
+    await run_in_threadpool(saved_images.flush)
+    saved_images.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+    profiler.stop()
     release_camera()
 
 
@@ -43,16 +173,54 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilingMiddleware, profiler=profiler)
+app.add_middleware(telemetry.RequestMetricsMiddleware, routes=app.routes)
+app.add_middleware(BodyLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES + 64 * 1024 if UPLOAD_MAX_BYTES else 0)
+
+
+# --- Metrics (Prometheus) ---
+
+
+def _per_camera(attr: str):
+    def samples():
+        for camera_id, worker in list(cameras.workers.items()):
+            yield {"camera": camera_id}, getattr(worker, attr)
+    return samples
+
+
+telemetry.Callback("jutevision_frames_captured_total", "Frames decoded from each camera", "counter",
+                   _per_camera("frames_captured"))
+telemetry.Callback("jutevision_frames_dropped_total", "Frames skipped because every ring slot was in use",
+                   "counter", _per_camera("frames_dropped"))
+telemetry.Callback("jutevision_frames_streamed_total", "MJPEG frames sent to viewers", "counter",
+                   _per_camera("frames_streamed"))
+telemetry.Callback("jutevision_camera_connected", "Whether each camera is open", "gauge",
+                   lambda: ((l, int(v)) for l, v in _per_camera("connected")()))
+telemetry.Callback("jutevision_stream_subscribers", "Open MJPEG streams and metrics WebSockets", "gauge",
+                   lambda: [({"kind": "mjpeg"}, cameras.active_streams),
+                            ({"kind": "websocket"}, sum(h.subscriber_count for h in list(metrics_hubs.values())))])
+telemetry.Callback("jutevision_saves_pending", "Saved images queued but not yet written to disk", "gauge",
+                   lambda: [({}, saved_images.writer_status()["pending"])])
+telemetry.Callback("jutevision_inference_queue_depth", "Uploads waiting for or in inference", "gauge",
+                   lambda: [({"queue": "jobs"}, job_queue.depth()),
+                            ({"queue": "workers"}, inference_pool.pending if inference_pool else 0)])
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (callbacks query SQLite, so rendered in the thread pool)."""
+    return Response(await run_in_threadpool(telemetry.render), media_type=telemetry.CONTENT_TYPE)
 
 
 # Serve frontend when built (single URL for desktop + phone)
 _dist = Path(__file__).resolve().parent.parent.parent / "frontend" / "dist"
 if _dist.exists():
-    app.mount("/assets", StaticFiles(directory=_dist / "assets"), name="assets")
-    from fastapi.responses import FileResponse
+    app.mount("/assets", static.CachedStaticFiles(directory=_dist / "assets"), name="assets")
     @app.get("/")
-    async def root():
-        return FileResponse(_dist / "index.html")
+    async def root(request: Request):
+        return await run_in_threadpool(
+            static.file_response, _dist / "index.html", request.headers, static.REVALIDATE, precompressed=True
+        )
 else:
     @app.get("/")
     async def root():
@@ -60,65 +228,157 @@ else:
 
 
 @app.get("/api/status")
-async def get_status():
+async def get_status(session_id: str = DEFAULT_SESSION):
     """Return audit status and system health."""
-    return {"audit_status": audit_status}
+    return {"audit_status": sessions.get(session_id).status}
+
+
+def _latest_metrics(camera_id: str) -> dict:
+    latest = detection_loop.latest.get(camera_id)
+    return latest["metrics"] if latest else _NO_METRICS
+
+
+def _session_camera(session: AuditSession) -> str:
+    return session.camera_id or cameras.default_id
+
+
+def _republish(camera_id: str) -> None:
+    _hub(camera_id).publish(
+        detection_loop.latest.get(camera_id)
+        or {"camera_id": camera_id, "seq": 0, "ts": 0.0, "metrics": _NO_METRICS}
+    )
+
+
+def _publish_status(session: AuditSession, previous_camera: str | None = None) -> None:
+    """Push a status change to live subscribers without waiting for the next frame.
+
+    After a camera switch the old camera's hub is woken too, so sockets still
+    subscribed there move to the session's new camera.
+    """
+    camera_id = _session_camera(session)
+    if previous_camera is not None and previous_camera != camera_id:
+        _republish(previous_camera)
+    _republish(camera_id)
 
 
 @app.post("/api/audit/start")
-async def start_audit():
-    """Start audit session."""
-    global audit_status, total_jute_scanned_kg
-    audit_status = "scanning"
-    total_jute_scanned_kg = 0.0
-    return {"audit_status": audit_status}
+async def start_audit(session_id: str = DEFAULT_SESSION, camera_id: str | None = None):
+    """Start audit session, accumulating from the given camera (default camera if omitted)."""
+    session = sessions.get(session_id)
+    previous_camera = _session_camera(session)
+    session.set_camera(_camera(camera_id))
+    session.set_status("scanning", reset_total=True)
+    _publish_status(session, previous_camera)
+    return {"audit_status": session.status}
 
 
 @app.post("/api/audit/stop")
-async def stop_audit():
+async def stop_audit(session_id: str = DEFAULT_SESSION):
     """Stop audit session."""
-    global audit_status
-    audit_status = "complete"
-    return {"audit_status": audit_status}
+    session = sessions.get(session_id)
+    session.set_status("complete")
+    _publish_status(session)
+    return {"audit_status": session.status}
 
 
 @app.post("/api/audit/reset")
-async def reset_audit():
+async def reset_audit(session_id: str = DEFAULT_SESSION):
     """Reset session: clear total, set status to idle."""
-    global audit_status, total_jute_scanned_kg
-    audit_status = "idle"
-    total_jute_scanned_kg = 0.0
-    return {"audit_status": audit_status, "total_jute_scanned_kg": 0}
-
+    session = sessions.get(session_id)
+    session.set_status("idle", reset_total=True)
+    _publish_status(session)
+    return {"audit_status": session.status, "total_jute_scanned_kg": 0}
 
-def _audit_progress() -> int:
-    """Return 0-100 progress based on status."""
-    mapping = {"idle": 0, "scanning": 45, "analyzing": 75, "complete": 100, "error": 0}
-    return mapping.get(audit_status, 0)
 
-
-@app.get("/api/metrics")
-async def get_metrics():
-    """Get estimated jute weight, audit progress, and total scanned."""
-    global total_jute_scanned_kg
-    metrics = get_detection_metrics()
-    if audit_status == "scanning" or audit_status == "analyzing":
-        total_jute_scanned_kg += metrics["weight_kg"] * 0.01  # accumulate per poll
+def _metrics_snapshot(session: AuditSession, metrics: dict) -> dict:
+    """Build the dashboard metrics payload shared by /api/metrics and /ws/metrics."""
     return {
         "estimated_weight_kg": metrics["weight_kg"],
         "detection_count": metrics["detection_count"],
         "confidence": metrics["confidence"],
-        "audit_status": audit_status,
-        "audit_progress": _audit_progress(),
-        "total_jute_scanned_kg": round(total_jute_scanned_kg, 1),
+        "audit_status": session.status,
+        "audit_progress": session.progress,
+        "total_jute_scanned_kg": round(session.total_kg, 1),
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics(session_id: str = DEFAULT_SESSION):
+    """Get estimated jute weight, audit progress, and total scanned."""
+    session = sessions.get(session_id)
+    return _metrics_snapshot(session, await _camera_metrics(_session_camera(session)))
+
+
+async def _camera_metrics(camera_id: str) -> dict:
+    if camera_id in detection_loop.latest and detection_loop.wanted():
+        return _latest_metrics(camera_id)
+    # Loop idle (nobody scanning or subscribed): one-off detection, never accumulated
+    return await run_in_threadpool(get_detection_metrics, camera_id)
+
+
+@app.websocket("/ws/metrics")
+async def ws_metrics(websocket: WebSocket, max_hz: float = 5.0, session_id: str = DEFAULT_SESSION):
+    """Push metrics snapshots as they are produced (coalesced, rate-limited per client)."""
+    await websocket.accept()
+    session = sessions.get(session_id)
+    camera_id = _session_camera(session)
+    hub = _hub(camera_id)
+    sub = hub.subscribe(min_interval=1.0 / max(max_hz, 0.1))
+    try:
+        await websocket.send_json(_metrics_snapshot(session, _latest_metrics(camera_id)))
+        while True:
+            result = await sub.next()
+            if _session_camera(session) != camera_id:
+                # The session switched cameras: follow it
+                hub.unsubscribe(sub)
+                camera_id = _session_camera(session)
+                hub = _hub(camera_id)
+                sub = hub.subscribe(min_interval=sub.min_interval)
+                result = {"metrics": _latest_metrics(camera_id)}
+            await websocket.send_json(_metrics_snapshot(session, result["metrics"]))
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        pass
+    finally:
+        hub.unsubscribe(sub)
+
+
+@app.get("/api/model")
+async def get_model_info():
+    """Return metadata of the loaded detector (backend, classes, input size, version)."""
+    return detector.info
+
+
+@app.get("/api/cameras")
+async def list_cameras():
+    """Configured cameras with capture and inference counters."""
+    out = []
+    for camera_id, worker in list(cameras.workers.items()):
+        out.append({
+            "camera_id": camera_id,
+            "default": camera_id == cameras.default_id,
+            "connected": worker.connected,
+            "frames_grabbed": worker.frames_grabbed,
+            "frames_captured": worker.frames_captured,
+            "frames_dropped": worker.frames_dropped,
+            "frames_inferred": detection_loop.inferred.get(camera_id, 0),
+            "active_streams": worker.active_streams,
+            "metrics": _latest_metrics(camera_id),
+        })
+    return {"cameras": out}
+
+
+@app.get("/api/cameras/{camera_id}/metrics")
+async def get_camera_metrics(camera_id: str):
+    """Latest detection metrics for one camera."""
+    return await _camera_metrics(_camera(camera_id))
+
+
 @app.get("/video_feed")
-async def video_feed():
+@app.get("/video_feed/{camera_id}")
+async def video_feed(camera_id: str | None = None):
     """Stream live camera feed with YOLO overlay (MJPEG)."""
     return StreamingResponse(
-        generate_frames(),
+        generate_frames(_camera(camera_id)),
         media_type="multipart/x-mixed-replace; boundary=frame",
     )
 
@@ -133,37 +393,201 @@ async def upload_image(
     file_pin: str = Form(""),
 ):
     """Upload image, run YOLO, return annotated result. Optionally save."""
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(400, "File must be an image")
-    data = await file.read()
-    annotated_bytes, metrics = process_uploaded_image(data)
+    data = await _read_image_upload(file)
+    try:
+        annotated_bytes, metrics = await run_in_threadpool(_analyze_image, data)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    except PoolBusy as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
     b64 = base64.b64encode(annotated_bytes).decode()
     result = {"annotated_base64": b64, "metrics": metrics}
     if save:
         if get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
             raise HTTPException(403, "Invalid file access PIN")
-        save_dir = ensure_saves_dir()
-        fname = f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        path = save_dir / fname
-        path.write_bytes(annotated_bytes)
-        result["saved_as"] = fname
+        result["saved_as"] = await _save_image(annotated_bytes, "upload")
+    return result
+
+
+def _analyze_upload_job(payload: dict, job_dir: Path, progress) -> dict:
+    """Job handler: run YOLO on a spooled upload, keep the annotated result."""
+    annotated_bytes, metrics = _analyze_image((job_dir / "input").read_bytes())
+    progress(0.8)
+    (job_dir / "annotated.jpg").write_bytes(annotated_bytes)
+    result = {"metrics": metrics, "files": ["annotated.jpg"]}
+    if payload.get("save"):
+        result["saved_as"] = saved_images.save(annotated_bytes, "upload")
     return result
 
 
+job_queue.register("analyze_upload", _analyze_upload_job)
+
+
+@app.post("/api/jobs/upload")
+async def submit_upload_job(
+    file: UploadFile = File(...),
+    save: bool = Form(False),
+    file_pin: str = Form(""),
+):
+    """Queue an upload for analysis; returns a job id to poll instead of waiting."""
+    if save and get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
+        raise HTTPException(403, "Invalid file access PIN")
+    data = await _read_image_upload(file)
+    job_id = await run_in_threadpool(job_queue.submit, "analyze_upload", {"save": save}, {"input": data})
+    return JSONResponse({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}, status_code=202)
+
+
+# --- Resumable uploads: init -> PUT chunks at offsets -> finalize ---
+
+
+@app.post("/api/uploads")
+async def create_upload(
+    size: int = Form(...),
+    filename: str = Form(""),
+    content_type: str = Form(""),
+    sha256: str = Form(...),
+    save: bool = Form(False),
+    file_pin: str = Form(""),
+):
+    """Start a resumable upload; returns its id, the bytes received so far (0) and the chunk size."""
+    if UPLOAD_MAX_BYTES and size > UPLOAD_MAX_BYTES:
+        raise HTTPException(413, f"Image over {UPLOAD_MAX_BYTES} bytes")
+    if save and get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
+        raise HTTPException(403, "Invalid file access PIN")
+    try:
+        return await run_in_threadpool(upload_store.create, size, sha256, filename, content_type, {"save": save})
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Bytes received so far; a client resumes from ``received`` after a dropped connection."""
+    try:
+        return await run_in_threadpool(upload_store.status, upload_id)
+    except UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, offset: int = 0):
+    """Append a raw chunk at ``offset`` (streamed to disk, never buffered whole)."""
+    try:
+        received = await upload_store.write_chunk(upload_id, offset, request.stream())
+    except UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+    except OffsetMismatch as e:
+        return JSONResponse({"detail": str(e), "received": e.received}, status_code=409)
+    return {"upload_id": upload_id, "received": received}
+
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    """Verify size, SHA-256 and image header, then queue the assembled image for analysis."""
+    try:
+        path, meta = await run_in_threadpool(upload_store.finalize, upload_id)
+    except UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+    except OffsetMismatch as e:
+        return JSONResponse({"detail": str(e), "received": e.received}, status_code=409)
+    except ChecksumMismatch as e:
+        raise HTTPException(422, str(e))
+    head = await run_in_threadpool(_read_head, path)
+    try:
+        _check_image_head(head)
+    except HTTPException:
+        await run_in_threadpool(upload_store.discard, upload_id)
+        raise
+    job_id = await run_in_threadpool(
+        job_queue.submit, "analyze_upload", {"save": meta["extra"].get("save", False)}, {"input": path}
+    )
+    await run_in_threadpool(upload_store.discard, upload_id)
+    return JSONResponse(
+        {"job_id": job_id, "status_url": f"/api/jobs/{job_id}", "sha256": meta["sha256"]}, status_code=202
+    )
+
+
+@app.delete("/api/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Abandon an upload and delete what was received."""
+    try:
+        await run_in_threadpool(upload_store.discard, upload_id)
+    except UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+    return {"upload_id": upload_id, "deleted": True}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, progress and (when done) result."""
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+# Jobs whose output files need the file PIN, as their submission did
+PIN_JOB_KINDS = {"batch_reports"}
+
+
+@app.get("/api/jobs/{job_id}/files/{name}")
+async def get_job_file(job_id: str, name: str, file_pin: str = ""):
+    """Download an output file of a finished job (stored-audit reports require the file PIN if enabled)."""
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None or job["status"] != "done" or name not in (job["result"] or {}).get("files", []):
+        raise HTTPException(404, "File not found")
+    if job["kind"] in PIN_JOB_KINDS and get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
+        raise HTTPException(403, "Invalid file access PIN")
+    return FileResponse(job_queue.job_dir(job_id) / name)
+
+
+def _batch_reports_job(payload: dict, job_dir: Path, progress) -> dict:
+    """Job handler: per-audit PDFs (process pool) and/or one consolidated PDF for stored audits."""
+    audits = get_audit_store().audits(month=payload.get("month"), mill_license=payload.get("mill_license"))
+    files = []
+    if not payload.get("consolidated_only"):
+        files += render_batch(audits, job_dir, report_workers(), lambda f: progress(0.8 * f))
+    if payload.get("consolidated") or payload.get("consolidated_only"):
+        name = f"CONSOLIDATED_{payload.get('month') or 'ALL'}.pdf"
+        write_consolidated_pdf(audits, job_dir / name)
+        files.append(name)
+    return {"audits": len(audits), "files": files}
+
+
+job_queue.register("batch_reports", _batch_reports_job)
+
+
+@app.post("/api/reports/batch")
+async def submit_batch_reports(
+    month: str = Form(""),
+    mill_license: str = Form(""),
+    consolidated: bool = Form(False),
+    consolidated_only: bool = Form(False),
+    file_pin: str = Form(""),
+):
+    """Queue PDF reports for all stored audits of a month (YYYY-MM) and/or mill; poll the job for files."""
+    if get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
+        raise HTTPException(403, "Invalid file access PIN")
+    if month and not re.fullmatch(r"\d{4}-\d{2}", month):
+        raise HTTPException(400, "month must be YYYY-MM")
+    payload = {"month": month or None, "mill_license": mill_license or None,
+               "consolidated": consolidated, "consolidated_only": consolidated_only}
+    job_id = await run_in_threadpool(job_queue.submit, "batch_reports", payload)
+    return JSONResponse({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}, status_code=202)
+
+
 @app.post("/api/capture")
 async def capture_and_save(
     file_pin: str = Form(""),
+    camera_id: str | None = Form(None),
 ):
     """Capture current frame, save to disk, return filename."""
     if get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
         raise HTTPException(403, "Invalid file access PIN")
-    img_bytes, metrics = capture_frame()
+    img_bytes, metrics = await run_in_threadpool(capture_frame, _camera(camera_id))
     if img_bytes is None:
         raise HTTPException(503, "Could not capture frame")
-    save_dir = ensure_saves_dir()
-    fname = f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-    path = save_dir / fname
-    path.write_bytes(img_bytes)
+    fname = await _save_image(img_bytes, "capture")
     return {"saved_as": fname, "metrics": metrics}
 
 
@@ -172,25 +596,45 @@ async def list_saved(file_pin: str = ""):
     """List saved images. Requires file PIN if enabled."""
     if get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
         raise HTTPException(403, "Invalid file access PIN")
-    save_dir = ensure_saves_dir()
-    files = sorted(
-        [f.name for f in save_dir.glob("*.jpg")],
-        key=lambda n: (save_dir / n).stat().st_mtime,
-        reverse=True,
-    )
-    return {"files": files}
+    return {"files": await run_in_threadpool(saved_images.names)}
+
+
+def _saved_file_response(filename: str, headers) -> Response | None:
+    # Index lookup, stat and ETag are blocking: called in the thread pool
+    path = saved_images.path(filename)
+    if path is None or not path.is_file():
+        return None
+    return static.file_response(path, headers, static.PRIVATE_IMMUTABLE, "image/jpeg")
+
+
+def _saved_status(filename: str) -> dict | None:
+    if saved_images.pending_bytes(filename) is None and saved_images.path(filename) is None:
+        return None
+    return {"name": filename, "durable": saved_images.is_durable(filename), **saved_images.writer_status()}
 
 
 @app.get("/api/saved/{filename}")
-async def get_saved(filename: str, file_pin: str = ""):
-    """Download a saved image."""
+async def get_saved(filename: str, request: Request, file_pin: str = ""):
+    """Download a saved image (cached by the browser; revalidates with 304)."""
     if get_settings().get("file_pin_enabled") and not verify_file_pin(file_pin):
         raise HTTPException(403, "Invalid file access PIN")
-    save_dir = ensure_saves_dir()
-    path = save_dir / filename
-    if not path.exists() or not path.is_file():
+    pending = saved_images.pending_bytes(filename)
+    if pending is not None:
+        # Still in the write-behind queue
+        return Response(pending, media_type="image/jpeg", headers={"Cache-Control": static.PRIVATE_IMMUTABLE})
+    response = await run_in_threadpool(_saved_file_response, filename, request.headers)
+    if response is None:
+        raise HTTPException(404, "File not found")
+    return response
+
+
+@app.get("/api/saved/{filename}/status")
+async def get_saved_status(filename: str):
+    """Whether a saved image has reached disk, plus the write-behind queue state."""
+    status = await run_in_threadpool(_saved_status, filename)
+    if status is None:
         raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="image/jpeg")
+    return status
 
 
 # --- Settings & PIN ---
@@ -198,11 +642,12 @@ async def get_saved(filename: str, file_pin: str = ""):
 
 @app.get("/api/settings")
 async def api_get_settings():
-    """Get app settings (PIN enabled flags only, no hashes)."""
+    """Get app settings (PIN enabled flags and preferred upload size, no hashes)."""
     s = get_settings()
     return {
         "app_pin_enabled": s.get("app_pin_enabled", False),
         "file_pin_enabled": s.get("file_pin_enabled", False),
+        "upload_max_side": s.get("upload_max_side", 0),
     }
 
 
@@ -0,0 +1,277 @@
+"""Durable offline outbox of audit packages, synced in batches when online.
+
+Queuing an audit stores a package: its fields as a JSON manifest in SQLite,
+with every image replaced by the SHA-256 of a blob in a content-addressed
+store (app.blobs). Nothing is lost on restart, and an image shared by
+several audits is stored and sent once.
+
+Sync moves the minimum bytes over a short connectivity window. Per batch of
+audits it asks the receiver which blobs it lacks (``POST /sync/have``),
+sends only those in framed batches (``POST /sync/blobs``), then submits
+the manifests in one request (``POST /sync/audits``). The receiver stores
+each blob as it arrives, so an interrupted sync resumes by asking again,
+and only accepted audits are marked synced. ``app.sync_receiver`` is a
+stand-in receiver implementing the same protocol.
+"""
+import http.client
+import json
+import sqlite3
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Iterable, Iterator
+
+from app.audit_hash import IMAGE_FIELDS, image_view
+from app.blobs import BlobStore, blob_digest
+from app.settings import OUTBOX_DIR, get_settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    audit_id TEXT PRIMARY KEY,
+    manifest TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    synced_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_packages_pending ON packages (synced_at, queued_at);
+"""
+
+# Blob batch framing: 32-byte raw digest, 8-byte big-endian length, then the bytes
+FRAME = struct.Struct(">32sQ")
+BLOBS_CONTENT_TYPE = "application/x-jutevision-blobs"
+
+
+def encode_frames(blobs: Iterable[tuple[str, bytes]]) -> bytes:
+    return b"".join(FRAME.pack(bytes.fromhex(digest), len(data)) + data for digest, data in blobs)
+
+
+class FrameReader:
+    """Incremental parser for a framed blob stream; ``feed`` yields complete (digest, bytes)."""
+
+    def __init__(self, max_blob_bytes: int = 64 * 1024 * 1024):
+        self.max_blob_bytes = max_blob_bytes
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> Iterator[tuple[str, bytes]]:
+        self._buffer += chunk
+        while len(self._buffer) >= FRAME.size:
+            raw_digest, length = FRAME.unpack_from(self._buffer)
+            if length > self.max_blob_bytes:
+                raise ValueError(f"Blob of {length} bytes exceeds the limit")
+            end = FRAME.size + length
+            if len(self._buffer) < end:
+                return
+            data = bytes(self._buffer[FRAME.size:end])
+            del self._buffer[:end]
+            yield raw_digest.hex(), data
+
+    @property
+    def incomplete(self) -> bool:
+        return bool(self._buffer)
+
+
+def _manifest(audit_data: dict, blobs: BlobStore) -> dict:
+    """JSON-safe audit fields with images stored as blobs and replaced by their digests."""
+    manifest = json.loads(json.dumps({k: v for k, v in audit_data.items() if k not in IMAGE_FIELDS}, default=str))
+    images = {}
+    for field in IMAGE_FIELDS:
+        digests = []
+        for img in audit_data.get(field) or []:
+            view = image_view(img)
+            if view is None:
+                continue  # placeholders (e.g. burst markers) carry no bytes
+            try:
+                digests.append(blobs.put(view))
+            finally:
+                view.release()
+        images[field] = digests
+    manifest["images"] = images
+    return manifest
+
+
+def manifest_blobs(manifest: dict) -> list[str]:
+    return [d for digests in manifest.get("images", {}).values() for d in digests]
+
+
+class Outbox:
+    """Queued audit packages (SQLite) plus their image blobs; one connection per thread."""
+
+    def __init__(self, root=OUTBOX_DIR):
+        self.root = root
+        self.blobs = BlobStore(root / "blobs")
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        # Held while blobs are added or collected, so GC never removes a blob
+        # whose package is still being queued
+        self._blob_lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "outbox.db", timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, audit_data: dict) -> bool:
+        """Queue (or re-queue) a complete audit; False if this exact version was already synced."""
+        with self._blob_lock:
+            return self._enqueue(audit_data)
+
+    def _enqueue(self, audit_data: dict) -> bool:
+        manifest = _manifest(audit_data, self.blobs)
+        encoded = json.dumps(manifest, sort_keys=True)
+        digest = blob_digest(encoded.encode())
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT digest, synced_at FROM packages WHERE audit_id = ?", (manifest["audit_id"],)
+            ).fetchone()
+            if row is not None and row["digest"] == digest and row["synced_at"] is not None:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO packages (audit_id, manifest, digest, queued_at) VALUES (?, ?, ?, ?)",
+                (manifest["audit_id"], encoded, digest, time.time()),
+            )
+        return True
+
+    def pending_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM packages WHERE synced_at IS NULL").fetchone()[0]
+
+    def pending(self) -> list[dict]:
+        rows = self._conn().execute(
+            "SELECT audit_id, queued_at, attempts, last_error FROM packages WHERE synced_at IS NULL ORDER BY queued_at"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    # --- Sync ---
+
+    def sync(self, url: str, token: str = "", batch_audits: int = 20, batch_bytes: int = 4 * 1024 * 1024,
+             timeout: float = 30.0) -> dict:
+        """Send pending packages to a receiver; returns counts (and ``error`` if interrupted).
+
+        Safe to call again after a failure: finished work is not repeated.
+        """
+        stats = {"audits": 0, "blobs": 0, "bytes": 0, "pending": 0}
+        with self._sync_lock:
+            conn = self._conn()
+            rows = conn.execute(
+                "SELECT audit_id, manifest, digest FROM packages WHERE synced_at IS NULL ORDER BY queued_at"
+            ).fetchall()
+            client = _Client(url, token, timeout)
+            try:
+                for start in range(0, len(rows), batch_audits):
+                    batch = rows[start:start + batch_audits]
+                    manifests = [json.loads(r["manifest"]) for r in batch]
+                    wanted = list(dict.fromkeys(d for m in manifests for d in manifest_blobs(m)))
+                    missing = client.post_json("/sync/have", {"blobs": wanted})["missing"] if wanted else []
+                    for frames, count in self._blob_batches(missing, batch_bytes):
+                        client.post("/sync/blobs", frames, BLOBS_CONTENT_TYPE)
+                        stats["blobs"] += count
+                        stats["bytes"] += len(frames)
+                    result = client.post_json("/sync/audits", {"audits": manifests})
+                    now = time.time()
+                    sent = {r["audit_id"]: r["digest"] for r in batch}
+                    with conn:
+                        # Matching on the digest leaves an audit re-queued mid-sync pending
+                        conn.executemany(
+                            "UPDATE packages SET synced_at = ?, last_error = NULL WHERE audit_id = ? AND digest = ?",
+                            [(now, audit_id, sent[audit_id]) for audit_id in result["accepted"] if audit_id in sent],
+                        )
+                    stats["audits"] += len(result["accepted"])
+            except (OSError, ValueError, KeyError) as e:
+                stats["error"] = str(e)
+                with conn:
+                    conn.execute(
+                        "UPDATE packages SET attempts = attempts + 1, last_error = ? WHERE synced_at IS NULL",
+                        (str(e),),
+                    )
+        if "error" not in stats:
+            self.collect_garbage()
+        stats["pending"] = self.pending_count()
+        return stats
+
+    def _blob_batches(self, digests: list[str], batch_bytes: int) -> Iterator[tuple[bytes, int]]:
+        """Framed request bodies of roughly ``batch_bytes`` each (a larger blob goes alone)."""
+        batch, size = [], 0
+        for digest in digests:
+            data = self.blobs.get(digest)
+            if batch and size + len(data) > batch_bytes:
+                yield encode_frames(batch), len(batch)
+                batch, size = [], 0
+            batch.append((digest, data))
+            size += len(data)
+        if batch:
+            yield encode_frames(batch), len(batch)
+
+    def collect_garbage(self) -> int:
+        """Delete blobs no pending package references (synced ones live on the receiver)."""
+        with self._blob_lock:
+            keep = set()
+            for r in self._conn().execute("SELECT manifest FROM packages WHERE synced_at IS NULL"):
+                keep.update(manifest_blobs(json.loads(r["manifest"])))
+            removed = 0
+            for digest in list(self.blobs.digests()):
+                if digest not in keep:
+                    self.blobs.delete(digest)
+                    removed += 1
+        return removed
+
+
+class _Client:
+    """Minimal JSON/bytes HTTP client for the sync protocol (stdlib only)."""
+
+    def __init__(self, url: str, token: str, timeout: float):
+        self.url = url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.timeout = timeout
+
+    def post(self, path: str, body: bytes, content_type: str) -> bytes:
+        request = urllib.request.Request(
+            self.url + path, data=body, method="POST", headers={**self.headers, "Content-Type": content_type}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            raise OSError(f"Receiver returned {e.code} for {path}: {e.read()[:200].decode(errors='replace')}")
+        except http.client.HTTPException as e:
+            # Connection cut mid-response (IncompleteRead, RemoteDisconnected, ...)
+            raise OSError(f"Receiver connection failed for {path}: {e!r}") from e
+
+    def post_json(self, path: str, payload: dict) -> dict:
+        return json.loads(self.post(path, json.dumps(payload).encode(), "application/json"))
+
+
+def sync_from_settings(outbox: "Outbox") -> dict:
+    """Sync to the receiver configured in settings (``sync_url``); error if none is set."""
+    s = get_settings()
+    if not s.get("sync_url"):
+        return {"audits": 0, "blobs": 0, "bytes": 0, "pending": outbox.pending_count(),
+                "error": "No sync_url configured"}
+    return outbox.sync(
+        s["sync_url"],
+        token=s.get("sync_token") or "",
+        batch_audits=int(s.get("sync_batch_audits") or 20),
+        batch_bytes=int(s.get("sync_batch_bytes") or 4 * 1024 * 1024),
+    )
+
+
+_outbox: Outbox | None = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Shared outbox for this process."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox()
+    return _outbox
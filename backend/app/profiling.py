@@ -0,0 +1,209 @@
+"""Opt-in request profiling: slow-request stack capture and timing logs.
+
+A sampling profiler (a thread reading ``sys._current_frames()`` every few
+milliseconds) runs only while profiling is enabled. It samples all threads,
+because upload work runs in the threadpool and the inference pool rather
+than on the event loop thread. When a request takes longer than
+``slow_request_ms`` (or an admin sends ``X-Profile: <profile_token>``), the
+stacks sampled during it are written in folded format (one
+``thread;outer;...;inner count`` line per stack, readable by flamegraph.pl
+and speedscope) to a rotating directory.
+
+Pipeline stages called during a request add their durations to the dict from
+``current_timings()``. With ``request_timing_log`` on, every request is
+logged as one JSON line including that stage breakdown.
+
+When every option is off the middleware is a single attribute check per
+request, and no sampler thread runs.
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from app.settings import PROFILES_DIR
+
+PROFILE_HEADER = b"x-profile"
+# Innermost frames in these files are threads parked on a lock or selector
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "base_events.py")
+
+_timings: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+log = logging.getLogger("jutevision.requests")
+
+
+def current_timings() -> dict | None:
+    """Stage-timing dict of the request being handled, or None outside a traced request."""
+    return _timings.get()
+
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval into a bounded buffer."""
+
+    def __init__(self, interval: float = 0.005, max_samples: int = 200_000):
+        self.interval = interval
+        self._samples: deque[tuple[float, str, tuple]] = deque(maxlen=max_samples)
+        self._frames: dict[tuple, tuple] = {}
+        self._users = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def acquire(self) -> None:
+        """Start sampling (reference counted, so on-demand users can overlap)."""
+        with self._lock:
+            self._users += 1
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users > 0 or self._thread is None:
+                return
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        thread.join(timeout=1)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _stack(self, frame) -> tuple:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        key = tuple(reversed(stack))
+        # Identical stacks share one tuple, which keeps the buffer small
+        return self._frames.setdefault(key, key)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                self._samples.append((now, names.get(ident, str(ident)), self._stack(frame)))
+
+    def folded(self, start: float, end: float) -> Counter:
+        """Folded stacks (``thread;frame;...``) sampled between two perf_counter times."""
+        counts: Counter = Counter()
+        for ts, thread, stack in list(self._samples):
+            if start <= ts <= end:
+                counts[";".join((thread, *stack))] += 1
+        return counts
+
+
+class Profiler:
+    """Profiling configuration plus the shared sampler and profile directory."""
+
+    def __init__(self, enabled: bool = False, slow_request_ms: float = 2000, sample_interval_ms: float = 5,
+                 keep: int = 50, token: str = "", timing_log: bool = False, directory: Path = PROFILES_DIR):
+        self.enabled = enabled
+        self.slow_request_s = slow_request_ms / 1000
+        self.keep = keep
+        self.token = token.encode()
+        self.timing_log = timing_log
+        self.directory = directory
+        self.sampler = StackSampler(interval=sample_interval_ms / 1000)
+        # Anything to do per request at all?
+        self.active = enabled or timing_log or bool(token)
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "Profiler":
+        return cls(
+            enabled=bool(settings.get("profiling_enabled")),
+            slow_request_ms=float(settings.get("slow_request_ms") or 2000),
+            sample_interval_ms=float(settings.get("profile_sample_interval_ms") or 5),
+            keep=int(settings.get("profile_keep") or 50),
+            token=settings.get("profile_token") or "",
+            timing_log=bool(settings.get("request_timing_log")),
+        )
+
+    def start(self) -> None:
+        if self.enabled:
+            self.sampler.acquire()
+        if self.timing_log and not log.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
+            log.propagate = False
+
+    def stop(self) -> None:
+        if self.enabled:
+            self.sampler.release()
+
+    def save(self, record: dict, start: float, end: float) -> Path | None:
+        """Write the stacks sampled during one request; keep only the newest ``keep`` files."""
+        stacks = self.sampler.folded(start, end)
+        if not stacks:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", record["route"]).strip("_") or "root"
+        path = self.directory / f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}.folded"
+        header = f"# {json.dumps({**record, 'interval_ms': self.sampler.interval * 1000})}\n"
+        path.write_text(header + "".join(f"{stack} {n}\n" for stack, n in stacks.most_common()))
+        for old in sorted(self.directory.glob("*.folded"))[:-self.keep]:
+            old.unlink(missing_ok=True)
+        return path
+
+
+class ProfilingMiddleware:
+    """ASGI middleware applying a Profiler to HTTP requests."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if not profiler.active or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        forced = bool(profiler.token) and dict(scope["headers"]).get(PROFILE_HEADER) == profiler.token
+        if forced:
+            profiler.sampler.acquire()
+        state = {"status": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"multipart/x-mixed-replace"):
+                        state["stream"] = True
+            await send(message)
+
+        timings: dict = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ended = time.perf_counter()
+            _timings.reset(token)
+            if not state["stream"]:
+                record = {
+                    "method": scope["method"],
+                    "route": getattr(scope.get("route"), "path", scope["path"]),
+                    "status": state["status"],
+                    "duration_ms": round((ended - started) * 1000, 2),
+                    "stages_ms": {k: round(v * 1000, 2) for k, v in timings.items()},
+                }
+                if profiler.timing_log:
+                    log.info(json.dumps(record))
+                if profiler.sampler.running and (forced or ended - started >= profiler.slow_request_s):
+                    profiler.save(record, started, ended)
+            if forced:
+                profiler.sampler.release()
@@ -0,0 +1,60 @@
+"""Latest-value fan-out for pushing snapshots to WebSocket clients.
+
+The producer publishes a snapshot whenever it has a new result; every
+subscriber holds only the most recent one (older unsent snapshots are
+coalesced away) and is rate-limited independently, so a slow phone never
+delays other clients and per-client cost is one dict reference.
+"""
+import asyncio
+import time
+
+
+class Subscriber:
+    """One client's view of a hub: a latest-value slot plus a wake-up event."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.latest: dict | None = None
+        self._event = asyncio.Event()
+        self._last_sent = 0.0
+
+    def offer(self, snapshot: dict) -> None:
+        self.latest = snapshot
+        self._event.set()
+
+    async def next(self) -> dict:
+        """Wait for a snapshot newer than the last one returned, honoring the rate limit."""
+        await self._event.wait()
+        wait = self._last_sent + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._event.clear()
+        self._last_sent = time.monotonic()
+        return self.latest
+
+
+class Hub:
+    """Publishes snapshots to all subscribers on the event loop."""
+
+    def __init__(self, min_interval: float = 0.2):
+        self.min_interval = min_interval
+        self.latest: dict | None = None
+        self._subscribers: set[Subscriber] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, min_interval: float | None = None) -> Subscriber:
+        sub = Subscriber(max(self.min_interval, min_interval or 0.0))
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    def publish(self, snapshot: dict) -> None:
+        """Offer a snapshot to every subscriber (call from the event loop thread)."""
+        self.latest = snapshot
+        for sub in self._subscribers:
+            sub.offer(snapshot)
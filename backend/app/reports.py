@@ -0,0 +1,353 @@
+"""Audit report generation: government PDF, GFR 19-A form and export package.
+
+Shared by the Streamlit app and background jobs; importable without Streamlit.
+"""
+import io
+import json
+import tempfile
+import zipfile
+from pathlib import Path
+
+import cv2
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Flowable, KeepTogether, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.audit_hash import audit_merkle_root, image_digest, image_view
+from app.imaging import HEADER_BYTES, decode_capped, inspect_image
+
+
+# Embed image streams as binary: ASCII85 would inflate every photo by a
+# quarter and is encoded in pure Python
+rl_config.useA85 = 0
+
+# Styles are built once per process and shared by every report
+STYLES = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle('CustomTitle', parent=STYLES['Heading1'], fontSize=22, textColor=colors.HexColor('#1e40af'), spaceAfter=30, alignment=1)
+COMPLIANT_STYLE = ParagraphStyle('Compliance', parent=STYLES['Heading2'], textColor=colors.green)
+NON_COMPLIANT_STYLE = ParagraphStyle('Compliance', parent=STYLES['Heading2'], textColor=colors.red)
+HASH_STYLE = ParagraphStyle('Hash', parent=STYLES['Normal'], fontName='Courier', fontSize=9)
+
+INFO_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#dbeafe')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+ANALYSIS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#1e40af')),
+])
+
+
+# Evidence appendix: photos are embedded at print resolution, two per page
+EVIDENCE_DPI = 150
+EVIDENCE_BOX = (451, 300)  # points; the report frame is 451pt wide
+EVIDENCE_JPEG_QUALITY = 80
+# A JPEG already within print size is embedded byte-for-byte unless it is
+# heavier than this (e.g. a quality-95 capture), in which case it is re-encoded
+PASSTHROUGH_MAX_BYTES_PER_PIXEL = 0.75
+CAPTION_STYLE = ParagraphStyle('Caption', parent=STYLES['Normal'], fontSize=8, textColor=colors.grey, alignment=1, spaceAfter=12)
+
+
+def print_jpeg(data, max_side: int) -> bytes | memoryview:
+    """JPEG of an image with its longest side at most ``max_side`` px; suitable JPEGs are returned unchanged."""
+    name, width, height = inspect_image(bytes(data[:HEADER_BYTES]))
+    if name == "jpeg" and max(width, height) <= max_side and len(data) <= width * height * PASSTHROUGH_MAX_BYTES_PER_PIXEL:
+        return data
+    frame = decode_capped(data, max_side)
+    if frame is None:
+        raise ValueError("Undecodable image")
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+class EvidenceImage(Flowable):
+    """One evidence photo, prepared for print only when drawn.
+
+    The print-size JPEG goes to ``work_dir`` under its source digest and is
+    drawn from that path: ReportLab embeds a .jpg file as-is (no decode or
+    re-encode), and holds one image's pixels at a time at most.
+    """
+
+    def __init__(self, img, digest: str, size: tuple[int, int], work_dir: Path):
+        super().__init__()
+        self.img = img
+        self.path = work_dir / f"{digest}.jpg"
+        self.max_side = round(max(EVIDENCE_BOX) / 72 * EVIDENCE_DPI)
+        scale = min(EVIDENCE_BOX[0] / size[0], EVIDENCE_BOX[1] / size[1], 72 / EVIDENCE_DPI)
+        self.width, self.height = size[0] * scale, size[1] * scale
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        if not self.path.exists():
+            view = image_view(self.img)
+            try:
+                self.path.write_bytes(print_jpeg(view, self.max_side))
+            finally:
+                view.release()
+        self.canv.drawImage(str(self.path), 0, 0, self.width, self.height)
+
+
+def evidence_appendix(images, work_dir: Path) -> list:
+    """Appendix flowables for an audit's photos; identical images are embedded once."""
+    unique = {}  # digest -> (image, (width, height), [1-based positions])
+    for position, img in enumerate(images or [], 1):
+        view = image_view(img)
+        if view is None:
+            continue  # placeholders carry no image
+        try:
+            _, width, height = inspect_image(bytes(view[:HEADER_BYTES]))
+        except ValueError:
+            continue
+        finally:
+            view.release()
+        digest = image_digest(img).hex()
+        if digest in unique:
+            unique[digest][2].append(position)
+        else:
+            unique[digest] = (img, (width, height), [position])
+    if not unique:
+        return []
+    count = sum(len(positions) for _, _, positions in unique.values())
+    elements = [
+        PageBreak(),
+        Paragraph("Evidence Appendix", STYLES['Heading3']),
+        Paragraph(f"{count} images, {len(unique)} distinct; duplicates are shown once.", STYLES['Normal']),
+        Spacer(1, 12),
+    ]
+    for digest, (img, size, positions) in unique.items():
+        label = f"Image {positions[0]}" + (f" (also images {', '.join(map(str, positions[1:]))})" if len(positions) > 1 else "")
+        elements.append(KeepTogether([
+            EvidenceImage(img, digest, size, work_dir),
+            Paragraph(f"{label} - {size[0]}x{size[1]} px - SHA-256 {digest[:16]}", CAPTION_STYLE),
+        ]))
+    return elements
+
+
+def report_doc(output, **kwargs) -> SimpleDocTemplate:
+    """Page template of the government report; ``output`` is a path or binary file."""
+    return SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18, **kwargs)
+
+
+def audit_elements(audit_data, hash_value=None) -> list:
+    """Flowables of one audit's government report (without the page title).
+
+    ``hash_value`` is the audit's verification hash when ``audit_data`` is a
+    partial copy (e.g. without some image fields) that would hash differently.
+    """
+    elements = []
+    
+    # Audit Info
+    elements.append(Paragraph("Audit Information", STYLES['Heading3']))
+    
+    gps_data = audit_data.get('gps') or {}
+    
+    info_data = [
+        ['Audit ID', audit_data['audit_id']],
+        ['Inspector', audit_data['inspector']],
+        ['Date/Time', audit_data.get('timestamp', 'N/A')],
+        ['Mill Name', audit_data.get('mill_name', 'N/A')],
+        ['Mill License', audit_data.get('mill_license', 'N/A')],
+        ['Location', gps_data.get('address', 'N/A')],
+    ]
+    
+    info_table = Table(info_data, colWidths=[150, 300])
+    info_table.setStyle(INFO_TABLE_STYLE)
+    elements.append(info_table)
+    elements.append(Spacer(1, 20))
+    
+    # Material Analysis
+    elements.append(Paragraph("Material Quality Analysis", STYLES['Heading3']))
+    
+    analysis_data = [
+        ['Parameter', 'Value', 'Classification'],
+        ['Material Type', (audit_data.get('material_type') or 'N/A').upper(), 'Visual/AI'],
+        ['Total Count', str(audit_data.get('total_count', 0)), 'Units'],
+        ['Grade A (Premium)', str(audit_data.get('premium_count', 0)), 'Top Quality'],
+        ['Grade B (Export)', str(audit_data.get('export_count', 0)), 'Export Standard'],
+        ['Grade C (Local)', str(audit_data.get('local_count', 0)), 'Domestic Use'],
+        ['Grade D (Reject)', str(audit_data.get('reject_count', 0)), 'Below Standard'],
+        ['AI Confidence', f"{audit_data.get('confidence', 0)*100:.1f}%", 'Detection Accuracy'],
+        ['Overall Grade', audit_data.get('grade', 'N/A'), 'Quality Rating'],
+    ]
+    
+    analysis_table = Table(analysis_data, colWidths=[150, 150, 150])
+    analysis_table.setStyle(ANALYSIS_TABLE_STYLE)
+    elements.append(analysis_table)
+    elements.append(Spacer(1, 20))
+    
+    # Compliance
+    compliance = audit_data.get('compliance_status', 'PENDING')
+    stock_days = audit_data.get('stock_days', 0)
+    
+    if compliance == 'PASS':
+        comp_text = f"COMPLIANT - {stock_days} Days Stock Available (Required: 30+ days)"
+        comp_style = COMPLIANT_STYLE
+    else:
+        comp_text = f"NON-COMPLIANT - {stock_days} Days Stock (Required: 30+ days)"
+        comp_style = NON_COMPLIANT_STYLE
+    
+    elements.append(Paragraph(f"Compliance Status: {comp_text}", comp_style))
+    elements.append(Spacer(1, 20))
+    
+    # Notes
+    elements.append(Paragraph("Inspector Notes", STYLES['Heading3']))
+    elements.append(Paragraph(audit_data.get('inspector_notes', 'No notes provided'), STYLES['Normal']))
+    elements.append(Spacer(1, 20))
+    
+    # Verification
+    elements.append(Paragraph("Document Verification", STYLES['Heading3']))
+    hash_value = hash_value or generate_audit_hash(audit_data)
+    elements.append(Paragraph(f"SHA-256 Hash: {hash_value}", HASH_STYLE))
+    elements.append(Paragraph("This document is digitally signed and tamper-proof.", STYLES['Italic']))
+    return elements
+
+
+def generate_government_pdf(audit_data, output=None, hash_value=None):
+    """Government report PDF; written to ``output`` (path or file) if given, else returned as a BytesIO."""
+    buffer = io.BytesIO() if output is None else output
+    doc = report_doc(buffer)
+    elements = [
+        Paragraph("JuteVision Auditor", TITLE_STYLE),
+        Paragraph("Ministry of Textiles, Government of India", STYLES['Heading2']),
+        Paragraph("Official Audit Report", STYLES['Heading3']),
+        Spacer(1, 20),
+        *audit_elements(audit_data, hash_value),
+    ]
+    
+    with tempfile.TemporaryDirectory(prefix="jutevision-report-") as work_dir:
+        elements += evidence_appendix(audit_data.get('watermarked_images'), Path(work_dir))
+        doc.build(elements)
+    if output is None:
+        buffer.seek(0)
+        return buffer
+    return output
+
+def draw_gfr_page(c, audit_data):
+    """Draw one GFR 19-A form page for an audit on canvas ``c``."""
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(200, 750, "FORM GFR 19-A")
+    c.setFont("Helvetica", 10)
+    c.drawString(250, 735, "[See Rule 212(1)]")
+    
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(150, 700, "STOCK REGISTER FOR JUTE COMMODITIES")
+    c.line(50, 690, 550, 690)
+    
+    y = 650
+    c.setFont("Helvetica-Bold", 11)
+    
+    fields = [
+        ("Audit ID:", audit_data['audit_id']),
+        ("Date:", audit_data.get('timestamp', '_________________')),
+        ("Inspector:", audit_data['inspector']),
+        ("Mill Name:", audit_data.get('mill_name', '_________________')),
+        ("License No:", audit_data.get('mill_license', '_________________')),
+        ("Material Type:", (audit_data.get('material_type') or '_________________').upper()),
+        ("Total Quantity:", str(audit_data.get('total_count', '_________________'))),
+        ("Grade A (Premium):", str(audit_data.get('premium_count', '_________________'))),
+        ("Grade B (Export):", str(audit_data.get('export_count', '_________________'))),
+        ("Grade C (Local):", str(audit_data.get('local_count', '_________________'))),
+        ("Grade D (Reject):", str(audit_data.get('reject_count', '_________________'))),
+    ]
+    
+    for label, value in fields:
+        c.drawString(50, y, label)
+        c.drawString(200, y, str(value))
+        y -= 25
+    
+    y -= 30
+    c.setFont("Helvetica", 11)
+    c.drawString(50, y, "Certified that the above stock has been physically verified and found correct.")
+    
+    y -= 80
+    c.line(350, y, 550, y)
+    c.drawString(350, y-15, "Signature of Inspecting Officer")
+    c.drawString(350, y-30, f"({audit_data['inspector']})")
+    c.showPage()
+
+def generate_gfr_format(audit_data, output=None):
+    """GFR 19-A PDF; written to ``output`` (path or file) if given, else returned as a BytesIO."""
+    buffer = io.BytesIO() if output is None else output
+    c = canvas.Canvas(buffer, pagesize=letter)
+    draw_gfr_page(c, audit_data)
+    c.save()
+    if output is None:
+        buffer.seek(0)
+        return buffer
+    return output
+
+def create_complete_export_package(audit_data, hash_value=None):
+    buffer = io.BytesIO()
+    hash_value = hash_value or generate_audit_hash(audit_data)
+    
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        pdf = generate_government_pdf(audit_data, hash_value=hash_value)
+        zf.writestr(f"{audit_data['audit_id']}_GOVT_REPORT.pdf", pdf.getvalue())
+        
+        gfr = generate_gfr_format(audit_data)
+        zf.writestr(f"{audit_data['audit_id']}_GFR19A.pdf", gfr.getvalue())
+        
+        json_data = json.dumps(audit_data, indent=2, default=str)
+        zf.writestr(f"{audit_data['audit_id']}_DATA.json", json_data)
+        
+        csv_content = "Field,Value\n"
+        for key, value in audit_data.items():
+            if key not in ['watermarked_images', 'original_images', 'processed_images']:
+                if isinstance(value, (list, dict)):
+                    csv_content += f"{key},\"{str(value)}\"\n"
+                else:
+                    csv_content += f"{key},{value}\n"
+        zf.writestr(f"{audit_data['audit_id']}_DATA.csv", csv_content)
+        
+        for idx, img_buf in enumerate(audit_data.get('watermarked_images', [])):
+            if img_buf:
+                img_buf.seek(0)
+                zf.writestr(f"{audit_data['audit_id']}_IMAGE_{idx+1}.jpg", img_buf.getvalue())
+        
+        summary = f"""
+JUTEVISION AUDITOR - AUDIT SUMMARY
+==================================
+Audit ID: {audit_data['audit_id']}
+Inspector: {audit_data['inspector']}
+Date: {audit_data.get('timestamp', 'N/A')}
+
+MATERIAL: {audit_data.get('material_type', 'N/A').upper()}
+TOTAL COUNT: {audit_data.get('total_count', 0)}
+GRADE DISTRIBUTION:
+  - Grade A (Premium): {audit_data.get('premium_count', 0)}
+  - Grade B (Export): {audit_data.get('export_count', 0)}
+  - Grade C (Local): {audit_data.get('local_count', 0)}
+  - Grade D (Reject): {audit_data.get('reject_count', 0)}
+
+COMPLIANCE: {audit_data.get('compliance_status', 'N/A')}
+STOCK DAYS: {audit_data.get('stock_days', 0)}
+
+Verification Hash: {hash_value[:32]}...
+        """
+        zf.writestr(f"{audit_data['audit_id']}_SUMMARY.txt", summary)
+    
+    buffer.seek(0)
+    return buffer
+
+def generate_audit_hash(audit_data):
+    # Merkle root over fields and image digests; memoized until audit_data changes
+    return audit_merkle_root(audit_data)
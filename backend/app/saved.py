@@ -0,0 +1,397 @@
+"""Saved captures and uploads: date-sharded files plus a SQLite index.
+
+Images are stored as ``saved_images/YYYY/MM/DD/<kind>_<YYYYmmdd_HHMMSS>_<hash>.jpg``,
+where ``<hash>`` is the start of the image's SHA-256, so two saves in the
+same second never overwrite each other (saving identical bytes twice yields
+the same name). The file name, without the date directories, is the public
+id used by the API. The index answers listings and lookups without touching
+the directory tree, which is slow on SD cards; files saved flat by earlier
+versions are indexed in place the first time the store opens.
+
+``apply_retention`` recompresses images past a given age (under a new name
+carrying the new bytes' hash, since saved images are served as immutable),
+deletes them past a maximum age, and deletes the oldest until the total fits a byte budget,
+keeping files and index consistent (index rows go first, so a crash leaves
+at worst an orphan file, never a dangling row). A background thread runs it
+periodically when any retention setting is on.
+
+``save_later`` is the write-behind path for request handlers: it names the
+image, queues the bytes and returns at once, so response latency does not
+depend on the storage. A writer thread drains the queue in batches: it
+writes every file of a batch, fsyncs them, renames them into place, fsyncs
+each touched directory once and indexes the batch in one transaction.
+Queued images are served from memory until written; ``is_durable`` and
+``writer_status`` report progress, and ``flush`` waits for the queue to
+drain (called at shutdown).
+"""
+import hashlib
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.settings import SAVES_DIR, get_settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    recompressed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_images_created ON images (created_at DESC);
+"""
+
+HASH_CHARS = 12
+# Queued saves beyond this are written synchronously by the caller instead
+WRITE_QUEUE_SIZE = 64
+WRITE_BATCH_MAX = 32
+log = logging.getLogger("jutevision.saved")
+_NAME = re.compile(r"[A-Za-z0-9_.-]+\.jpg")
+_HASH = re.compile(f"[0-9a-f]{{{HASH_CHARS}}}")
+
+
+class SavedImageStore:
+    """Sharded saved-image files with a SQLite index; one connection per thread."""
+
+    def __init__(self, root: Path = SAVES_DIR):
+        self.root = root
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # Write-behind: (name, relative path, kind, sha256, created_at, data)
+        self._queue: queue.Queue[tuple] = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._pending: dict[str, tuple] = {}
+        self._idle = threading.Condition()
+        self._writer: threading.Thread | None = None
+        self.written = 0
+        self.last_flush_at: float | None = None
+        self.last_error: str | None = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+        self._import_flat_files()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "index.db", timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_flat_files(self) -> None:
+        """Index images saved directly in the root by earlier versions (runs once)."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM images LIMIT 1").fetchone() is not None:
+            return
+        rows = []
+        for path in self.root.glob("*.jpg"):
+            st = path.stat()
+            rows.append((path.name, path.name, path.name.split("_", 1)[0], "", st.st_size, st.st_mtime))
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO images (name, path, kind, sha256, size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    # --- Saving and lookup ---
+
+    @staticmethod
+    def _entry(data: bytes, kind: str) -> tuple:
+        now = datetime.now()
+        sha256 = hashlib.sha256(data).hexdigest()
+        name = f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}_{sha256[:HASH_CHARS]}.jpg"
+        return name, f"{now:%Y/%m/%d}/{name}", kind, sha256, now.timestamp(), data
+
+    def _write_batch(self, batch: list[tuple]) -> None:
+        """Write, fsync and index a batch of entries (one directory fsync and one commit per batch)."""
+        # Identical bytes saved twice in one second share a name: write once
+        batch = list({entry[0]: entry for entry in batch}.values())
+        staged = []
+        try:
+            for name, relative, _, _, _, data in batch:
+                path = self.root / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                f = open(tmp, "wb")
+                staged.append((f, tmp, path))
+                f.write(data)
+            for f, _, _ in staged:
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            for f, _, _ in staged:
+                f.close()
+        for _, tmp, path in staged:
+            os.replace(tmp, path)
+        for directory in {path.parent for _, _, path in staged}:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO images (name, path, kind, sha256, size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(name, relative, kind, sha256, len(data), created_at)
+                 for name, relative, kind, sha256, created_at, data in batch],
+            )
+
+    def save(self, data: bytes, kind: str = "capture") -> str:
+        """Store JPEG bytes durably; returns the image name (collision-free, identical bytes dedupe)."""
+        entry = self._entry(data, kind)
+        self._write_batch([entry])
+        return entry[0]
+
+    def save_later(self, data: bytes, kind: str = "capture") -> str:
+        """Queue JPEG bytes for the writer thread; returns the final name immediately.
+
+        Raises queue.Full when the writer is this far behind (the caller then
+        uses ``save``). Writes synchronously if the writer is not running.
+        """
+        if self._writer is None:
+            return self.save(data, kind)
+        entry = self._entry(data, kind)
+        with self._idle:
+            self._pending[entry[0]] = entry
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._idle:
+                self._pending.pop(entry[0], None)
+            raise
+        return entry[0]
+
+    def pending_bytes(self, name: str) -> bytes | None:
+        """Bytes of an image still waiting in the write queue, else None."""
+        entry = self._pending.get(name)
+        return entry[5] if entry is not None else None
+
+    def is_durable(self, name: str) -> bool:
+        return name not in self._pending and self.path(name) is not None
+
+    def writer_status(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "last_flush_at": self.last_flush_at,
+            "last_error": self.last_error,
+        }
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            while len(batch) < WRITE_BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            written = 0
+            while True:
+                try:
+                    self._write_batch(batch)
+                    self.last_error = None
+                    written = len(batch)
+                    break
+                except Exception as e:
+                    # Keep the batch (still served from memory) and retry; the
+                    # bounded queue pushes new saves to the synchronous path
+                    log.exception("Write-behind save failed; retrying")
+                    self.last_error = str(e)
+                    if self._stop.wait(1.0):
+                        log.error("Dropping %d unsaved images at shutdown", len(batch))
+                        break
+            with self._idle:
+                for entry in batch:
+                    self._pending.pop(entry[0], None)
+                self.written += written
+                self.last_flush_at = time.time()
+                self._idle.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued image is written; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def path(self, name: str) -> Path | None:
+        """File of a saved image, or None if unknown (or not written yet)."""
+        if not _NAME.fullmatch(name):
+            return None
+        row = self._conn().execute("SELECT path FROM images WHERE name = ?", (name,)).fetchone()
+        return self.root / row["path"] if row is not None else None
+
+    def names(self, limit: int | None = None) -> list[str]:
+        """Image names, newest first, queued ones included (from the index; no directory scan)."""
+        queued = [e[0] for e in sorted(list(self._pending.values()), key=lambda e: e[4], reverse=True)]
+        rows = self._conn().execute(
+            "SELECT name FROM images ORDER BY created_at DESC LIMIT ?", (-1 if limit is None else limit,)
+        ).fetchall()
+        names = queued + [r["name"] for r in rows if r["name"] not in self._pending]
+        return names if limit is None else names[:limit]
+
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+
+    def rebuild_index(self) -> int:
+        """Re-index from the files on disk (after manual changes); returns the image count."""
+        rows = []
+        for path in self.root.rglob("*.jpg"):
+            st = path.stat()
+            rows.append((path.name, path.relative_to(self.root).as_posix(), path.name.split("_", 1)[0],
+                         "", st.st_size, st.st_mtime))
+        with self._conn() as conn:
+            conn.execute("DELETE FROM images")
+            conn.executemany(
+                "INSERT OR IGNORE INTO images (name, path, kind, sha256, size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    # --- Retention ---
+
+    def _delete(self, rows: list[sqlite3.Row]) -> None:
+        with self._conn() as conn:
+            conn.executemany("DELETE FROM images WHERE name = ?", [(r["name"],) for r in rows])
+        for r in rows:
+            path = self.root / r["path"]
+            path.unlink(missing_ok=True)
+            # Drop emptied day/month/year directories
+            for parent in path.parents:
+                if parent == self.root:
+                    break
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+
+    @staticmethod
+    def _renamed(name: str, sha256: str) -> str:
+        """``name`` with its hash part replaced by (or, for old flat names, extended with) ``sha256``."""
+        stem = name[:-len(".jpg")]
+        base, _, tail = stem.rpartition("_")
+        if not base or not _HASH.fullmatch(tail):
+            base = stem
+        return f"{base}_{sha256[:HASH_CHARS]}.jpg"
+
+    def _recompress(self, row: sqlite3.Row, quality: int) -> int:
+        """Re-encode one image at ``quality``; returns bytes saved (0 if not smaller).
+
+        The smaller file gets a new name (new hash), so a browser holding the
+        old name under an immutable cache entry never sees different bytes.
+        """
+        path = self.root / row["path"]
+        frame = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR) if path.exists() else None
+        if frame is not None:
+            _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if len(buffer) < row["size"]:
+                data = buffer.tobytes()
+                sha256 = hashlib.sha256(data).hexdigest()
+                name = self._renamed(row["name"], sha256)
+                new_path = path.with_name(name)
+                tmp = new_path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, new_path)
+                with self._conn() as conn:
+                    conn.execute("DELETE FROM images WHERE name = ?", (row["name"],))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO images (name, path, kind, sha256, size, created_at, recompressed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 1)",
+                        (name, new_path.relative_to(self.root).as_posix(), row["kind"], sha256, len(data),
+                         row["created_at"]),
+                    )
+                if new_path != path:
+                    path.unlink(missing_ok=True)
+                return row["size"] - len(data)
+        with self._conn() as conn:
+            conn.execute("UPDATE images SET recompressed = 1 WHERE name = ?", (row["name"],))
+        return 0
+
+    def apply_retention(self, max_age_days: float = 0, max_total_bytes: int = 0,
+                        recompress_after_days: float = 0, recompress_quality: int = 70) -> dict:
+        """Recompress, then prune by age and by total size (0 disables each step)."""
+        conn = self._conn()
+        now = time.time()
+        stats = {"recompressed": 0, "bytes_reclaimed": 0, "deleted": 0}
+        if recompress_after_days:
+            for row in conn.execute(
+                "SELECT * FROM images WHERE recompressed = 0 AND created_at < ?",
+                (now - recompress_after_days * 86400,),
+            ).fetchall():
+                if self._stop.is_set():
+                    return stats
+                stats["bytes_reclaimed"] += self._recompress(row, recompress_quality)
+                stats["recompressed"] += 1
+        if max_age_days:
+            old = conn.execute(
+                "SELECT name, path, size FROM images WHERE created_at < ?", (now - max_age_days * 86400,)
+            ).fetchall()
+            self._delete(old)
+            stats["deleted"] += len(old)
+            stats["bytes_reclaimed"] += sum(r["size"] for r in old)
+        if max_total_bytes:
+            excess = self.total_bytes() - max_total_bytes
+            victims = []
+            for row in conn.execute("SELECT name, path, size FROM images ORDER BY created_at"):
+                if excess <= 0:
+                    break
+                victims.append(row)
+                excess -= row["size"]
+            self._delete(victims)
+            stats["deleted"] += len(victims)
+            stats["bytes_reclaimed"] += sum(r["size"] for r in victims)
+        return stats
+
+    def _retention_from_settings(self) -> dict:
+        s = get_settings()
+        return {
+            "max_age_days": float(s.get("saved_max_age_days") or 0),
+            "max_total_bytes": int(s.get("saved_max_total_bytes") or 0),
+            "recompress_after_days": float(s.get("saved_recompress_after_days") or 0),
+            "recompress_quality": int(s.get("saved_recompress_quality") or 70),
+        }
+
+    def start(self, interval_s: float = 3600) -> None:
+        """Start the writer, and retention every ``interval_s`` if a policy is set."""
+        self._stop.clear()
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="saved-writer", daemon=True)
+            self._writer.start()
+        policy = self._retention_from_settings()
+        if self._thread is not None or not any(v for k, v in policy.items() if k != "recompress_quality"):
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval_s,), name="saved-retention", daemon=True)
+        self._thread.start()
+
+    def _run(self, interval_s: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.apply_retention(**self._retention_from_settings())
+            except Exception:
+                log.exception("Saved-image retention failed")
+            self._stop.wait(interval_s)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop retention and the writer (which drains the queue first)."""
+        self._stop.set()
+        for thread in (self._thread, self._writer):
+            if thread is not None:
+                thread.join(timeout)
+        self._thread = self._writer = None
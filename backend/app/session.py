@@ -0,0 +1,132 @@
+"""Per-session audit state with frame-accurate weight accumulation.
+
+The scanned-weight total is driven by the capture/inference loop, not by
+clients: each detection result carries a frame sequence number and capture
+timestamp, and a session adds ``weight * rate * elapsed`` once per new frame.
+Results are idempotent per sequence number, so the total is independent of
+how many viewers are connected or how often they poll. Each session follows
+one camera, whose sequence numbers it tracks.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+SCANNING_STATUSES = ("scanning", "analyzing")
+PROGRESS = {"idle": 0, "scanning": 45, "analyzing": 75, "complete": 100, "error": 0}
+# Fraction of the estimated weight accumulated per second of scanning
+# (matches the old behaviour of one 1.5 s dashboard poll adding 1%)
+KG_RATE_PER_S = 0.01 / 1.5
+# A capture stall longer than this does not count as scanning time
+MAX_FRAME_GAP_S = 2.0
+DEFAULT_SESSION = "default"
+# Sessions are created for any id a client sends, so the registry is bounded:
+# idle sessions expire, and past the cap the least recently used is evicted
+SESSION_IDLE_TTL_S = 3600.0
+MAX_SESSIONS = 256
+
+
+class AuditSession:
+    """Status and scanned-weight accumulator for one audit session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        # Camera this session accumulates from; None means the default camera
+        self.camera_id: str | None = None
+        self._lock = threading.Lock()
+        self.status = "idle"
+        self.total_kg = 0.0
+        self._last_seq = -1
+        self._last_ts: float | None = None
+
+    def set_camera(self, camera_id: str | None) -> None:
+        """Follow another camera; its sequence numbers start over, so the frame cursor does too."""
+        with self._lock:
+            if camera_id != self.camera_id:
+                self.camera_id = camera_id
+                self._last_seq = -1
+                self._last_ts = None
+
+    def set_status(self, status: str, reset_total: bool = False) -> None:
+        with self._lock:
+            self.status = status
+            if reset_total:
+                self.total_kg = 0.0
+            # Time before (re)starting never counts towards the total
+            self._last_ts = None
+
+    def observe(self, seq: int, ts: float, weight_kg: float) -> None:
+        """Accumulate one detection result; stale or repeated frames are ignored."""
+        with self._lock:
+            if seq <= self._last_seq:
+                return
+            if self.status in SCANNING_STATUSES and self._last_ts is not None:
+                dt = min(max(ts - self._last_ts, 0.0), MAX_FRAME_GAP_S)
+                self.total_kg += weight_kg * KG_RATE_PER_S * dt
+            self._last_seq = seq
+            self._last_ts = ts
+
+    @property
+    def active(self) -> bool:
+        return self.status in SCANNING_STATUSES
+
+    @property
+    def progress(self) -> int:
+        return PROGRESS.get(self.status, 0)
+
+
+class SessionRegistry:
+    """Audit sessions by id, created on first use and kept in LRU order.
+
+    A session not used for ``idle_ttl_s`` is dropped unless it is scanning;
+    beyond ``max_sessions`` the least recently used one is evicted (idle
+    sessions first). The default session is never dropped.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl_s: float = SESSION_IDLE_TTL_S):
+        self.max_sessions = max_sessions
+        self.idle_ttl_s = idle_ttl_s
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[str, AuditSession] = OrderedDict()
+        self._last_used: dict[str, float] = {}
+
+    def get(self, session_id: str = DEFAULT_SESSION) -> AuditSession:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._expire(now)
+                session = self._sessions[session_id] = AuditSession(session_id)
+                self._evict()
+            else:
+                self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = now
+        return session
+
+    def _expire(self, now: float) -> None:
+        for session_id, session in list(self._sessions.items()):
+            if now - self._last_used[session_id] < self.idle_ttl_s:
+                break  # LRU order: the rest were used more recently
+            if session_id != DEFAULT_SESSION and not session.active:
+                self._drop(session_id)
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            candidates = [k for k in self._sessions if k != DEFAULT_SESSION]
+            idle = [k for k in candidates if not self._sessions[k].active]
+            self._drop((idle or candidates)[0])
+
+    def _drop(self, session_id: str) -> None:
+        del self._sessions[session_id]
+        del self._last_used[session_id]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def any_active(self) -> bool:
+        return any(s.active for s in list(self._sessions.values()))
+
+    def observe(self, camera_id: str, seq: int, ts: float, weight_kg: float, default_camera_id: str) -> None:
+        """Feed one camera's detection result to the sessions watching that camera."""
+        for session in list(self._sessions.values()):
+            if (session.camera_id or default_camera_id) == camera_id:
+                session.observe(seq, ts, weight_kg)
@@ -5,12 +5,49 @@ from pathlib import Path
 
 SETTINGS_PATH = Path(__file__).resolve().parent.parent.parent / "jutevision_settings.json"
 SAVES_DIR = Path(__file__).resolve().parent.parent.parent / "saved_images"
+AUDIT_DB_PATH = Path(__file__).resolve().parent.parent.parent / "jutevision_audits.db"
+JOBS_DIR = Path(__file__).resolve().parent.parent.parent / "jobs"
+PROFILES_DIR = Path(__file__).resolve().parent.parent.parent / "profiles"
+UPLOADS_DIR = Path(__file__).resolve().parent.parent.parent / "uploads"
+OUTBOX_DIR = Path(__file__).resolve().parent.parent.parent / "outbox"
+DRAFTS_DIR = Path(__file__).resolve().parent.parent.parent / "drafts"
 
 DEFAULTS = {
     "app_pin_enabled": False,
     "file_pin_enabled": False,
     "app_pin_hash": "",
     "file_pin_hash": "",
+    "detector": "auto",
+    "cameras": {"0": 0},
+    "max_inference_fps_per_camera": 10,
+    # Upload inference processes (0 = run in the API process)
+    "inference_workers": 0,
+    "inference_threads_per_worker": 1,
+    "inference_pin_cores": False,
+    # Longest side uploads are analysed at (0 = full size); also the size the
+    # dashboard downscales photos to before uploading
+    "upload_max_side": 1920,
+    # Uploads over these are refused before being read whole / decoded
+    "upload_max_bytes": 32 * 1024 * 1024,
+    "upload_max_pixels": 50_000_000,
+    # Saved-image retention, applied hourly (0 = off): recompress captures older
+    # than N days, delete older than N days, keep the total under a byte budget
+    "saved_recompress_after_days": 0,
+    "saved_recompress_quality": 70,
+    "saved_max_age_days": 0,
+    "saved_max_total_bytes": 0,
+    # Offline outbox sync target (see app.outbox); empty = not configured
+    "sync_url": "",
+    "sync_token": "",
+    "sync_batch_audits": 20,
+    "sync_batch_bytes": 4 * 1024 * 1024,
+    # Processes for batch PDF reports (0 = one per CPU)
+    "report_workers": 0,
+    # Opt-in profiling (see app.profiling); read at startup
+    "profiling_enabled": False,
+    "slow_request_ms": 2000,
+    "request_timing_log": False,
+    "profile_token": "",
 }
 
 
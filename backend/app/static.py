@@ -0,0 +1,133 @@
+"""HTTP caching for the built frontend and saved images.
+
+ETags are content hashes (computed once per file version), so an identical
+file revalidates with 304 even after a rebuild touches its mtime. Files whose
+content can never change under the same name (Vite's hashed asset names such
+as ``index-B8Mr2yMk.js``, and saved images) are sent as ``immutable`` for a
+year, so repeat loads skip even the revalidation request; index.html is
+``no-cache`` (always revalidated, normally a 304). Precompressed ``.br`` /
+``.gz`` siblings produced by the frontend build are sent to clients that
+accept them. Range requests are handled by FileResponse.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Saved images can sit behind the file PIN: browser cache only, never shared caches
+PRIVATE_IMMUTABLE = "private, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Vite (Rollup) output names: <name>-<8-char base64url content hash>.<ext>
+_HASHED_NAME = re.compile(r"-([A-Za-z0-9_-]{8})\.[A-Za-z0-9]+$")
+# Preferred first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# path -> (mtime_ns, size, etag)
+_etags: dict[str, tuple[int, int, str]] = {}
+
+
+def content_etag(path: str | os.PathLike, stat_result: os.stat_result) -> str:
+    """Strong ETag from the file's SHA-256, cached until its mtime or size changes."""
+    key = os.fspath(path)
+    cached = _etags.get(key)
+    if cached is not None and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(key, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    _etags[key] = (stat_result.st_mtime_ns, stat_result.st_size, etag)
+    return etag
+
+
+def is_hashed_name(name: str) -> bool:
+    """Whether a file name carries a bundler content hash (and so never changes).
+
+    An all-lowercase run such as ``-fallback`` is a plain word, not a hash;
+    real hashes mix in digits or capitals. A missed hash only costs a
+    revalidation, while a false match would pin a changing file for a year.
+    """
+    match = _HASHED_NAME.search(name)
+    return match is not None and not match.group(1).islower()
+
+
+def _not_modified(request_headers: Headers, etag: str) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
+def _accepted_encodings(request_headers: Headers) -> set[str]:
+    accepted = set()
+    for item in request_headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def file_response(
+    path: str | os.PathLike,
+    request_headers: Headers,
+    cache_control: str,
+    media_type: str | None = None,
+    stat_result: os.stat_result | None = None,
+    status_code: int = 200,
+    precompressed: bool = False,
+) -> Response:
+    """FileResponse with a content-hash ETag, Cache-Control and 304 handling.
+
+    With ``precompressed``, a ``.br``/``.gz`` sibling is sent instead when the
+    client accepts that encoding. Blocking (hashes the file on first use).
+    """
+    path = os.fspath(path)
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {"Cache-Control": cache_control}
+    if precompressed:
+        headers["Vary"] = "Accept-Encoding"
+        accepted = _accepted_encodings(request_headers)
+        for coding, suffix in _ENCODINGS:
+            if coding in accepted and os.path.isfile(path + suffix):
+                path = path + suffix
+                stat_result = os.stat(path)
+                headers["Content-Encoding"] = coding
+                break
+    stat_result = stat_result or os.stat(path)
+    headers["ETag"] = content_etag(path, stat_result)
+    if status_code == 200 and _not_modified(request_headers, headers["ETag"]):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, status_code=status_code, media_type=media_type, headers=headers,
+                        stat_result=stat_result)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with content ETags, immutable caching of hashed names and precompressed variants."""
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        # Runs in a worker thread: hash the file and its precompressed siblings
+        # here, so file_response on the event loop only reads the ETag cache.
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            content_etag(full_path, stat_result)
+            for _, suffix in _ENCODINGS:
+                try:
+                    content_etag(full_path + suffix, os.stat(full_path + suffix))
+                except OSError:
+                    pass
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        cache_control = IMMUTABLE if is_hashed_name(os.path.basename(full_path)) else REVALIDATE
+        return file_response(full_path, Headers(scope=scope), cache_control, stat_result=stat_result,
+                             status_code=status_code, precompressed=True)
@@ -0,0 +1,89 @@
+"""Stand-in receiver for the offline outbox sync protocol (see app.outbox).
+
+Run locally to test syncing end to end:
+
+    cd backend
+    uvicorn app.sync_receiver:app --port 8100
+
+then set ``"sync_url": "http://localhost:8100"`` in jutevision_settings.json.
+Data goes to ``JUTEVISION_RECEIVER_DIR`` (default ``sync_receiver/`` in the
+repo root); set ``JUTEVISION_RECEIVER_TOKEN`` to require a bearer token.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+
+from app.blobs import BlobStore
+from app.outbox import FrameReader, manifest_blobs
+
+ROOT = Path(os.environ.get("JUTEVISION_RECEIVER_DIR", Path(__file__).resolve().parent.parent.parent / "sync_receiver"))
+TOKEN = os.environ.get("JUTEVISION_RECEIVER_TOKEN", "")
+_AUDIT_ID = re.compile(r"[A-Za-z0-9_.-]+")
+
+blobs = BlobStore(ROOT / "blobs")
+audits_dir = ROOT / "audits"
+audits_dir.mkdir(parents=True, exist_ok=True)
+
+
+def _authorize(request: Request) -> None:
+    if TOKEN and request.headers.get("authorization") != f"Bearer {TOKEN}":
+        raise HTTPException(401, "Invalid sync token")
+
+
+app = FastAPI(title="JuteVision sync receiver", dependencies=[Depends(_authorize)])
+
+
+@app.post("/sync/have")
+async def have(body: dict):
+    """Which of the listed blob digests are missing here."""
+    try:
+        return {"missing": [d for d in body.get("blobs", []) if not blobs.has(d)]}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.post("/sync/blobs")
+async def put_blobs(request: Request):
+    """Store a framed batch of blobs; each is verified and kept as soon as it is complete."""
+    reader = FrameReader()
+    stored = 0
+    try:
+        async for chunk in request.stream():
+            for digest, data in reader.feed(chunk):
+                blobs.put(data, digest)
+                stored += 1
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if reader.incomplete:
+        raise HTTPException(400, f"Truncated blob batch after {stored} blobs")
+    return {"stored": stored}
+
+
+@app.post("/sync/audits")
+async def put_audits(body: dict):
+    """Accept audit manifests whose blobs are all present; report the rest."""
+    accepted, incomplete = [], []
+    for manifest in body.get("audits", []):
+        audit_id = str(manifest.get("audit_id", ""))
+        if not _AUDIT_ID.fullmatch(audit_id):
+            raise HTTPException(400, f"Invalid audit_id: {audit_id!r}")
+        missing = [d for d in manifest_blobs(manifest) if not blobs.has(d)]
+        if missing:
+            incomplete.append({"audit_id": audit_id, "missing": missing})
+            continue
+        tmp = audits_dir / f"{audit_id}.json.tmp"
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, audits_dir / f"{audit_id}.json")
+        accepted.append(audit_id)
+    return {"accepted": accepted, "incomplete": incomplete}
+
+
+@app.get("/sync/audits/{audit_id}")
+async def get_audit(audit_id: str):
+    path = audits_dir / f"{audit_id}.json"
+    if not _AUDIT_ID.fullmatch(audit_id) or not path.is_file():
+        raise HTTPException(404, "Audit not found")
+    return json.loads(path.read_text())
@@ -0,0 +1,280 @@
+"""Prometheus-style metrics (text exposition format, no client library).
+
+Hot paths update preallocated children: bind a label combination once with
+``labels()`` at import time, then ``inc()``/``observe()`` is an integer add
+(plus a bisect over fixed bucket bounds for histograms) with no locks. Under
+the GIL an increment can very rarely be lost when two threads race on the
+same child; that is acceptable for monitoring and keeps the cost low enough
+to leave on in production. Values owned by other objects (per-camera frame
+counters, queue depths) are read only at scrape time through callbacks.
+"""
+import abc
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: dict[str, "_Metric"] = {}
+
+# fn() -> iterable of (labels dict, value)
+Sample = tuple[dict, float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        if name in _registry:
+            raise ValueError(f"Duplicate metric: {name}")
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        _registry[name] = self
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Storage for one label combination."""
+
+    def labels(self, *values):
+        """Child for one label combination (create once, keep the reference)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """Exposition lines, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(f"{line}\n" for line in self._samples())
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def since(self, started: float) -> float:
+        """Observe the seconds elapsed since a ``time.perf_counter()`` value."""
+        elapsed = time.perf_counter() - started
+        self.observe(elapsed)
+        return elapsed
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            counts = list(child.counts)
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                total += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {total}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(child.sum)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {total}"
+
+
+class Callback(_Metric):
+    """Counter or gauge whose samples are computed at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], Iterable[Sample]]):
+        self.kind = kind
+        self.fn = fn
+        super().__init__(name, help)
+
+    def _new_child(self):
+        raise TypeError(f"{self.name} is computed at scrape time and has no labelled children")
+
+    def _samples(self):
+        for labels, value in self.fn():
+            yield f"{self.name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}"
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format."""
+    return "".join(metric.render() for metric in list(_registry.values()))
+
+
+# --- Shared metric definitions ---
+
+STAGE_SECONDS = Histogram(
+    "jutevision_stage_seconds", "Image pipeline stage latency (decode, inference, annotate, encode)", ("stage",)
+)
+STAGES = {stage: STAGE_SECONDS.labels(stage) for stage in ("decode", "inference", "annotate", "encode")}
+
+REQUEST_SECONDS = Histogram(
+    "jutevision_request_seconds", "End-to-end HTTP request latency per endpoint", ("method", "route")
+)
+RESPONSES = Counter(
+    "jutevision_http_responses_total", "HTTP responses by endpoint and status class", ("route", "status")
+)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+MODEL_LOAD_SECONDS = Gauge(
+    "jutevision_model_load_seconds", "Time taken to load the detector", ("backend", "process")
+)
+
+CACHE_REQUESTS = Counter("jutevision_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+
+
+def cache_counters(cache: str) -> tuple[_Value, _Value]:
+    """(hit, miss) children for one cache."""
+    return CACHE_REQUESTS.labels(cache, "hit"), CACHE_REQUESTS.labels(cache, "miss")
+
+
+def _cache_hit_ratios() -> Iterable[Sample]:
+    caches = {key[0] for key in list(CACHE_REQUESTS._children)}
+    for cache in sorted(caches):
+        hit, miss = cache_counters(cache)
+        total = hit.value + miss.value
+        if total:
+            yield {"cache": cache}, hit.value / total
+
+
+Callback("jutevision_cache_hit_ratio", "Cache hit ratio since start", "gauge", _cache_hit_ratios)
+
+
+class _RouteMetrics:
+    """Response counters (indexed by status class) and latency children for one route."""
+
+    __slots__ = ("responses", "seconds")
+
+    def __init__(self, route: str, methods: Iterable[str]):
+        self.responses = tuple(RESPONSES.labels(route, status) for status in STATUS_CLASSES)
+        self.seconds = {method: REQUEST_SECONDS.labels(method, route) for method in methods}
+
+    def response(self, status: int) -> _Value:
+        return self.responses[min(max(status // 100, 1), 5) - 1]
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording per-endpoint latency and response counts.
+
+    Endpoints are labelled by their route template (``/api/jobs/{job_id}``),
+    not the raw path, and responses by status class (``2xx``). The children
+    for every route of ``routes`` are bound once, on the first request, so
+    recording is a dict lookup on the template string and two integer adds.
+    Multipart streams (MJPEG) are counted but not timed, since their duration
+    is the viewing time.
+    """
+
+    def __init__(self, app, routes: list | None = None):
+        self.app = app
+        self.routes = routes if routes is not None else []
+        self._bound: dict[str, _RouteMetrics] | None = None
+        self._other = _RouteMetrics("other", ())
+
+    def _bind(self) -> dict[str, _RouteMetrics]:
+        bound = {}
+        for route in self.routes:
+            path = getattr(route, "path", None)
+            if path is not None:
+                bound[path] = _RouteMetrics(path, getattr(route, "methods", None) or ())
+        self._bound = bound
+        return bound
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = {"status": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"multipart/x-mixed-replace"):
+                        state["stream"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            bound = self._bound if self._bound is not None else self._bind()
+            route = getattr(scope.get("route"), "path", None)
+            metrics = bound.get(route, self._other) if route is not None else self._other
+            metrics.response(state["status"]).inc()
+            if not state["stream"]:
+                child = metrics.seconds.get(scope["method"])
+                if child is None:
+                    child = REQUEST_SECONDS.labels(scope["method"], route or "other")
+                child.since(started)
@@ -0,0 +1,196 @@
+"""Resumable chunked uploads, spooled to disk.
+
+Protocol: ``create`` an upload with its total size and SHA-256, send chunks
+with their byte offsets, then ``finalize``. Chunks are written straight to a
+file in the upload's directory (in the thread pool, so disk latency never
+blocks the event loop), so server memory per upload is one network read
+regardless of file size. The bytes received so
+far are simply the file's length: after a dropped connection the client asks
+for the status and continues from there. Finalize checks the size and
+SHA-256 before the file is handed on.
+
+``BodyLimitMiddleware`` caps every request body: a declared Content-Length
+over the limit is refused before anything is read, and a chunked body is
+cut off as soon as it passes the limit.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings import UPLOADS_DIR
+
+CHUNK_SIZE = 1024 * 1024
+MAX_AGE_S = 24 * 3600
+_ID = re.compile(r"[0-9a-f]{32}")
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+class UploadNotFound(KeyError):
+    pass
+
+
+class OffsetMismatch(ValueError):
+    """Chunk would leave a gap (or overrun the declared size); carries the resume offset."""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+class UploadStore:
+    """Upload directories under ``root``: ``meta.json`` plus the ``data`` spool file."""
+
+    def __init__(self, root: Path = UPLOADS_DIR):
+        self.root = root
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _dir(self, upload_id: str) -> Path:
+        path = self.root / upload_id
+        if not _ID.fullmatch(upload_id) or not path.is_dir():
+            raise UploadNotFound(upload_id)
+        return path
+
+    def _meta(self, upload_id: str) -> dict:
+        return json.loads((self._dir(upload_id) / "meta.json").read_text())
+
+    def create(self, size: int, sha256: str, filename: str = "", content_type: str = "",
+               extra: dict | None = None) -> dict:
+        """Start an upload of ``size`` bytes with hex digest ``sha256``; ``extra`` is returned by finalize."""
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        sha256 = sha256.strip().lower()
+        if not _SHA256.fullmatch(sha256):
+            raise ValueError("A hex SHA-256 of the whole file is required")
+        upload_id = uuid.uuid4().hex
+        path = self.root / upload_id
+        path.mkdir(parents=True)
+        (path / "data").touch()
+        meta = {
+            "upload_id": upload_id,
+            "size": size,
+            "sha256": sha256,
+            "filename": filename,
+            "content_type": content_type,
+            "created_at": time.time(),
+            "extra": extra or {},
+        }
+        (path / "meta.json").write_text(json.dumps(meta))
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> dict:
+        meta = self._meta(upload_id)
+        return {
+            "upload_id": upload_id,
+            "size": meta["size"],
+            "received": (self._dir(upload_id) / "data").stat().st_size,
+            "chunk_size": CHUNK_SIZE,
+        }
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write a streamed chunk at ``offset``; returns the bytes received so far.
+
+        Re-sending already received bytes is fine; a chunk starting past the
+        received length is refused, so the spool never has holes.
+        """
+        path = self._dir(upload_id) / "data"
+        size = (await run_in_threadpool(self._meta, upload_id))["size"]
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            received = (await run_in_threadpool(path.stat)).st_size
+            if offset < 0 or offset > received:
+                raise OffsetMismatch(f"Expected offset <= {received}", received)
+            f = await run_in_threadpool(open, path, "r+b")
+            try:
+                f.seek(offset)
+                position = offset
+                async for piece in chunks:
+                    if position + len(piece) > size:
+                        raise OffsetMismatch(f"Chunk exceeds declared size {size}", max(received, position))
+                    await run_in_threadpool(f.write, piece)
+                    position += len(piece)
+            finally:
+                await run_in_threadpool(f.close)
+            return (await run_in_threadpool(path.stat)).st_size
+
+    def finalize(self, upload_id: str) -> tuple[Path, dict]:
+        """Verify size and SHA-256; returns the spool file path and the upload's metadata.
+
+        The caller takes ownership of the file (move it), then calls ``discard``.
+        """
+        meta = self._meta(upload_id)
+        path = self._dir(upload_id) / "data"
+        received = path.stat().st_size
+        if received != meta["size"]:
+            raise OffsetMismatch(f"Incomplete upload: {received} of {meta['size']} bytes", received)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+        actual = digest.hexdigest()
+        if actual != meta["sha256"]:
+            # Corrupt spool: start over rather than resume into bad data
+            path.write_bytes(b"")
+            raise ChecksumMismatch(f"SHA-256 mismatch: expected {meta['sha256']}, got {actual}")
+        return path, meta
+
+    def discard(self, upload_id: str) -> None:
+        self._locks.pop(upload_id, None)
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def prune(self, max_age_s: float = MAX_AGE_S) -> int:
+        """Remove abandoned uploads older than ``max_age_s``."""
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - max_age_s
+        removed = 0
+        for path in self.root.iterdir():
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                self._locks.pop(path.name, None)
+                removed += 1
+        return removed
+
+
+class BodyLimitMiddleware:
+    """ASGI middleware refusing HTTP request bodies over ``max_bytes`` with 413."""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json"), (b"connection", b"close")]})
+            await send({"type": "http.response.body", "body": b'{"detail":"Request body too large"}'})
+            return
+        seen = 0
+
+        async def limited_receive():
+            nonlocal seen
+            message = await receive()
+            if message["type"] == "http.request":
+                seen += len(message.get("body", b""))
+                if seen > self.max_bytes:
+                    # Raised inside the app, so the exception handler turns it into a 413
+                    raise HTTPException(413, "Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,76 @@
+import io
+
+from app.audit_hash import IMAGE_FIELDS, AuditDict, audit_merkle_root, image_digest
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4
+
+
+def _audit(**extra) -> dict:
+    return {
+        "audit_id": "JV-TEST-0001",
+        "inspector": "Inspector",
+        "mill_name": "Test Mill",
+        "total_count": 12,
+        "flags": {"moisture": False},
+        "original_images": [io.BytesIO(JPEG)],
+        **extra,
+    }
+
+
+def test_root_ignores_key_order():
+    data = _audit()
+    reordered = dict(reversed(list(data.items())))
+    assert audit_merkle_root(data) == audit_merkle_root(reordered)
+
+
+def test_missing_image_fields_hash_like_empty_lists():
+    data = _audit()
+    with_empty = {**data, **{k: [] for k in IMAGE_FIELDS if k not in data}}
+    assert audit_merkle_root(data) == audit_merkle_root(with_empty)
+    assert audit_merkle_root(AuditDict(data)) == audit_merkle_root(with_empty)
+
+
+def test_hash_field_does_not_feed_back():
+    data = _audit()
+    assert audit_merkle_root(data) == audit_merkle_root({**data, "hash": "0" * 64})
+
+
+def test_read_position_does_not_change_root():
+    data = _audit()
+    before = audit_merkle_root(data)
+    data["original_images"][0].seek(0, io.SEEK_END)
+    assert audit_merkle_root(data) == before
+
+
+def test_image_bytes_change_root():
+    assert audit_merkle_root(_audit()) != audit_merkle_root(_audit(original_images=[io.BytesIO(JPEG[:-1])]))
+
+
+def test_audit_dict_memo_tracks_mutation():
+    data = AuditDict(_audit())
+    first = data.root_hash()
+    assert first == audit_merkle_root(dict(data))
+
+    data["mill_name"] = "Other Mill"
+    assert data.root_hash() == audit_merkle_root(dict(data)) != first
+
+    # In-place edits of container fields are picked up without reassignment
+    data["flags"]["moisture"] = True
+    data["processed_images"] = []
+    data["processed_images"].append(io.BytesIO(JPEG))
+    assert data.root_hash() == audit_merkle_root(dict(data))
+
+    del data["processed_images"]
+    data["mill_name"] = "Test Mill"
+    data["flags"]["moisture"] = False
+    assert data.root_hash() == first
+
+
+def test_same_length_rewrite_changes_digest():
+    buffer = io.BytesIO(JPEG)
+    before = image_digest(buffer)
+    assert image_digest(buffer) == before
+    buffer.seek(10)
+    buffer.write(b"\x00\x01")
+    assert buffer.getbuffer().nbytes == len(JPEG)
+    assert image_digest(buffer) == image_digest(buffer.getvalue()) != before
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+
+from app.audit_store import COUNT_COLUMNS, TIMESTAMP_FORMAT, AuditStore
+
+NOW = datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AuditStore(tmp_path / "audits.db")
+
+
+def _audit(audit_id, mill="LIC-1", material="hessian", timestamp=NOW, total=10, status="PASS", **extra):
+    return {
+        "audit_id": audit_id,
+        "timestamp": timestamp,
+        "mill_license": mill,
+        "material_type": material,
+        "total_count": total,
+        "premium_count": total // 2,
+        "export_count": total - total // 2,
+        "local_count": 0,
+        "reject_count": 0,
+        "confidence": 0.8,
+        "stock_days": 5,
+        "compliance_status": status,
+        **extra,
+    }
+
+
+def _rollups_from_audits(store):
+    """Rollup rows recomputed from scratch, to compare with the incrementally kept ones."""
+    sums = ", ".join(f"SUM({c})" for c in COUNT_COLUMNS)
+    return store._conn().execute(
+        f"SELECT mill_license, material_type, month, COUNT(*), {sums}, SUM(confidence), SUM(stock_days), "
+        "SUM(compliance_status = 'PASS') FROM audits GROUP BY 1, 2, 3 ORDER BY 1, 2, 3"
+    ).fetchall()
+
+
+def _rollups(store):
+    cols = ", ".join(COUNT_COLUMNS)
+    return store._conn().execute(
+        f"SELECT mill_license, material_type, month, audits, {cols}, confidence_sum, stock_days_sum, pass_count "
+        "FROM audit_rollups WHERE audits != 0 ORDER BY 1, 2, 3"
+    ).fetchall()
+
+
+def _rows(rows):
+    return [tuple(pytest.approx(v) if isinstance(v, float) else v for v in r) for r in rows]
+
+
+def test_rollups_stay_consistent_after_replace(store):
+    store.save_audit(_audit("A1"))
+    store.save_audit(_audit("A2", total=20, status="FAIL"))
+    store.save_audit(_audit("A3", mill="LIC-2"))
+    # Replace: new counts, another mill and material, another month
+    store.save_audit(_audit("A1", total=4))
+    store.save_audit(_audit("A2", mill="LIC-2", material="sacking"))
+    store.save_audit(_audit("A3", timestamp="2020-01-15 09:00:00"))
+
+    assert _rows(_rollups(store)) == _rows(_rollups_from_audits(store))
+    assert store._conn().execute("SELECT COUNT(*) FROM audits").fetchone()[0] == 3
+
+
+def test_trend_reflects_replaced_audit(store):
+    store.save_audit(_audit("A1", total=10))
+    store.save_audit(_audit("A2", total=30, status="FAIL"))
+    store.save_audit(_audit("A1", total=20))
+
+    (month,) = store.trend("LIC-1")
+    assert month["audits"] == 2
+    assert month["total_count"] == 50
+    assert month["pass_rate"] == 0.5
+
+
+def test_replaced_audit_leaves_no_stale_month(store):
+    store.save_audit(_audit("A1", mill="LIC-9"))
+    store.save_audit(_audit("A1", mill="LIC-9", timestamp="2020-01-15 09:00:00"))
+    assert store.trend("LIC-9") == []
+    assert store.last_audit("LIC-9")["recorded_at"] < datetime(2021, 1, 1).timestamp()
@@ -0,0 +1,27 @@
+import numpy as np
+
+from app import detectors
+from app.detectors import GRADE_KEYS, SimulatedDetector, class_grade
+
+
+def test_simulator_classes_map_to_grades():
+    detector = SimulatedDetector()
+    assert [class_grade(c) for c in detector.classes] == list(GRADE_KEYS)
+    class_ids = np.array([0, 0, 1, 2, 3, 3, 3], dtype=np.int64)
+    det = detector._summarize(np.zeros((7, 4), np.float32), np.full(7, 0.9, np.float32), class_ids)
+    assert (det["total"], *(det[k] for k in GRADE_KEYS)) == (7, 2, 1, 1, 3)
+
+
+def test_class_names_are_normalized():
+    assert class_grade("Grade A") == class_grade("grade-a") == class_grade("grade_a") == "grade_a"
+    assert class_grade("Premium") == "grade_a"
+    assert class_grade("person") is None
+
+
+def test_backend_is_resolved_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(detectors, "_resolved", {})
+    monkeypatch.setattr(detectors, "get_settings", lambda: calls.append(1) or {"detector": "simulator"})
+    assert detectors.get_detector().name == "simulator"
+    assert detectors.get_detector().name == "simulator"
+    assert len(calls) == 1
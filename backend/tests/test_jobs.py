@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from app import jobs
+from app.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def _wait(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def _queue(root, handler, **kwargs) -> JobQueue:
+    queue = JobQueue(root, workers=1, **kwargs)
+    queue.register("work", handler)
+    return queue
+
+
+def _blocking(release):
+    def handler(payload, job_dir, progress):
+        release.wait(10)
+        return {"ok": True}
+    return handler
+
+
+def test_second_queue_does_not_requeue_a_live_job(tmp_path, release):
+    first = _queue(tmp_path, _blocking(release))
+    first.start()
+    job_id = first.submit("work")
+    assert _wait(lambda: first.get(job_id)["status"] == RUNNING)
+
+    second = _queue(tmp_path, lambda p, d, progress: {"ran": "twice"})
+    second.start()
+    try:
+        assert second.reclaim() == 0
+        assert second.get(job_id)["status"] == RUNNING
+        release.set()
+        assert _wait(lambda: first.get(job_id)["status"] == DONE)
+        assert first.get(job_id)["result"] == {"ok": True}
+        assert first.get(job_id)["attempts"] == 1
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_job_of_a_dead_owner_is_reclaimed(tmp_path, release, monkeypatch):
+    dead = _queue(tmp_path, _blocking(release))
+    job_id = dead.submit("work")
+    assert dead._claim()["id"] == job_id  # claimed, then the process "dies"
+
+    monkeypatch.setattr(jobs, "LEASE_S", 0.0)
+    survivor = _queue(tmp_path, lambda p, d, progress: {"ran": "here"})
+    survivor.start()
+    try:
+        assert _wait(lambda: survivor.get(job_id)["status"] == DONE)
+        assert survivor.get(job_id)["result"] == {"ran": "here"}
+        # The old owner's late writes no longer touch the job
+        dead._update(job_id, status=FAILED, error="stale")
+        assert survivor.get(job_id)["status"] == DONE
+    finally:
+        survivor.stop()
+
+
+def test_job_interrupted_on_every_attempt_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "LEASE_S", 0.0)
+    queue = _queue(tmp_path, lambda p, d, progress: {}, max_attempts=2)
+    job_id = queue.submit("work")
+    queue._claim()
+    assert queue.reclaim() == 1
+    assert queue.get(job_id)["status"] == QUEUED
+    queue._claim()
+    assert queue.reclaim() == 1
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == (FAILED, "Interrupted on every attempt")
@@ -0,0 +1,115 @@
+import http.client
+import importlib
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import outbox as outbox_module
+from app.blobs import BlobStore, blob_digest
+from app.outbox import Outbox
+
+IMAGE_A = b"\xff\xd8" + b"a" * 5000
+IMAGE_B = b"\xff\xd8" + b"b" * 7000
+
+
+@pytest.fixture
+def receiver(tmp_path, monkeypatch):
+    """The stand-in receiver, storing under tmp_path, reached through a TestClient."""
+    monkeypatch.setenv("JUTEVISION_RECEIVER_DIR", str(tmp_path / "receiver"))
+    module = importlib.import_module("app.sync_receiver")
+    monkeypatch.setattr(module, "blobs", BlobStore(tmp_path / "receiver" / "blobs"))
+    monkeypatch.setattr(module, "audits_dir", tmp_path / "receiver" / "audits")
+    module.audits_dir.mkdir(parents=True, exist_ok=True)
+    return module
+
+
+@pytest.fixture
+def transport(receiver, monkeypatch):
+    """Replace the outbox's HTTP client with one calling the receiver in-process; records requests."""
+    client = TestClient(receiver.app)
+    calls = []
+    fail_on = set()
+
+    class Client(outbox_module._Client):
+        def post(self, path, body, content_type):
+            calls.append((path, len(body)))
+            if len(calls) in fail_on:
+                raise OSError("connection dropped")
+            response = client.post(path, content=body, headers={"Content-Type": content_type})
+            if response.status_code >= 400:
+                raise OSError(f"Receiver returned {response.status_code} for {path}")
+            return response.content
+
+    monkeypatch.setattr(outbox_module, "_Client", Client)
+    return calls, fail_on
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(tmp_path / "outbox")
+
+
+def _audit(audit_id, *images, **extra):
+    return {"audit_id": audit_id, "mill_name": "Test Mill", "watermarked_images": [io.BytesIO(i) for i in images],
+            **extra}
+
+
+def test_sync_sends_shared_images_once(outbox, receiver, transport):
+    calls, _ = transport
+    outbox.enqueue(_audit("A1", IMAGE_A, IMAGE_B))
+    outbox.enqueue(_audit("A2", IMAGE_A))
+
+    stats = outbox.sync("http://receiver")
+    assert "error" not in stats
+    assert (stats["audits"], stats["blobs"], stats["pending"]) == (2, 2, 0)
+    assert [path for path, _ in calls] == ["/sync/have", "/sync/blobs", "/sync/audits"]
+    assert receiver.blobs.has(blob_digest(IMAGE_A)) and receiver.blobs.has(blob_digest(IMAGE_B))
+    assert sorted(p.stem for p in receiver.audits_dir.glob("*.json")) == ["A1", "A2"]
+    # Synced packages no longer keep their blobs locally
+    assert list(outbox.blobs.digests()) == []
+
+
+def test_interrupted_sync_resumes_without_resending(outbox, receiver, transport):
+    calls, fail_on = transport
+    outbox.enqueue(_audit("A1", IMAGE_A))
+    outbox.enqueue(_audit("A2", IMAGE_B))
+
+    # First batch (A1) goes through; the second batch's blob upload drops
+    fail_on.add(5)
+    stats = outbox.sync("http://receiver", batch_audits=1)
+    assert stats["error"] == "connection dropped"
+    assert (stats["audits"], stats["pending"]) == (1, 1)
+    assert outbox.pending()[0]["audit_id"] == "A2"
+    assert outbox.pending()[0]["attempts"] == 1
+
+    calls.clear()
+    fail_on.clear()
+    stats = outbox.sync("http://receiver", batch_audits=1)
+    assert "error" not in stats
+    assert (stats["audits"], stats["blobs"], stats["pending"]) == (1, 1, 0)
+    assert [path for path, _ in calls] == ["/sync/have", "/sync/blobs", "/sync/audits"]
+
+
+def test_synced_version_is_not_requeued(outbox, transport):
+    audit = _audit("A1", IMAGE_A)
+    assert outbox.enqueue(audit)
+    outbox.sync("http://receiver")
+    assert not outbox.enqueue(_audit("A1", IMAGE_A))
+    # A changed audit is queued again, and only its new image is sent
+    assert outbox.enqueue(_audit("A1", IMAGE_A, IMAGE_B, mill_name="Renamed Mill"))
+    stats = outbox.sync("http://receiver")
+    assert (stats["audits"], stats["blobs"], stats["pending"]) == (1, 1, 0)
+
+
+def test_connection_cut_mid_response_is_a_sync_error(outbox, monkeypatch):
+    class Response(io.BytesIO):
+        def read(self, *args):
+            raise http.client.IncompleteRead(b"{", 100)
+
+    monkeypatch.setattr(outbox_module.urllib.request, "urlopen", lambda request, timeout: Response())
+    outbox.enqueue(_audit("A1", IMAGE_A))
+    stats = outbox.sync("http://receiver")
+    assert "IncompleteRead" in stats["error"]
+    assert (stats["audits"], stats["pending"]) == (0, 1)
+    assert outbox.pending()[0]["attempts"] == 1
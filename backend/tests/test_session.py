@@ -0,0 +1,41 @@
+import pytest
+
+from app.session import KG_RATE_PER_S, SessionRegistry
+
+
+def _feed(registry, camera_id, seqs, weight_kg=100.0, fps=10.0):
+    for seq in seqs:
+        registry.observe(camera_id, seq, seq / fps, weight_kg, "cam0")
+
+
+def test_accumulates_after_switching_to_camera_with_lower_seq():
+    registry = SessionRegistry()
+    session = registry.get()
+    session.set_status("scanning", reset_total=True)
+    _feed(registry, "cam0", range(1, 500))
+    assert session.total_kg > 0
+
+    session.set_camera("cam1")
+    session.set_status("scanning", reset_total=True)
+    _feed(registry, "cam1", range(1, 100))
+    # 98 frame intervals of 0.1 s on the new camera
+    assert session.total_kg == pytest.approx(100.0 * KG_RATE_PER_S * 9.8)
+
+
+def test_other_cameras_frames_are_ignored():
+    registry = SessionRegistry()
+    session = registry.get()
+    session.set_camera("cam1")
+    session.set_status("scanning", reset_total=True)
+    _feed(registry, "cam0", range(1, 100))
+    assert session.total_kg == 0.0
+
+
+def test_repeated_frames_count_once():
+    registry = SessionRegistry()
+    session = registry.get()
+    session.set_status("scanning", reset_total=True)
+    _feed(registry, "cam0", range(1, 11))
+    total = session.total_kg
+    _feed(registry, "cam0", range(1, 11))
+    assert session.total_kg == total
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.uploads import ChecksumMismatch, OffsetMismatch, UploadNotFound, UploadStore
+
+DATA = bytes(range(256)) * 40
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(tmp_path / "uploads")
+
+
+async def _stream(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+def _put(store, upload_id, offset, *pieces) -> int:
+    return asyncio.run(store.write_chunk(upload_id, offset, _stream(*pieces)))
+
+
+def test_chunks_resume_and_finalize(store):
+    upload_id = store.create(len(DATA), SHA256)["upload_id"]
+    assert _put(store, upload_id, 0, DATA[:1000], DATA[1000:3000]) == 3000
+    # A retried chunk overlapping received bytes is fine
+    assert _put(store, upload_id, 2000, DATA[2000:5000]) == 5000
+    assert store.status(upload_id)["received"] == 5000
+    assert _put(store, upload_id, 5000, DATA[5000:]) == len(DATA)
+
+    path, meta = store.finalize(upload_id)
+    assert path.read_bytes() == DATA
+    assert meta["sha256"] == SHA256
+    store.discard(upload_id)
+    with pytest.raises(UploadNotFound):
+        store.status(upload_id)
+
+
+def test_gap_is_refused_with_resume_offset(store):
+    # The API answers OffsetMismatch with 409 and {"received": ...}
+    upload_id = store.create(len(DATA), SHA256)["upload_id"]
+    _put(store, upload_id, 0, DATA[:1000])
+    with pytest.raises(OffsetMismatch) as e:
+        _put(store, upload_id, 2000, DATA[2000:3000])
+    assert e.value.received == 1000
+    assert store.status(upload_id)["received"] == 1000
+
+
+def test_overrun_is_refused(store):
+    upload_id = store.create(len(DATA), SHA256)["upload_id"]
+    with pytest.raises(OffsetMismatch) as e:
+        _put(store, upload_id, 0, DATA, b"extra")
+    assert e.value.received == len(DATA)
+
+
+def test_incomplete_upload_cannot_finalize(store):
+    upload_id = store.create(len(DATA), SHA256)["upload_id"]
+    _put(store, upload_id, 0, DATA[:100])
+    with pytest.raises(OffsetMismatch) as e:
+        store.finalize(upload_id)
+    assert e.value.received == 100
+
+
+def test_sha256_is_required_and_checked(store):
+    for bad in ("", "abc", "g" * 64):
+        with pytest.raises(ValueError):
+            store.create(len(DATA), bad)
+    upload_id = store.create(len(DATA), "0" * 64)["upload_id"]
+    _put(store, upload_id, 0, DATA)
+    with pytest.raises(ChecksumMismatch):
+        store.finalize(upload_id)
+    # The corrupt spool is emptied so the client starts over
+    assert store.status(upload_id)["received"] == 0
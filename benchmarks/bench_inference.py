@@ -0,0 +1,19 @@
+"""Per-image latency of camera.process_uploaded_image (decode, detect, annotate, encode)."""
+import time
+
+from benchmarks.common import load_images, summarize
+
+
+def run(quick: bool = False) -> dict:
+    from app.camera import detector, process_uploaded_image
+
+    images = load_images()
+    for data in images[:2]:
+        process_uploaded_image(data)
+    samples = []
+    for _ in range(1 if quick else 5):
+        for data in images:
+            started = time.perf_counter()
+            process_uploaded_image(data)
+            samples.append(time.perf_counter() - started)
+    return {"detector": detector.info["name"], "images": len(images), "latency": summarize(samples)}
@@ -0,0 +1,23 @@
+"""Time and peak traced memory of the government PDF and the export package."""
+from benchmarks.common import load_images, measure, sample_audit
+
+IMAGE_COUNTS = (1, 10, 50)
+
+
+def run(quick: bool = False) -> dict:
+    from app.reports import create_complete_export_package, generate_government_pdf
+
+    results = {}
+    for n in IMAGE_COUNTS:
+        images = load_images(n)
+        pdf, pdf_s, pdf_peak = measure(generate_government_pdf, sample_audit(images))
+        package, pkg_s, pkg_peak = measure(create_complete_export_package, sample_audit(images))
+        results[f"images_{n}"] = {
+            "pdf_ms": round(pdf_s * 1e3, 2),
+            "pdf_peak_mb": round(pdf_peak / 2**20, 2),
+            "pdf_bytes": pdf.getbuffer().nbytes,
+            "package_ms": round(pkg_s * 1e3, 2),
+            "package_peak_mb": round(pkg_peak / 2**20, 2),
+            "package_bytes": package.getbuffer().nbytes,
+        }
+    return results
@@ -0,0 +1,20 @@
+"""Cold start: a fresh interpreter importing backend app.main (detector load included)."""
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BACKEND_DIR, summarize
+
+_PROBE = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def run(quick: bool = False) -> dict:
+    imports, walls = [], []
+    for _ in range(1 if quick else 5):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+        walls.append(time.perf_counter() - started)
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+    return {"import_app_main": summarize(imports), "process_wall": summarize(walls)}
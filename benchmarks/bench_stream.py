@@ -0,0 +1,52 @@
+"""MJPEG stream FPS of camera.generate_frames against a video-file camera."""
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import make_video
+
+
+def _stream_fps(camera_id: str, seconds: float) -> dict:
+    from app.camera import cameras, generate_frames
+
+    stream = generate_frames(camera_id)
+    next(stream)  # first part: camera opened and producing
+    frames, sent = 0, 0
+    started = time.perf_counter()
+    for chunk in stream:
+        sent += len(chunk)
+        if isinstance(chunk, bytes) and chunk.startswith(b"--frame"):
+            frames += 1
+        if time.perf_counter() - started >= seconds:
+            break
+    elapsed = time.perf_counter() - started
+    stream.close()
+    worker = cameras.workers[camera_id]
+    return {
+        "fps": round(frames / elapsed, 2),
+        "mbit_per_s": round(sent * 8 / elapsed / 1e6, 2),
+        "frames_dropped": worker.frames_dropped,
+    }
+
+
+def run(quick: bool = False) -> dict:
+    from app.camera import cameras, detection_loop, release_camera
+
+    seconds = 3.0 if quick else 10.0
+    with tempfile.TemporaryDirectory() as tmp:
+        # 30 fps is replayed in real time (like a camera); 1000 fps is effectively unthrottled
+        cameras.configure({
+            "realtime": str(make_video(Path(tmp) / "realtime.avi", fps=30.0)),
+            "unthrottled": str(make_video(Path(tmp) / "unthrottled.avi", fps=1000.0)),
+        })
+        detection_loop.wanted = lambda: True
+        detection_loop.start()
+        try:
+            return {
+                "source_720p_30fps": _stream_fps("realtime", seconds),
+                "source_720p_unthrottled": _stream_fps("unthrottled", seconds),
+                "frames_inferred": dict(detection_loop.inferred),
+            }
+        finally:
+            detection_loop.stop()
+            release_camera()
@@ -0,0 +1,50 @@
+"""/api/upload throughput at several client concurrencies (in-process ASGI, no network)."""
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import load_images, summarize
+
+CONCURRENCY = (1, 4, 16)
+
+
+async def _level(client: httpx.AsyncClient, images: list[bytes], clients: int, total: int) -> dict:
+    latencies: list[float] = []
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for i in counter:
+            data = images[i % len(images)]
+            started = time.perf_counter()
+            r = await client.post("/api/upload", files={"file": ("bench.jpg", data, "image/jpeg")})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {"requests": total, "req_per_s": round(total / elapsed, 2), "latency": summarize(latencies)}
+
+
+async def _run(quick: bool) -> dict:
+    from app.main import app, inference_pool
+
+    images = load_images()
+    if inference_pool is not None:
+        inference_pool.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await _level(client, images, 1, 2)  # warm-up
+            return {
+                f"clients_{n}": await _level(client, images, n, max(16, n * 2) if quick else max(48, n * 4))
+                for n in CONCURRENCY
+            } | {"inference_workers": inference_pool.workers if inference_pool else 0}
+    finally:
+        if inference_pool is not None:
+            inference_pool.stop()
+
+
+def run(quick: bool = False) -> dict:
+    return asyncio.run(_run(quick))
@@ -0,0 +1,90 @@
+"""Shared helpers for the benchmark suite (paths, inputs, timing)."""
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+DATA_DIR = ROOT / "jute_training_data"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def load_images(n: int | None = None) -> list[bytes]:
+    """JPEG bytes from jute_training_data/, cycled to ``n`` images if given."""
+    paths = sorted(DATA_DIR.glob("*.jpg"))
+    if not paths:
+        raise SystemExit(f"No images found in {DATA_DIR}")
+    images = [p.read_bytes() for p in paths]
+    if n is None:
+        return images
+    return [images[i % len(images)] for i in range(n)]
+
+
+def make_video(path: Path, fps: float = 30.0, size: tuple[int, int] = (1280, 720), repeat: int = 8) -> Path:
+    """Write the training images as an MJPG video file to use as a camera source."""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    frames = [cv2.resize(cv2.imread(str(p)), size) for p in sorted(DATA_DIR.glob("*.jpg"))]
+    for _ in range(repeat):
+        for frame in frames:
+            writer.write(frame)
+    writer.release()
+    return path
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1e3, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1e3, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3, 3),
+        "max_ms": round(ordered[-1] * 1e3, 3),
+    }
+
+
+def measure(fn, *args, **kwargs) -> tuple[object, float, int]:
+    """Run ``fn`` once; return (result, seconds, peak traced bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def sample_audit(images: list[bytes]) -> dict:
+    """A completed audit with ``images`` as its watermarked evidence photos."""
+    from app.audit_hash import AuditDict
+
+    return AuditDict({
+        "audit_id": "AUDIT-20260101-100000-BEN",
+        "inspector": "Benchmark Inspector",
+        "timestamp": "2026-01-01 10:00:00",
+        "mill_name": "Benchmark Jute Mill",
+        "mill_license": "BM-0001",
+        "gps": {"address": "Kolkata, West Bengal"},
+        "material_type": "bales",
+        "total_count": 420,
+        "premium_count": 120,
+        "export_count": 150,
+        "local_count": 100,
+        "reject_count": 50,
+        "confidence": 0.91,
+        "grade": "B",
+        "stock_days": 42.0,
+        "compliance_status": "PASS",
+        "inspector_notes": "Benchmark run.",
+        "watermarked_images": [io.BytesIO(data) for data in images],
+    })
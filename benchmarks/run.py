@@ -0,0 +1,103 @@
+"""Run the JuteVision benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run                       # everything, results/<time>-<commit>.json
+    python -m benchmarks.run --only inference,stream --quick
+    python -m benchmarks.run --baseline benchmarks/results/<earlier>.json
+
+Runs offline against jute_training_data/ with whatever detector the
+settings select; the detector name is recorded so runs stay comparable.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import RESULTS_DIR, ROOT
+
+SUITES = ("startup", "inference", "stream", "upload", "reports")
+# Relative change that --baseline reports as a regression/improvement
+THRESHOLD = 0.10
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _environment() -> dict:
+    from app.detectors import get_detector
+
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "detector": get_detector().info,
+    }
+
+
+def _flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """Lines for metrics that moved more than THRESHOLD between two result files."""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] and abs(new[name] - old[name]) / abs(old[name]) > THRESHOLD:
+            lines.append(f"{name}: {old[name]} -> {new[name]} ({(new[name] - old[name]) / abs(old[name]):+.0%})")
+    return lines
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions (smoke run)")
+    parser.add_argument("--out", type=Path, help="output JSON path")
+    parser.add_argument("--baseline", type=Path, help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    suites = args.only.split(",") if args.only else list(SUITES)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    report = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": args.quick,
+              "environment": _environment(), "results": {}}
+    for name in suites:
+        print(f"[{name}] running...", file=sys.stderr)
+        started = time.perf_counter()
+        report["results"][name] = importlib.import_module(f"benchmarks.bench_{name}").run(quick=args.quick)
+        print(f"[{name}] done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['environment']['commit'][:7] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report["results"], indent=2))
+    print(f"Wrote {out}", file=sys.stderr)
+
+    if args.baseline:
+        changes = compare(json.loads(args.baseline.read_text()), report)
+        print(f"\nChanges vs {args.baseline} (>{THRESHOLD:.0%}):")
+        print("\n".join(changes) if changes else "  none")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+// Write .br and .gz siblings of the text assets in dist/ (run after `vite build`).
+// The backend sends them to browsers that accept the encoding.
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { extname, join } from 'node:path'
+
+const DIST = new URL('../dist/', import.meta.url).pathname
+const EXTENSIONS = new Set(['.js', '.css', '.html', '.svg', '.json', '.txt', '.map', '.webmanifest'])
+const MIN_BYTES = 1024
+
+const walk = (dir) => readdirSync(dir).flatMap((name) => {
+  const path = join(dir, name)
+  return statSync(path).isDirectory() ? walk(path) : [path]
+})
+
+let written = 0
+for (const path of walk(DIST)) {
+  if (!EXTENSIONS.has(extname(path))) continue
+  const data = readFileSync(path)
+  if (data.length < MIN_BYTES) continue
+  const variants = {
+    '.br': brotliCompressSync(data, {
+      params: { [constants.BROTLI_PARAM_QUALITY]: 11, [constants.BROTLI_PARAM_SIZE_HINT]: data.length },
+    }),
+    '.gz': gzipSync(data, { level: 9 }),
+  }
+  for (const [suffix, compressed] of Object.entries(variants)) {
+    // Not worth a second request path if it barely shrinks
+    if (compressed.length < data.length * 0.9) {
+      writeFileSync(path + suffix, compressed)
+      written++
+    }
+  }
+}
+console.log(`compress: wrote ${written} precompressed files in ${DIST}`)
@@ -2,11 +2,15 @@ import { useState, useEffect, useCallback, useRef } from 'react'
 import Login from './pages/Login'
 import Dashboard from './pages/Dashboard'
 import AuditResults from './pages/AuditResults'
+import { sha256Hex as sha256HexFallback } from './sha256'
 
 const API = ''
 const VIDEO_URL = typeof window !== 'undefined' && window.location.port === '5173'
   ? 'http://localhost:8000/video_feed'
   : '/video_feed'
+const METRICS_WS_URL = typeof window !== 'undefined'
+  ? `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}/ws/metrics`
+  : ''
 
 // --- Confirm Modal ---
 function ConfirmModal({ show, title, message, confirmLabel, onConfirm, onCancel, danger }) {
@@ -240,11 +244,39 @@ function ScanView({ metrics, settings, onMetricsUpdate, onBack, onViewResults })
     } catch (e) {}
   }, [])
 
+  // Server pushes metrics over WebSocket; fall back to polling while it is unavailable
   useEffect(() => {
-    fetchMetrics()
-    const id = setInterval(fetchMetrics, 1500)
-    return () => clearInterval(id)
-  }, [fetchMetrics])
+    let ws = null
+    let pollId = null
+    let retryId = null
+    let closed = false
+
+    const startPolling = () => {
+      if (pollId) return
+      fetchMetrics()
+      pollId = setInterval(fetchMetrics, 1500)
+    }
+    const stopPolling = () => { clearInterval(pollId); pollId = null }
+
+    const connect = () => {
+      try { ws = new WebSocket(METRICS_WS_URL) } catch (e) { startPolling(); return }
+      ws.onopen = stopPolling
+      ws.onmessage = (ev) => { try { onMetricsUpdate(JSON.parse(ev.data)) } catch (e) {} }
+      ws.onclose = () => {
+        if (closed) return
+        startPolling()
+        retryId = setTimeout(connect, 5000)
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      stopPolling()
+      clearTimeout(retryId)
+      if (ws) ws.close()
+    }
+  }, [fetchMetrics, onMetricsUpdate])
 
   useEffect(() => { if (toast) setTimeout(() => setToast(''), 2500) }, [toast])
 
@@ -295,18 +327,101 @@ function ScanView({ metrics, settings, onMetricsUpdate, onBack, onViewResults })
     if (!file) return
     setLoading('upload')
     try {
+      const upload = await downscaleImage(file, settings.upload_max_side)
       const fd = new FormData()
-      fd.append('file', file)
+      fd.append('size', String(upload.size))
+      fd.append('filename', upload.name)
+      fd.append('content_type', upload.type)
+      fd.append('sha256', await sha256Hex(upload))
       fd.append('save', 'true')
       if (settings.file_pin_enabled) fd.append('file_pin', prompt('Enter File PIN:') || '')
-      const res = await fetch(`${API}/api/upload`, { method: 'POST', body: fd })
-      const data = await res.json()
-      if (res.ok) setShowUploadResult(data)
-      else setToast(data.detail || 'Upload failed')
+      const data = await uploadResumable(upload, fd)
+      if (data.error) { setToast(data.error); return }
+      const job = await waitForJob(data.job_id)
+      if (job.status === 'done') setShowUploadResult({ ...job.result, annotated_url: `${API}/api/jobs/${job.id}/files/annotated.jpg` })
+      else setToast(job.id ? 'Analysis failed' : job.error)  // no id: gave up polling
     } catch (e) { setToast('Failed') }
     finally { setLoading(null); e.target.value = '' }
   }
 
+  // Shrink photos larger than the server's working size before sending them (the
+  // server would downscale anyway); keeps the original if the browser can't decode it
+  const downscaleImage = async (file, maxSide) => {
+    if (!maxSide || !window.createImageBitmap) return file
+    try {
+      const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' })
+      const scale = maxSide / Math.max(bitmap.width, bitmap.height)
+      if (scale >= 1) { bitmap.close(); return file }
+      const canvas = document.createElement('canvas')
+      canvas.width = Math.round(bitmap.width * scale)
+      canvas.height = Math.round(bitmap.height * scale)
+      canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height)
+      bitmap.close()
+      const blob = await new Promise(r => canvas.toBlob(r, 'image/jpeg', 0.9))
+      if (!blob || blob.size >= file.size) return file
+      return new File([blob], file.name.replace(/\.[^.]*$/, '') + '.jpg', { type: 'image/jpeg' })
+    } catch (e) { return file }
+  }
+
+  // SHA-256 for the server to verify on finalize; WebCrypto where available, the
+  // plain-JS fallback otherwise (e.g. plain-HTTP LAN, where crypto.subtle is missing)
+  const sha256Hex = async (file) => {
+    const buffer = await file.arrayBuffer()
+    if (!window.crypto?.subtle) return sha256HexFallback(buffer)
+    const digest = await crypto.subtle.digest('SHA-256', buffer)
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('')
+  }
+
+  // Chunked upload (init -> PUT chunks -> finalize); after a failed chunk, asks the
+  // server how much arrived and resumes from there. Returns { job_id } or { error }.
+  const uploadResumable = async (file, initForm, maxRetries = 8) => {
+    const res = await fetch(`${API}/api/uploads`, { method: 'POST', body: initForm })
+    const init = await res.json()
+    if (!res.ok) return { error: init.detail || 'Upload failed' }
+    const url = `${API}/api/uploads/${init.upload_id}`
+    let offset = init.received
+    let failures = 0
+    while (offset < file.size) {
+      try {
+        const chunk = await fetch(`${url}?offset=${offset}`, { method: 'PUT', body: file.slice(offset, offset + init.chunk_size) })
+        const body = await chunk.json()
+        if (chunk.ok || chunk.status === 409) { offset = body.received; failures = 0; continue }
+        return { error: body.detail || 'Upload failed' }
+      } catch (e) {
+        if (++failures > maxRetries) return { error: 'Upload interrupted' }
+        await new Promise(r => setTimeout(r, Math.min(500 * 2 ** failures, 8000)))
+        try {
+          const status = await fetch(url)
+          if (status.ok) offset = (await status.json()).received
+        } catch (e) {}
+      }
+    }
+    const done = await fetch(`${url}/finalize`, { method: 'POST' })
+    const data = await done.json()
+    return done.ok ? data : { error: data.detail || 'Upload failed' }
+  }
+
+  // Poll a background job; tolerates dropped requests so a flaky link only delays the
+  // result, but gives up on an unknown job, a long outage or the overall deadline
+  const waitForJob = async (jobId, timeoutMs = 10 * 60 * 1000, maxErrors = 30) => {
+    const deadline = Date.now() + timeoutMs
+    let errors = 0
+    while (Date.now() < deadline) {
+      await new Promise(r => setTimeout(r, 1000))
+      try {
+        const res = await fetch(`${API}/api/jobs/${jobId}`)
+        if (res.status === 404) return { status: 'failed', error: 'Job not found' }
+        if (!res.ok) throw new Error(`HTTP ${res.status}`)
+        errors = 0
+        const job = await res.json()
+        if (job.status === 'done' || job.status === 'failed') return job
+      } catch (e) {
+        if (++errors >= maxErrors) return { status: 'failed', error: 'Lost connection to the server' }
+      }
+    }
+    return { status: 'failed', error: 'Timed out waiting for analysis' }
+  }
+
   const statusLabel = { idle: 'Idle', scanning: 'Scanning', analyzing: 'Analyzing', complete: 'Complete', error: 'Error' }[metrics.audit_status] || metrics.audit_status
   const isScanning = metrics.audit_status === 'scanning' || metrics.audit_status === 'analyzing'
 
@@ -435,7 +550,7 @@ function ScanView({ metrics, settings, onMetricsUpdate, onBack, onViewResults })
         <div className="fixed inset-0 z-50 flex items-center justify-center p-4 bg-black/70" onClick={() => setShowUploadResult(null)}>
           <div className="max-w-md w-full rounded-[15px] border border-gray-700 bg-gray-900 p-6 shadow-xl" onClick={e => e.stopPropagation()}>
             <h3 className="text-lg font-semibold text-white mb-4">Upload Result</h3>
-            {showUploadResult.annotated_base64 && <img src={`data:image/jpeg;base64,${showUploadResult.annotated_base64}`} alt="Result" className="w-full rounded-[12px] mb-4" />}
+            {showUploadResult.annotated_url && <img src={showUploadResult.annotated_url} alt="Result" className="w-full rounded-[12px] mb-4" />}
             <p className="text-sm text-gray-400">{showUploadResult.metrics?.weight_kg} kg · {showUploadResult.metrics?.detection_count} detections</p>
             {showUploadResult.saved_as && <p className="text-xs text-emerald mt-1">Saved as {showUploadResult.saved_as}</p>}
             <button onClick={() => setShowUploadResult(null)} className="mt-4 w-full py-2 rounded-[12px] bg-emerald/20 text-emerald font-medium">Close</button>
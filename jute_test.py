@@ -10,29 +10,25 @@ from datetime import datetime
 import json
 import os
 import io
-import hashlib
-import zipfile
+import sys
 from pathlib import Path
 from PIL import Image, ImageDraw
 import cv2
 import base64
 import streamlit.components.v1 as components
 
-# Report generation
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+# Shared JuteVision modules live in backend/app
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from app.aggregation import summarize_detections
+from app.audit_hash import AuditDict
+from app.audit_store import get_audit_store
+from app.detectors import get_detector
+from app.drafts import get_draft_store
+from app.jobs import JobQueue
+from app.outbox import get_outbox, sync_from_settings
+from app.reports import create_complete_export_package, generate_audit_hash, generate_gfr_format, generate_government_pdf
 
 # Optional imports
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
-
 try:
     from docx import Document
     DOCX_AVAILABLE = True
@@ -85,12 +81,13 @@ def initialize_session_state():
             "address": "",
             "contact": ""
         },
-        "saved_drafts": {},
-        "offline_queue": [],
         "offline_mode": False,
         "model_loaded": False,
         "model": None,
-        "qr_scan_result": None
+        "qr_scan_result": None,
+        "analysis_job": None,
+        "export_jobs": {},
+        "report_pdfs": {}
     }
     
     for key, value in defaults.items():
@@ -134,7 +131,7 @@ st.markdown(get_theme_css(), unsafe_allow_html=True)
 # DATA STRUCTURES
 # ============================================
 def create_new_audit(inspector_name):
-    return {
+    return AuditDict({
         "audit_id": f"AUDIT-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{inspector_name[:3].upper()}",
         "inspector": inspector_name,
         "timestamp": None,
@@ -164,23 +161,7 @@ def create_new_audit(inspector_name):
         "flags": [],
         "inspector_notes": "",
         "inspector_verified": False
-    }
-
-# ============================================
-# YOLO MODEL
-# ============================================
-@st.cache_resource
-def load_yolo_model():
-    if not YOLO_AVAILABLE:
-        return None
-    model_path = Path("models/jute_vision_yolov11.pt")
-    if model_path.exists():
-        try:
-            model = YOLO(str(model_path))
-            return model
-        except:
-            return None
-    return None
+    })
 
 # ============================================
 # IMAGE PROCESSING
@@ -230,266 +211,47 @@ def add_watermark_to_image(image, audit_data, is_processed=False, for_result=Fal
     img = Image.alpha_composite(img, watermark)
     return img.convert('RGB')
 
-def simulate_yolo_detection(image, material_type):
-    img_array = np.array(image)
-    seed = int(np.sum(img_array[:100, :100]) % 10000)
-    np.random.seed(seed)
-    
-    if material_type == "sacks":
-        total = np.random.randint(25, 75)
-        grade_a = int(total * 0.30)
-        grade_b = int(total * 0.40)
-        grade_c = int(total * 0.20)
-        grade_d = total - grade_a - grade_b - grade_c
-    elif material_type == "fiber":
-        total = np.random.randint(60, 180)
-        grade_a = int(total * 0.25)
-        grade_b = int(total * 0.35)
-        grade_c = int(total * 0.25)
-        grade_d = total - grade_a - grade_b - grade_c
-    elif material_type == "sliver":
-        total = np.random.randint(80, 200)
-        grade_a = int(total * 0.20)
-        grade_b = int(total * 0.40)
-        grade_c = int(total * 0.30)
-        grade_d = total - grade_a - grade_b - grade_c
-    elif material_type == "yarns":
-        total = np.random.randint(100, 300)
-        grade_a = int(total * 0.25)
-        grade_b = int(total * 0.35)
-        grade_c = int(total * 0.30)
-        grade_d = total - grade_a - grade_b - grade_c
-    elif material_type == "bales":
-        total = np.random.randint(40, 120)
-        grade_a = int(total * 0.15)
-        grade_b = int(total * 0.35)
-        grade_c = int(total * 0.35)
-        grade_d = total - grade_a - grade_b - grade_c
-    else:  # rolls
-        total = np.random.randint(120, 350)
-        grade_a = int(total * 0.20)
-        grade_b = int(total * 0.30)
-        grade_c = int(total * 0.35)
-        grade_d = total - grade_a - grade_b - grade_c
-    
-    confidence = np.random.uniform(0.87, 0.97)
-    
-    return {
-        "total": total,
-        "grade_a": grade_a,
-        "grade_b": grade_b,
-        "grade_c": grade_c,
-        "grade_d": grade_d,
-        "confidence": confidence
-    }
-
 # ============================================
-# REPORT GENERATION
+# BACKGROUND JOBS
 # ============================================
-def generate_government_pdf(audit_data):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=22, textColor=colors.HexColor('#1e40af'), spaceAfter=30, alignment=1)
-    
-    elements.append(Paragraph("JuteVision Auditor", title_style))
-    elements.append(Paragraph("Ministry of Textiles, Government of India", styles['Heading2']))
-    elements.append(Paragraph("Official Audit Report", styles['Heading3']))
-    elements.append(Spacer(1, 20))
-    
-    # Audit Info
-    elements.append(Paragraph("Audit Information", styles['Heading3']))
-    
-    gps_data = audit_data.get('gps') or {}
-    
-    info_data = [
-        ['Audit ID', audit_data['audit_id']],
-        ['Inspector', audit_data['inspector']],
-        ['Date/Time', audit_data.get('timestamp', 'N/A')],
-        ['Mill Name', audit_data.get('mill_name', 'N/A')],
-        ['Mill License', audit_data.get('mill_license', 'N/A')],
-        ['Location', gps_data.get('address', 'N/A')],
-    ]
-    
-    info_table = Table(info_data, colWidths=[150, 300])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#dbeafe')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 20))
-    
-    # Material Analysis
-    elements.append(Paragraph("Material Quality Analysis", styles['Heading3']))
-    
-    analysis_data = [
-        ['Parameter', 'Value', 'Classification'],
-        ['Material Type', (audit_data.get('material_type') or 'N/A').upper(), 'Visual/AI'],
-        ['Total Count', str(audit_data.get('total_count', 0)), 'Units'],
-        ['Grade A (Premium)', str(audit_data.get('premium_count', 0)), 'Top Quality'],
-        ['Grade B (Export)', str(audit_data.get('export_count', 0)), 'Export Standard'],
-        ['Grade C (Local)', str(audit_data.get('local_count', 0)), 'Domestic Use'],
-        ['Grade D (Reject)', str(audit_data.get('reject_count', 0)), 'Below Standard'],
-        ['AI Confidence', f"{audit_data.get('confidence', 0)*100:.1f}%", 'Detection Accuracy'],
-        ['Overall Grade', audit_data.get('grade', 'N/A'), 'Quality Rating'],
-    ]
-    
-    analysis_table = Table(analysis_data, colWidths=[150, 150, 150])
-    analysis_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#1e40af')),
-    ]))
-    elements.append(analysis_table)
-    elements.append(Spacer(1, 20))
-    
-    # Compliance
-    compliance = audit_data.get('compliance_status', 'PENDING')
-    stock_days = audit_data.get('stock_days', 0)
-    
-    if compliance == 'PASS':
-        comp_text = f"COMPLIANT - {stock_days} Days Stock Available (Required: 30+ days)"
-        comp_color = colors.green
-    else:
-        comp_text = f"NON-COMPLIANT - {stock_days} Days Stock (Required: 30+ days)"
-        comp_color = colors.red
-    
-    elements.append(Paragraph(f"Compliance Status: {comp_text}", 
-                             ParagraphStyle('Compliance', parent=styles['Heading2'], textColor=comp_color)))
-    elements.append(Spacer(1, 20))
-    
-    # Notes
-    elements.append(Paragraph("Inspector Notes", styles['Heading3']))
-    elements.append(Paragraph(audit_data.get('inspector_notes', 'No notes provided'), styles['Normal']))
-    elements.append(Spacer(1, 20))
-    
-    # Verification
-    elements.append(Paragraph("Document Verification", styles['Heading3']))
-    hash_value = generate_audit_hash(audit_data)
-    elements.append(Paragraph(f"SHA-256 Hash: {hash_value}", 
-                             ParagraphStyle('Hash', parent=styles['Normal'], fontName='Courier', fontSize=9)))
-    elements.append(Paragraph("This document is digitally signed and tamper-proof.", styles['Italic']))
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
-def generate_gfr_format(audit_data):
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(200, 750, "FORM GFR 19-A")
-    c.setFont("Helvetica", 10)
-    c.drawString(250, 735, "[See Rule 212(1)]")
-    
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(150, 700, "STOCK REGISTER FOR JUTE COMMODITIES")
-    c.line(50, 690, 550, 690)
-    
-    y = 650
-    c.setFont("Helvetica-Bold", 11)
-    
-    fields = [
-        ("Audit ID:", audit_data['audit_id']),
-        ("Date:", audit_data.get('timestamp', '_________________')),
-        ("Inspector:", audit_data['inspector']),
-        ("Mill Name:", audit_data.get('mill_name', '_________________')),
-        ("License No:", audit_data.get('mill_license', '_________________')),
-        ("Material Type:", (audit_data.get('material_type') or '_________________').upper()),
-        ("Total Quantity:", str(audit_data.get('total_count', '_________________'))),
-        ("Grade A (Premium):", str(audit_data.get('premium_count', '_________________'))),
-        ("Grade B (Export):", str(audit_data.get('export_count', '_________________'))),
-        ("Grade C (Local):", str(audit_data.get('local_count', '_________________'))),
-        ("Grade D (Reject):", str(audit_data.get('reject_count', '_________________'))),
-    ]
-    
-    for label, value in fields:
-        c.drawString(50, y, label)
-        c.drawString(200, y, str(value))
-        y -= 25
-    
-    y -= 30
-    c.setFont("Helvetica", 11)
-    c.drawString(50, y, "Certified that the above stock has been physically verified and found correct.")
-    
-    y -= 80
-    c.line(350, y, 550, y)
-    c.drawString(350, y-15, "Signature of Inspecting Officer")
-    c.drawString(350, y-30, f"({audit_data['inspector']})")
-    
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def create_complete_export_package(audit_data):
-    buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        pdf = generate_government_pdf(audit_data)
-        zf.writestr(f"{audit_data['audit_id']}_GOVT_REPORT.pdf", pdf.getvalue())
-        
-        gfr = generate_gfr_format(audit_data)
-        zf.writestr(f"{audit_data['audit_id']}_GFR19A.pdf", gfr.getvalue())
-        
-        json_data = json.dumps(audit_data, indent=2, default=str)
-        zf.writestr(f"{audit_data['audit_id']}_DATA.json", json_data)
-        
-        csv_content = "Field,Value\n"
-        for key, value in audit_data.items():
-            if key not in ['watermarked_images', 'original_images', 'processed_images']:
-                if isinstance(value, (list, dict)):
-                    csv_content += f"{key},\"{str(value)}\"\n"
-                else:
-                    csv_content += f"{key},{value}\n"
-        zf.writestr(f"{audit_data['audit_id']}_DATA.csv", csv_content)
-        
-        for idx, img_buf in enumerate(audit_data.get('watermarked_images', [])):
-            if img_buf:
-                img_buf.seek(0)
-                zf.writestr(f"{audit_data['audit_id']}_IMAGE_{idx+1}.jpg", img_buf.getvalue())
-        
-        summary = f"""
-JUTEVISION AUDITOR - AUDIT SUMMARY
-==================================
-Audit ID: {audit_data['audit_id']}
-Inspector: {audit_data['inspector']}
-Date: {audit_data.get('timestamp', 'N/A')}
-
-MATERIAL: {audit_data.get('material_type', 'N/A').upper()}
-TOTAL COUNT: {audit_data.get('total_count', 0)}
-GRADE DISTRIBUTION:
-  - Grade A (Premium): {audit_data.get('premium_count', 0)}
-  - Grade B (Export): {audit_data.get('export_count', 0)}
-  - Grade C (Local): {audit_data.get('local_count', 0)}
-  - Grade D (Reject): {audit_data.get('reject_count', 0)}
+IMAGE_KEYS = ['original_images', 'processed_images', 'watermarked_images']
 
-COMPLIANCE: {audit_data.get('compliance_status', 'N/A')}
-STOCK DAYS: {audit_data.get('stock_days', 0)}
+def analysis_job(payload, job_dir, progress):
+    inputs = sorted(job_dir.glob("input_*"))
+    images = [p.read_bytes() for p in inputs]
+    # Shared per-process registry: jute model when present, else the stand-in detector
+    results = get_detector().detect(images, payload['material_type'])
+    files = []
+    for idx, (img_bytes, result) in enumerate(zip(images, results)):
+        image = Image.open(io.BytesIO(img_bytes)).convert('RGB')
+        # Result photos use for_result=True (no ministry text)
+        watermarked = add_watermark_to_image(image, payload['watermark'], is_processed=True, for_result=True)
+        name = f"watermarked_{idx:03d}.jpg"
+        watermarked.save(job_dir / name, format='JPEG', quality=95)
+        files.append(name)
+        progress((idx + 1) / len(images))
+    detections = [{k: r[k] for k in ('total', 'grade_a', 'grade_b', 'grade_c', 'grade_d', 'confidence')} for r in results]
+    return {
+        "detections": detections,
+        "summary": summarize_detections(detections, payload['daily_consumption']) if detections else None,
+        "files": files
+    }
 
-Verification Hash: {generate_audit_hash(audit_data)[:32]}...
-        """
-        zf.writestr(f"{audit_data['audit_id']}_SUMMARY.txt", summary)
-    
-    buffer.seek(0)
-    return buffer
+def export_package_job(payload, job_dir, progress):
+    audit_data = AuditDict(payload['audit'])
+    audit_data['watermarked_images'] = [io.BytesIO(p.read_bytes()) for p in sorted(job_dir.glob("image_*"))]
+    # The job's copy lacks the original/processed images; print the hash the UI shows
+    package = create_complete_export_package(audit_data, hash_value=payload['hash'])
+    (job_dir / "package.zip").write_bytes(package.getbuffer())
+    return {"files": ["package.zip"]}
 
-def generate_audit_hash(audit_data):
-    hash_data = {k: v for k, v in audit_data.items() 
-                 if k not in ['original_images', 'processed_images', 'watermarked_images']}
-    hash_string = json.dumps(hash_data, sort_keys=True, default=str)
-    return hashlib.sha256(hash_string.encode()).hexdigest()
+@st.cache_resource
+def load_job_queue():
+    queue = JobQueue(workers=2)
+    queue.register("analyze", analysis_job)
+    queue.register("export_package", export_package_job)
+    queue.start()
+    return queue
 
 # ============================================
 # UI COMPONENTS
@@ -529,11 +291,12 @@ def render_login_screen():
         st.divider()
         
         if st.button("5. LOAD DRAFT", use_container_width=True):
-            if st.session_state.saved_drafts:
-                draft_list = list(st.session_state.saved_drafts.keys())
+            drafts = get_draft_store().list()
+            if drafts:
+                draft_list = [d['audit_id'] for d in drafts]
                 selected_draft = st.selectbox("Select Draft", draft_list)
                 if st.button("LOAD SELECTED DRAFT"):
-                    st.session_state.audit_data = st.session_state.saved_drafts[selected_draft]
+                    st.session_state.audit_data = get_draft_store().load(selected_draft)
                     st.session_state.authenticated = True
                     st.session_state.inspector_name = st.session_state.audit_data['inspector']
                     st.session_state.audit_id = st.session_state.audit_data['audit_id']
@@ -547,8 +310,7 @@ def render_sidebar_controls():
         
         if st.button("3. NEW AUDIT", use_container_width=True):
             if st.session_state.audit_data and st.session_state.audit_data.get('total_count', 0) > 0:
-                draft_id = st.session_state.audit_data['audit_id']
-                st.session_state.saved_drafts[draft_id] = st.session_state.audit_data.copy()
+                get_draft_store().save(st.session_state.audit_data)
             st.session_state.audit_data = create_new_audit(st.session_state.inspector_name)
             st.session_state.captured_images = []
             st.session_state.watermarked_images = []
@@ -561,7 +323,7 @@ def render_sidebar_controls():
         if st.button("4. SAVE DRAFT", use_container_width=True):
             if st.session_state.audit_data:
                 draft_id = st.session_state.audit_data['audit_id']
-                st.session_state.saved_drafts[draft_id] = st.session_state.audit_data.copy()
+                get_draft_store().save(st.session_state.audit_data)
                 st.success(f"Draft saved: {draft_id}")
         
         st.divider()
@@ -590,18 +352,22 @@ def render_sidebar_controls():
             st.success("Offline mode enabled")
         
         if st.button("55. SYNC NOW", use_container_width=True):
-            if st.session_state.offline_queue:
-                count = len(st.session_state.offline_queue)
-                st.session_state.offline_queue = []
-                st.session_state.offline_mode = False
-                st.success(f"Synced {count} audits")
+            outbox = get_outbox()
+            if outbox.pending_count():
+                with st.spinner("Syncing queued audits..."):
+                    result = sync_from_settings(outbox)
+                if "error" in result:
+                    st.warning(f"Synced {result['audits']} audits, {result['pending']} still pending: {result['error']}")
+                else:
+                    st.session_state.offline_mode = False
+                    st.success(f"Synced {result['audits']} audits ({result['bytes'] / 1024:.0f} KB sent)")
             else:
                 st.info("No pending audits")
         
         if st.button("56. QUEUE FOR SUBMISSION", use_container_width=True):
             if st.session_state.audit_data:
-                st.session_state.offline_queue.append(st.session_state.audit_data['audit_id'])
-                st.success(f"Queued. Total: {len(st.session_state.offline_queue)}")
+                get_outbox().enqueue(st.session_state.audit_data)
+                st.success(f"Queued. Total: {get_outbox().pending_count()}")
         
         st.divider()
         
@@ -637,13 +403,54 @@ def render_header_bar():
     col_i1.markdown(f"**Inspector:** {inspector}")
     col_i2.markdown(f"**Audit ID:** {str(audit_id)[:20]}...")
     col_i3.markdown(f"**Status:** {'ONLINE' if not st.session_state.offline_mode else 'OFFLINE'}")
-    col_i4.markdown(f"**Drafts:** {len(st.session_state.saved_drafts)}")
+    col_i4.markdown(f"**Drafts:** {get_draft_store().count()}")
     
     st.divider()
 
 # ============================================
 # TAB 1: SCAN JUTE
 # ============================================
+def render_analysis_job():
+    job_id = st.session_state.analysis_job or st.query_params.get("analysis_job")
+    if not job_id:
+        return
+    queue = load_job_queue()
+    job = queue.get(job_id)
+    if job and job['status'] in ('queued', 'running'):
+        st.progress(job['progress'], text=f"Running YOLO v11 analysis... ({job['status']})")
+        if st.button("REFRESH ANALYSIS STATUS", use_container_width=True):
+            st.rerun()
+        return
+    
+    st.session_state.analysis_job = None
+    st.query_params.pop("analysis_job", None)
+    if job is None:
+        return
+    if job['status'] == 'failed':
+        st.error("Analysis failed")
+        st.code(job['error'])
+        return
+    
+    result = job['result']
+    job_dir = queue.job_dir(job_id)
+    watermarked_images = [io.BytesIO((job_dir / name).read_bytes()) for name in result['files']]
+    for idx, (buf, detection) in enumerate(zip(watermarked_images, result['detections'])):
+        st.image(buf, caption=f"Image {idx+1}: {detection['total']} detected", use_column_width=True)
+    
+    summary = result['summary']
+    if summary:
+        st.session_state.audit_data.update({
+            'material_type': st.session_state.selected_material,
+            **summary,
+            'watermarked_images': watermarked_images
+        })
+        get_audit_store().save_audit(st.session_state.audit_data)
+        
+        st.session_state.analysis_complete = True
+        st.success(f"Analysis complete! Total: {summary['total_count']}")
+        if summary['stock_days'] >= 30:
+            st.balloons()
+
 def render_scan_tab():
     st.markdown("## SCAN JUTE")
     
@@ -924,68 +731,18 @@ def render_scan_tab():
             elif not st.session_state.selected_material:
                 st.error("Please select material type")
             else:
-                with st.spinner("Running YOLO v11 analysis..."):
-                    all_results = []
-                    watermarked_images = []
-                    
-                    for idx, img_file in enumerate(st.session_state.captured_images):
-                        if isinstance(img_file, str):
-                            continue
-                        
-                        image = Image.open(img_file).convert('RGB')
-                        result = simulate_yolo_detection(image, st.session_state.selected_material)
-                        all_results.append(result)
-                        
-                        # FIX: Use for_result=True for result photos (no ministry text)
-                        audit_data_for_watermark = st.session_state.audit_data or {}
-                        watermarked = add_watermark_to_image(image, audit_data_for_watermark, is_processed=True, for_result=True)
-                        buf = io.BytesIO()
-                        watermarked.save(buf, format='JPEG', quality=95)
-                        buf.seek(0)
-                        watermarked_images.append(buf)
-                        
-                        st.image(watermarked, caption=f"Image {idx+1}: {result['total']} detected", use_column_width=True)
-                    
-                    if all_results:
-                        total_result = {
-                            'total': sum(r['total'] for r in all_results),
-                            'grade_a': sum(r['grade_a'] for r in all_results),
-                            'grade_b': sum(r['grade_b'] for r in all_results),
-                            'grade_c': sum(r['grade_c'] for r in all_results),
-                            'grade_d': sum(r['grade_d'] for r in all_results),
-                            'confidence': np.mean([r['confidence'] for r in all_results])
-                        }
-                        
-                        daily = st.session_state.audit_data['daily_consumption']
-                        stock_days = round(total_result['total'] / daily, 1)
-                        
-                        if total_result['grade_a'] > total_result['total'] * 0.35:
-                            overall_grade = 'A'
-                        elif total_result['grade_b'] > total_result['total'] * 0.30:
-                            overall_grade = 'B'
-                        elif total_result['grade_c'] > total_result['total'] * 0.25:
-                            overall_grade = 'C'
-                        else:
-                            overall_grade = 'D'
-                        
-                        st.session_state.audit_data.update({
-                            'material_type': st.session_state.selected_material,
-                            'total_count': total_result['total'],
-                            'premium_count': total_result['grade_a'],
-                            'export_count': total_result['grade_b'],
-                            'local_count': total_result['grade_c'],
-                            'reject_count': total_result['grade_d'],
-                            'confidence': total_result['confidence'],
-                            'stock_days': stock_days,
-                            'grade': overall_grade,
-                            'compliance_status': 'PASS' if stock_days >= 30 else 'FAIL',
-                            'watermarked_images': watermarked_images
-                        })
-                        
-                        st.session_state.analysis_complete = True
-                        st.success(f"Analysis complete! Total: {total_result['total']}")
-                        if stock_days >= 30:
-                            st.balloons()
+                # Runs in the background job queue; survives reruns and lost connections
+                image_files = [f for f in st.session_state.captured_images if not isinstance(f, str)]
+                audit_data_for_watermark = st.session_state.audit_data or {}
+                job_id = load_job_queue().submit("analyze", {
+                    "material_type": st.session_state.selected_material,
+                    "daily_consumption": st.session_state.audit_data['daily_consumption'],
+                    "watermark": {k: audit_data_for_watermark.get(k) for k in ('audit_id', 'inspector', 'material_type', 'timestamp')}
+                }, files={f"input_{idx:03d}": f.getvalue() for idx, f in enumerate(image_files)})
+                st.session_state.analysis_job = job_id
+                st.query_params["analysis_job"] = job_id
+        
+        render_analysis_job()
     
     with col_anal2:
         if st.button("20. MANUAL ENTRY", use_container_width=True):
@@ -1001,29 +758,18 @@ def render_scan_tab():
         manual_grade_d = st.number_input("Grade D", min_value=0, value=0, key="manual_d")
         
         if st.button("Save Manual Entry", key="save_manual"):
-            daily = st.session_state.audit_data['daily_consumption']
-            stock_days = round(manual_total / daily, 1) if daily > 0 else 0
-            
-            if manual_grade_a > manual_total * 0.35:
-                grade = 'A'
-            elif manual_grade_b > manual_total * 0.30:
-                grade = 'B'
-            elif manual_grade_c > manual_total * 0.25:
-                grade = 'C'
-            else:
-                grade = 'D'
-            
-            st.session_state.audit_data.update({
-                'total_count': manual_total,
-                'premium_count': manual_grade_a,
-                'export_count': manual_grade_b,
-                'local_count': manual_grade_c,
-                'reject_count': manual_grade_d,
-                'confidence': 1.0,
-                'stock_days': stock_days,
-                'grade': grade,
-                'compliance_status': 'PASS' if stock_days >= 30 else 'FAIL'
-            })
+            manual_counts = {
+                'total': manual_total,
+                'grade_a': manual_grade_a,
+                'grade_b': manual_grade_b,
+                'grade_c': manual_grade_c,
+                'grade_d': manual_grade_d,
+                'confidence': 1.0
+            }
+            st.session_state.audit_data.update(
+                summarize_detections([manual_counts], st.session_state.audit_data['daily_consumption'])
+            )
+            get_audit_store().save_audit(st.session_state.audit_data)
             st.session_state.show_manual = False
             st.session_state.analysis_complete = True
             st.rerun()
@@ -1155,11 +901,24 @@ def render_results_tab():
     
     with col_h1:
         if st.button("36. COMPARE WITH LAST AUDIT", use_container_width=True):
-            st.info("Comparison feature")
+            last = get_audit_store().last_audit(data.get('mill_license', ''), exclude_audit_id=data['audit_id'])
+            if last:
+                st.caption(f"Last audit: {last['audit_id']}")
+                st.metric("Total Count", data.get('total_count', 0), delta=data.get('total_count', 0) - last['total_count'])
+                st.metric("Stock Days", f"{data.get('stock_days', 0):.1f}", delta=round(data.get('stock_days', 0) - last['stock_days'], 1))
+                st.metric("Grade", data.get('grade', 'N/A'), delta=f"was {last['grade']}", delta_color="off")
+            else:
+                st.info("No previous audit for this mill")
     
     with col_h2:
         if st.button("37. VIEW TREND HISTORY", use_container_width=True):
-            st.info("6-Month Trend")
+            trend = get_audit_store().trend(data.get('mill_license', ''), months=6)
+            if trend:
+                st.markdown("**6-Month Trend**")
+                st.line_chart(trend, x='month', y='total_count')
+                st.dataframe(trend, use_container_width=True)
+            else:
+                st.info("No audit history for this mill")
     
     with col_h3:
         if st.button("38. VIEW AUDIT TRAIL", use_container_width=True):
@@ -1229,14 +988,23 @@ def render_export_tab():
     st.subheader("Download Reports")
     col_d1, col_d2, col_d3 = st.columns(3)
     
+    # PDFs are rendered once per audit version, not on every rerun of the page
+    audit_hash = generate_audit_hash(data)
+    reports = st.session_state.report_pdfs
+    if reports.get('hash') != audit_hash:
+        reports.clear()
+        reports.update({
+            'hash': audit_hash,
+            'govt': generate_government_pdf(data, hash_value=audit_hash).getvalue(),
+            'gfr': generate_gfr_format(data).getvalue(),
+        })
+    
     with col_d1:
-        pdf_buffer = generate_government_pdf(data)
-        st.download_button("49. DOWNLOAD PDF REPORT", pdf_buffer, 
+        st.download_button("49. DOWNLOAD PDF REPORT", reports['govt'], 
                           file_name=f"{data['audit_id']}_GOVT_REPORT.pdf", 
                           mime="application/pdf", use_container_width=True)
         
-        gfr_buffer = generate_gfr_format(data)
-        st.download_button("46. GENERATE GFR PDF", gfr_buffer,
+        st.download_button("46. GENERATE GFR PDF", reports['gfr'],
                           file_name=f"{data['audit_id']}_GFR19A.pdf",
                           mime="application/pdf", use_container_width=True)
     
@@ -1270,10 +1038,31 @@ def render_export_tab():
         else:
             st.button("53. DOWNLOAD PHOTO", disabled=True, use_container_width=True)
         
-        package_buffer = create_complete_export_package(data)
-        st.download_button("47. DOWNLOAD PACKAGE", package_buffer,
-                          file_name=f"{data['audit_id']}_COMPLETE_PACKAGE.zip",
-                          mime="application/zip", use_container_width=True)
+        # Package is built in the background once per audit version
+        queue = load_job_queue()
+        job_id = st.session_state.export_jobs.get(audit_hash)
+        job = queue.get(job_id) if job_id else None
+        if job is None or job['status'] == 'failed':
+            if st.button("47. PREPARE PACKAGE", use_container_width=True):
+                images = {}
+                for idx, img_buf in enumerate(data.get('watermarked_images', [])):
+                    if img_buf:
+                        images[f"image_{idx:03d}.jpg"] = img_buf.getvalue()
+                audit = {k: v for k, v in data.items() if k not in IMAGE_KEYS}
+                st.session_state.export_jobs[audit_hash] = queue.submit(
+                    "export_package", {"audit": json.loads(json.dumps(audit, default=str)), "hash": audit_hash},
+                    files=images
+                )
+                st.rerun()
+        elif job['status'] != 'done':
+            st.progress(job['progress'], text="Preparing package...")
+            if st.button("REFRESH PACKAGE STATUS", use_container_width=True):
+                st.rerun()
+        else:
+            package_path = queue.job_dir(job_id) / "package.zip"
+            st.download_button("47. DOWNLOAD PACKAGE", package_path.read_bytes(),
+                              file_name=f"{data['audit_id']}_COMPLETE_PACKAGE.zip",
+                              mime="application/zip", use_container_width=True)
     
     st.divider()
     
@@ -1312,11 +1101,12 @@ def render_export_tab():
     
     with col_g3:
         if st.button("56. QUEUE FOR SUBMISSION", use_container_width=True):
-            st.session_state.offline_queue.append(data['audit_id'])
-            st.success(f"Queued. Total: {len(st.session_state.offline_queue)}")
+            get_outbox().enqueue(data)
+            st.success(f"Queued. Total: {get_outbox().pending_count()}")
         
-        if st.session_state.offline_queue:
-            st.info(f"Pending: {len(st.session_state.offline_queue)}")
+        pending = get_outbox().pending_count()
+        if pending:
+            st.info(f"Pending: {pending}")
     
     st.divider()
     